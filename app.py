@@ -1,877 +1,1277 @@
-from flask import Flask, render_template, request, jsonify
-from database import Database
-from datetime import datetime, timedelta
-import traceback
-
-app = Flask(__name__)
-
-# Инициализация базы данных
-db = Database()
-
-
-# Фильтр для форматирования чисел
-@app.template_filter('format_money')
-def format_money(value):
-    """Фильтр для форматирования денежных значений"""
-    try:
-        return f"{float(value):.2f}"
-    except:
-        return value
-
-
-# ========== ОСНОВНЫЕ СТРАНИЦЫ ==========
-
-@app.route('/')
-def index():
-    """Главная страница"""
-    stats = db.get_stats()
-    return render_template('index.html', stats=stats)
-
-
-@app.route('/clients')
-def clients_page():
-    """Страница клиентов"""
-    search_term = request.args.get('search', '')
-    clients = db.get_clients(search_term)
-    # Конвертируем Row объекты в словари
-    clients_list = [dict(client) for client in clients]
-    return render_template('clients.html', clients=clients_list, search_term=search_term)
-
-
-@app.route('/work_orders')
-def work_orders_page():
-    """Страница заказ-нарядов"""
-    search_term = request.args.get('search', '')
-    orders = db.get_work_orders(search_term)
-    # Конвертируем Row объекты в словари
-    orders_list = [dict(order) for order in orders]
-    return render_template('work_orders.html', orders=orders_list, search_term=search_term)
-
-
-@app.route('/new_work_order')
-def new_work_order_page():
-    """Страница создания нового заказ-наряда"""
-    client_id = request.args.get('client_id', '')
-    clients = db.get_clients()
-    employees = db.get_active_employees()
-    # Конвертируем Row объекты в словари
-    clients_list = [dict(client) for client in clients]
-    employees_list = [dict(employee) for employee in employees]
-    return render_template('new_work_order.html',
-                           clients=clients_list,
-                           employees=employees_list,
-                           selected_client_id=client_id)
-
-
-@app.route('/edit_work_order/<int:order_id>')
-def edit_work_order_page(order_id):
-    """Страница редактирования заказ-наряда"""
-    order = db.get_work_order(order_id)
-    if not order:
-        return "Заказ-наряд не найден", 404
-
-    # Конвертируем Row в словарь
-    order_dict = dict(order)
-
-    if order_dict['status'] == 'completed':
-        return "Невозможно редактировать завершенный заказ", 400
-
-    clients = db.get_clients()
-    employees = db.get_active_employees()
-    # Конвертируем Row объекты в словари
-    clients_list = [dict(client) for client in clients]
-    employees_list = [dict(employee) for employee in employees]
-
-    return render_template('edit_work_order.html',
-                           order=order_dict,
-                           clients=clients_list,
-                           employees=employees_list)
-
-
-@app.route('/tasks')
-def tasks_page():
-    """Страница задач"""
-    status = request.args.get('status', '')
-    tasks = db.get_tasks(status if status else None)
-    tasks_list = [dict(task) for task in tasks]
-    return render_template('tasks.html', tasks=tasks_list)
-
-
-@app.route('/cash')
-def cash_page():
-    """Страница кассы"""
-    period = request.args.get('period', 'month')
-    transaction_type = request.args.get('type', '')
-    selected_category = request.args.get('category', '')
-
-    # Определяем даты для периода
-    end_date = datetime.now()
-    if period == 'day':
-        start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    elif period == 'week':
-        start_date = end_date - timedelta(days=end_date.weekday())
-    elif period == 'month':
-        start_date = end_date.replace(day=1)
-    elif period == 'year':
-        start_date = end_date.replace(month=1, day=1)
-    else:
-        start_date = end_date - timedelta(days=30)
-
-    # Получаем операции с фильтрацией
-    cash_flow = db.get_cash_flow(
-        start_date.strftime('%Y-%m-%d'),
-        end_date.strftime('%Y-%m-%d'),
-        transaction_type if transaction_type else None,
-        selected_category if selected_category else None
-    )
-
-    # Конвертируем Row объекты в словари
-    cash_flow_list = [dict(cf) for cf in cash_flow]
-
-    # Финансовая статистика
-    financial_stats = db.get_financial_stats(period)
-    total_balance = db.get_total_balance()
-
-    # Категории для фильтров
-    income_categories = ['order_work', 'order_markup', 'salary_paid', 'cash_in', 'other_income']
-    expense_categories = ['salary', 'parts_purchase', 'rent', 'utilities', 'cash_out', 'other_expense']
-
-    # Названия категорий
-    cat_names = {
-        'order_work': 'Работы по заказу',
-        'order_markup': 'Наценка на запчасти',
-        'salary_paid': 'Выплата зарплаты',
-        'cash_in': 'Внесение наличных',
-        'other_income': 'Прочий доход',
-        'salary': 'Зарплата',
-        'parts_purchase': 'Покупка запчастей',
-        'rent': 'Аренда',
-        'utilities': 'Коммунальные',
-        'cash_out': 'Изъятие наличных',
-        'other_expense': 'Прочие расходы'
-    }
-
-    return render_template('cash.html',
-                           cash_flow=cash_flow_list,
-                           financial_stats=financial_stats,
-                           total_balance=total_balance,
-                           period=period,
-                           transaction_type=transaction_type,
-                           selected_category=selected_category,
-                           income_categories=income_categories,
-                           expense_categories=expense_categories,
-                           cat_names=cat_names)
-
-
-@app.route('/employees')
-def employees_page():
-    """Страница работников"""
-    employees = db.get_employees_with_salary()
-
-    # Рассчитываем общую статистику
-    total_salary = sum([e.get('earned_amount', 0) or 0 for e in employees])
-    paid_salary = sum([e.get('paid_amount', 0) or 0 for e in employees])
-    pending_salary = total_salary - paid_salary
-
-    return render_template('employees.html',
-                           employees=employees,
-                           total_salary=total_salary,
-                           paid_salary=paid_salary,
-                           pending_salary=pending_salary)
-
-
-# ========== API ДЛЯ КЛИЕНТОВ ==========
-
-@app.route('/api/clients/add', methods=['POST'])
-def add_client():
-    """Добавление нового клиента"""
-    try:
-        if not request.is_json:
-            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-        data = request.get_json()
-
-        required_fields = ['full_name', 'phone', 'car_model']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'success': False, 'error': f'Отсутствует поле: {field}'}), 400
-
-        client_id = db.add_client(
-            full_name=data['full_name'],
-            phone=data['phone'],
-            car_model=data['car_model'],
-            car_number=data.get('car_number', ''),
-            car_year=data.get('car_year'),
-            vin=data.get('vin', ''),
-            notes=data.get('notes', '')
-        )
-
-        return jsonify({
-            'success': True,
-            'client_id': client_id,
-            'message': 'Клиент успешно добавлен'
-        })
-
-    except ValueError as e:
-        return jsonify({'success': False, 'error': str(e)}), 409
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-@app.route('/api/clients/<int:client_id>', methods=['GET', 'PUT', 'DELETE'])
-def client_operations(client_id):
-    """Операции с клиентом"""
-    try:
-        if request.method == 'GET':
-            client = db.get_client(client_id)
-            if client:
-                return jsonify({'success': True, 'client': dict(client)})
-            return jsonify({'success': False, 'error': 'Клиент не найден'}), 404
-
-        elif request.method == 'PUT':
-            if not request.is_json:
-                return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-            data = request.get_json()
-            success = db.update_client(client_id, **data)
-
-            if success:
-                return jsonify({'success': True, 'message': 'Клиент обновлен'})
-            return jsonify({'success': False, 'error': 'Клиент не найден'}), 404
-
-        elif request.method == 'DELETE':
-            success = db.delete_client(client_id)
-            if success:
-                return jsonify({'success': True, 'message': 'Клиент удален'})
-            return jsonify({'success': False, 'error': 'Клиент не найден'}), 404
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-# ========== API ДЛЯ ЗАКАЗ-НАРЯДОВ ==========
-
-# В методе add_work_order в app.py исправьте генерацию номера заказа:
-@app.route('/api/work_orders/add', methods=['POST'])
-def add_work_order():
-    """Добавление нового заказ-наряда"""
-    try:
-        if not request.is_json:
-            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-        data = request.get_json()
-        print(f"Получены данные для создания заказа: {data}")
-
-        if not data.get('client_id'):
-            return jsonify({'success': False, 'error': 'Отсутствует client_id'}), 400
-        if not data.get('description'):
-            return jsonify({'success': False, 'error': 'Отсутствует description'}), 400
-
-        # Рассчитываем суммы
-        works_total = 0
-        expenses_price = 0
-        markup_total = 0
-
-        # Работы
-        for work in data.get('works', []):
-            quantity = work.get('quantity', 1)
-            price = work.get('price', 0)
-            works_total += quantity * price
-
-        # Запчасти и расходники с наценкой
-        for expense in data.get('expenses', []):
-            quantity = expense.get('quantity', 1)
-            cost = expense.get('cost', 0)
-            markup = expense.get('markup', 0)
-
-            if cost > 0:
-                item_cost = quantity * cost
-                item_price = item_cost * (1 + markup / 100)
-                expenses_price += item_price
-                markup_total += item_price - item_cost
-
-        # Округляем
-        works_total = round(works_total, 2)
-        expenses_price = round(expenses_price, 2)
-        markup_total = round(markup_total, 2)
-        total_amount = works_total + expenses_price
-
-        # Используем переданный номер или генерируем новый
-        order_number = data.get('order_number')
-        if not order_number or order_number == 'Загрузка...':
-            # Генерируем номер
-            date_str = datetime.now().strftime("%y%m%d")
-            try:
-                cursor = db.conn.cursor()
-                cursor.execute('SELECT COUNT(*) FROM work_orders WHERE order_number LIKE ?', (f'{date_str}%',))
-                count = cursor.fetchone()[0] + 1
-                order_number = f"{date_str}-{count:03d}"
-            except:
-                order_number = f"{date_str}-001"
-
-        order_id = db.add_work_order(
-            client_id=data['client_id'],
-            description=data['description'],
-            order_number=order_number,
-            total_amount=total_amount,
-            employee_id=data.get('employee_id')
-        )
-
-        if not order_id:
-            return jsonify({'success': False, 'error': 'Не удалось создать заказ-наряд'}), 500
-
-        print(f"Создан заказ ID: {order_id}, номер: {order_number}")
-
-        # Сохраняем работы
-        for work in data.get('works', []):
-            db.add_order_work(
-                order_id=order_id,
-                work_name=work['name'],
-                quantity=work.get('quantity', 1),
-                price_per_unit=work.get('price', 0)
-            )
-
-        # Сохраняем запчасти с наценкой
-        for expense in data.get('expenses', []):
-            db.add_order_expense(
-                order_id=order_id,
-                expense_name=expense['name'],
-                expense_type=expense.get('type', 'material'),
-                quantity=expense.get('quantity', 1),
-                cost_per_unit=expense.get('cost', 0),
-                markup=expense.get('markup', 0)
-            )
-
-        order = db.get_work_order(order_id)
-
-        return jsonify({
-            'success': True,
-            'order_id': order_id,
-            'order_number': order['order_number'] if order else order_number,
-            'total_amount': total_amount,
-            'works_total': works_total,
-            'expenses_price': expenses_price,
-            'markup_total': markup_total,
-            'message': 'Заказ-наряд создан'
-        })
-
-    except Exception as e:
-        print(f"❌ Ошибка в add_work_order: {str(e)}")
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-@app.route('/api/work_orders/<int:order_id>', methods=['GET', 'PUT', 'DELETE'])
-def work_order_operations(order_id):
-    """Операции с заказ-нарядом"""
-    try:
-        if request.method == 'GET':
-            order = db.get_work_order(order_id)
-            if order:
-                works = db.get_order_works(order_id)
-                expenses = db.get_order_expenses(order_id)
-
-                print(f"Загружен заказ ID: {order_id}")  # Отладочный вывод
-                print(f"Найдено работ: {len(works)}")  # Отладочный вывод
-                print(f"Найдено запчастей: {len(expenses)}")  # Отладочный вывод
-
-                return jsonify({
-                    'success': True,
-                    'order': dict(order),
-                    'works': [dict(w) for w in works],
-                    'expenses': [dict(e) for e in expenses]
-                })
-            return jsonify({'success': False, 'error': 'Заказ-наряд не найден'}), 404
-
-        elif request.method == 'PUT':
-            if not request.is_json:
-                return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-            data = request.get_json()
-            print(f"Получены данные для обновления заказа {order_id}: {data}")  # Отладочный вывод
-
-            # Получаем текущий заказ
-            order = db.get_work_order(order_id)
-            if not order:
-                return jsonify({'success': False, 'error': 'Заказ-наряд не найден'}), 404
-
-            order_dict = dict(order)
-            if order_dict['status'] == 'completed':
-                return jsonify({'success': False, 'error': 'Невозможно редактировать завершенный заказ'}), 400
-
-            # Рассчитываем суммы
-            works_total = 0
-            expenses_price = 0
-            markup_total = 0
-
-            # Работы
-            for work in data.get('works', []):
-                quantity = work.get('quantity', 1)
-                price = work.get('price', 0)
-                works_total += quantity * price
-
-            # Запчасти с наценкой
-            for expense in data.get('expenses', []):
-                quantity = expense.get('quantity', 1)
-                cost = expense.get('cost', 0)
-                markup = expense.get('markup', 0)
-
-                if cost > 0:
-                    item_cost = quantity * cost
-                    item_price = item_cost * (1 + markup / 100)
-                    expenses_price += item_price
-                    markup_total += item_price - item_cost
-
-            # Округляем
-            works_total = round(works_total, 2)
-            expenses_price = round(expenses_price, 2)
-            markup_total = round(markup_total, 2)
-            total_amount = works_total + expenses_price
-
-            # Обновляем заказ
-            success = db.update_work_order(
-                order_id=order_id,
-                client_id=data.get('client_id', order_dict['client_id']),
-                description=data.get('description', order_dict['description']),
-                total_amount=total_amount,
-                employee_id=data.get('employee_id')
-            )
-
-            if not success:
-                return jsonify({'success': False, 'error': 'Не удалось обновить заказ-наряд'}), 500
-
-            # Удаляем старые работы и запчасти
-            db.delete_order_works(order_id)
-            db.delete_order_expenses(order_id)
-
-            # Сохраняем новые работы
-            for work in data.get('works', []):
-                db.add_order_work(
-                    order_id=order_id,
-                    work_name=work['name'],
-                    quantity=work.get('quantity', 1),
-                    price_per_unit=work.get('price', 0)
-                )
-
-            # Сохраняем новые запчасти
-            for expense in data.get('expenses', []):
-                db.add_order_expense(
-                    order_id=order_id,
-                    expense_name=expense['name'],
-                    expense_type=expense.get('type', 'material'),
-                    quantity=expense.get('quantity', 1),
-                    cost_per_unit=expense.get('cost', 0),
-                    markup=expense.get('markup', 0)
-                )
-
-            return jsonify({
-                'success': True,
-                'message': 'Заказ-наряд обновлен',
-                'total_amount': total_amount,
-                'works_total': works_total,
-                'expenses_price': expenses_price,
-                'markup_total': markup_total
-            })
-
-        elif request.method == 'DELETE':
-            success = db.delete_work_order(order_id)
-            if success:
-                return jsonify({'success': True, 'message': 'Заказ-наряд удален'})
-            return jsonify({'success': False, 'error': 'Заказ-наряд не найден'}), 404
-
-    except Exception as e:
-        print(f"Ошибка в work_order_operations: {str(e)}")
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-@app.route('/api/work_orders/<int:order_id>/complete', methods=['POST'])
-def complete_work_order(order_id):
-    """Завершение заказ-наряда"""
-    try:
-        # Получаем информацию о заказе
-        order = db.get_work_order(order_id)
-        if not order:
-            return jsonify({'success': False, 'error': 'Заказ-наряд не найден'}), 404
-
-        # Конвертируем Row в словарь
-        order_dict = dict(order)
-
-        # Обновляем статус
-        success = db.update_work_order_status(order_id, 'completed')
-        if not success:
-            return jsonify({'success': False, 'error': 'Не удалось обновить статус'}), 500
-
-        # Получаем работы и запчасти
-        works = db.get_order_works(order_id)
-        expenses = db.get_order_expenses(order_id)
-
-        # Рассчитываем суммы
-        works_total = sum([w['quantity'] * w['price_per_unit'] for w in works])
-        markup_total = 0
-
-        # Рассчитываем наценку на запчасти
-        for expense in expenses:
-            cost = expense['cost_per_unit']
-            markup = expense['markup']
-            quantity = expense['quantity']
-
-            if cost > 0:
-                item_cost = cost * quantity
-                item_price = item_cost * (1 + (markup or 0) / 100)
-                markup_total += item_price - item_cost
-
-        # Округляем
-        works_total = round(works_total, 2)
-        markup_total = round(markup_total, 2)
-
-        # Добавляем доход от работ в кассу
-        if works_total > 0:
-            db.add_cash_flow(
-                transaction_type='income',
-                category='order_work',
-                amount=works_total,
-                description=f'Доход от работ по заказу {order_dict["order_number"]}',
-                order_id=order_id
-            )
-
-        # Добавляем наценку на запчасти в кассу
-        if markup_total > 0:
-            db.add_cash_flow(
-                transaction_type='income',
-                category='order_markup',
-                amount=markup_total,
-                description=f'Наценка на запчасти по заказу {order_dict["order_number"]}',
-                order_id=order_id
-            )
-
-        # Если есть работник, рассчитываем и добавляем зарплату
-        if order_dict.get('employee_id'):
-            employee = db.get_employee(order_dict['employee_id'])
-            if employee and employee['commission_rate'] > 0:
-                commission_rate = employee['commission_rate']
-                salary_amount = round(works_total * commission_rate / 100, 2)
-
-                if salary_amount > 0:
-                    # Добавляем зарплату в начисления
-                    db.add_employee_salary(
-                        employee_id=order_dict['employee_id'],
-                        order_id=order_id,
-                        amount=salary_amount,
-                        commission_rate=commission_rate,
-                        works_total=works_total
-                    )
-
-        return jsonify({
-            'success': True,
-            'message': 'Заказ-наряд завершен',
-            'works_total': works_total,
-            'markup_total': markup_total,
-            'total_income': works_total + markup_total
-        })
-
-    except Exception as e:
-        print(f"Ошибка при завершении заказа: {str(e)}")
-        traceback.print_exc()
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-@app.route('/api/work_orders/last_number')
-def get_last_order_number():
-    """Получение последнего номера заказа"""
-    try:
-        date_prefix = request.args.get('date', '')
-        if not date_prefix:
-            date_prefix = datetime.now().strftime('%y%m%d')
-
-        cursor = db.conn.cursor()
-        cursor.execute('''
-                       SELECT order_number
-                       FROM work_orders
-                       WHERE order_number LIKE ?
-                       ORDER BY id DESC LIMIT 1
-                       ''', (f'{date_prefix}%',))
-
-        result = cursor.fetchone()
-
-        if result:
-            last_number = result[0]
-            # Парсим номер формата YYMMDD-XXX
-            import re
-            match = re.match(r'(\d{6})-(\d{3})', last_number)
-            if match:
-                prefix = match.group(1)
-                num = int(match.group(2))
-                next_num = f"{prefix}-{num + 1:03d}"
-            else:
-                next_num = f"{date_prefix}-001"
-        else:
-            next_num = f"{date_prefix}-001"
-
-        return jsonify({
-            'success': True,
-            'next_number': next_num
-        })
-
-    except Exception as e:
-        return jsonify({
-            'success': True,
-            'next_number': f"{datetime.now().strftime('%y%m%d')}-001"
-        })
-
-# ========== API ДЛЯ ЗАДАЧ ==========
-
-@app.route('/api/tasks/add', methods=['POST'])
-def add_task():
-    """Добавление новой задачи"""
-    try:
-        if not request.is_json:
-            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-        data = request.get_json()
-
-        if not data.get('title'):
-            return jsonify({'success': False, 'error': 'Отсутствует title'}), 400
-
-        task_id = db.add_task(
-            title=data['title'],
-            description=data.get('description', ''),
-            priority=data.get('priority', 'medium'),
-            assigned_to=data.get('assigned_to', ''),
-            due_date=data.get('due_date')
-        )
-
-        return jsonify({
-            'success': True,
-            'task_id': task_id,
-            'message': 'Задача создана'
-        })
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-@app.route('/api/tasks/<int:task_id>', methods=['GET', 'PUT', 'DELETE'])
-def task_operations(task_id):
-    """Операции с задачей"""
-    try:
-        if request.method == 'GET':
-            task = db.get_task(task_id)
-            if task:
-                return jsonify({'success': True, 'task': dict(task)})
-            return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
-
-        elif request.method == 'PUT':
-            if not request.is_json:
-                return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-            data = request.get_json()
-
-            if data.get('status') == 'completed' and 'completed_at' not in data:
-                data['completed_at'] = datetime.now().isoformat()
-
-            success = db.update_task(task_id, **data)
-            if success:
-                return jsonify({'success': True, 'message': 'Задача обновлена'})
-            return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
-
-        elif request.method == 'DELETE':
-            success = db.delete_task(task_id)
-            if success:
-                return jsonify({'success': True, 'message': 'Задача удалена'})
-            return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-# ========== API ДЛЯ КАССЫ ==========
-
-@app.route('/api/cash/add', methods=['POST'])
-def add_cash_flow():
-    """Добавление операции в кассу"""
-    try:
-        if not request.is_json:
-            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-        data = request.get_json()
-
-        if not data.get('transaction_type'):
-            return jsonify({'success': False, 'error': 'Отсутствует transaction_type'}), 400
-        if not data.get('category'):
-            return jsonify({'success': False, 'error': 'Отсутствует category'}), 400
-        if not data.get('amount'):
-            return jsonify({'success': False, 'error': 'Отсутствует amount'}), 400
-        if not data.get('description'):
-            return jsonify({'success': False, 'error': 'Отсутствует description'}), 400
-
-        flow_id = db.add_cash_flow(
-            transaction_type=data['transaction_type'],
-            category=data['category'],
-            amount=data['amount'],
-            description=data['description'],
-            order_id=data.get('order_id')
-        )
-
-        return jsonify({
-            'success': True,
-            'flow_id': flow_id,
-            'message': 'Операция добавлена'
-        })
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-@app.route('/api/cash/stats')
-def get_cash_stats():
-    """Получение финансовой статистики"""
-    try:
-        period = request.args.get('period', 'month')
-        stats = db.get_financial_stats(period)
-        return jsonify({'success': True, 'stats': stats})
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-# ========== API ДЛЯ РАБОТНИКОВ ==========
-
-@app.route('/api/employees/add', methods=['POST'])
-def add_employee():
-    """Добавление нового работника"""
-    try:
-        if not request.is_json:
-            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-        data = request.get_json()
-
-        if not data.get('full_name'):
-            return jsonify({'success': False, 'error': 'Отсутствует full_name'}), 400
-        if not data.get('position'):
-            return jsonify({'success': False, 'error': 'Отсутствует position'}), 400
-        if not data.get('commission_rate'):
-            return jsonify({'success': False, 'error': 'Отсутствует commission_rate'}), 400
-
-        employee_id = db.add_employee(
-            full_name=data['full_name'],
-            position=data['position'],
-            phone=data.get('phone', ''),
-            commission_rate=data['commission_rate'],
-            hire_date=data.get('hire_date'),
-            is_active=data.get('is_active', True),
-            notes=data.get('notes', '')
-        )
-
-        return jsonify({
-            'success': True,
-            'employee_id': employee_id,
-            'message': 'Работник успешно добавлен'
-        })
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-@app.route('/api/employees/<int:employee_id>', methods=['GET', 'PUT'])
-def employee_operations(employee_id):
-    """Операции с работником"""
-    try:
-        if request.method == 'GET':
-            employee = db.get_employee_with_salary(employee_id)
-            if employee:
-                return jsonify({'success': True, 'employee': dict(employee)})
-            return jsonify({'success': False, 'error': 'Работник не найден'}), 404
-
-        elif request.method == 'PUT':
-            if not request.is_json:
-                return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-            data = request.get_json()
-            success = db.update_employee(employee_id, **data)
-
-            if success:
-                return jsonify({'success': True, 'message': 'Работник обновлен'})
-            return jsonify({'success': False, 'error': 'Работник не найден'}), 404
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-@app.route('/api/employees/<int:employee_id>/status', methods=['PUT'])
-def update_employee_status(employee_id):
-    """Обновление статуса работника"""
-    try:
-        if not request.is_json:
-            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-        data = request.get_json()
-        if 'is_active' not in data:
-            return jsonify({'success': False, 'error': 'Отсутствует is_active'}), 400
-
-        success = db.update_employee_status(employee_id, data['is_active'])
-        if success:
-            return jsonify({'success': True, 'message': 'Статус обновлен'})
-        return jsonify({'success': False, 'error': 'Работник не найден'}), 404
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-@app.route('/api/employees/<int:employee_id>/pay', methods=['POST'])
-def pay_employee_salary(employee_id):
-    """Выплата зарплаты работнику"""
-    try:
-        if not request.is_json:
-            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
-
-        data = request.get_json()
-        if not data.get('amount'):
-            return jsonify({'success': False, 'error': 'Отсутствует amount'}), 400
-
-        amount = float(data['amount'])
-
-        # Получаем информацию о работнике
-        employee = db.get_employee_with_salary(employee_id)
-        if not employee:
-            return jsonify({'success': False, 'error': 'Работник не найден'}), 404
-
-        earned = employee.get('earned_amount', 0) or 0
-        paid = employee.get('paid_amount', 0) or 0
-        pending = earned - paid
-
-        if amount > pending:
-            return jsonify({'success': False, 'error': f'Сумма превышает задолженность ({pending:.2f} ₽)'}), 400
-
-        # Добавляем выплату
-        payment_id = db.add_salary_payment(
-            employee_id=employee_id,
-            amount=amount,
-            description=f'Выплата зарплаты {employee["full_name"]}'
-        )
-
-        if payment_id:
-            # Добавляем операцию в кассу как расход
-            db.add_cash_flow(
-                transaction_type='expense',
-                category='salary',
-                amount=amount,
-                description=f'Выплата зарплаты работнику {employee["full_name"]}'
-            )
-
-            return jsonify({
-                'success': True,
-                'message': 'Зарплата выплачена',
-                'amount': amount,
-                'pending': pending - amount
-            })
-
-        return jsonify({'success': False, 'error': 'Ошибка при выплате зарплаты'}), 500
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
-
-
-# ========== ЗАПУСК ПРИЛОЖЕНИЯ ==========
-
-if __name__ == '__main__':
-    print("🚀 Запуск CRM Автосервиса...")
+from flask import Flask, Response, g, render_template, request, jsonify, stream_with_context
+from database import Database, QueryLog, clean_client_row, period_bounds
+from metrics import Metrics, clear_directory as clear_metrics_directory
+from datetime import datetime
+import codecs
+import csv
+import io
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+import zlib
+
+app = Flask(__name__)
+
+# Настройки подключения к БД (можно переопределить переменными окружения)
+DB_NAME = os.environ.get('AUTOSERVICE_DB', 'autoservice.db')
+DB_READ_POOL_SIZE = int(os.environ.get('AUTOSERVICE_DB_READ_POOL_SIZE', 4))
+DB_POOL_TIMEOUT = float(os.environ.get('AUTOSERVICE_DB_POOL_TIMEOUT', 30))
+# Профиль хранения SQLite: durable / balanced / fast / legacy (см. database.STORAGE_PROFILES)
+DB_STORAGE_PROFILE = os.environ.get('AUTOSERVICE_STORAGE_PROFILE', 'balanced')
+DB_CHECKPOINT_INTERVAL = int(os.environ.get('AUTOSERVICE_CHECKPOINT_INTERVAL', 300))
+# Время жизни кэша статистики главной страницы, секунды (0 - без кэша)
+DB_STATS_CACHE_TTL = float(os.environ.get('AUTOSERVICE_STATS_CACHE_TTL', 30))
+# Журнал SQL-запросов: 0 - выключен; порог медленного запроса, мс (0 - без лога медленных)
+DB_QUERY_LOG = os.environ.get('AUTOSERVICE_QUERY_LOG', '1') != '0'
+DB_SLOW_QUERY_MS = float(os.environ.get('AUTOSERVICE_SLOW_QUERY_MS', 200))
+# Каталог для сведения метрик нескольких процессов-воркеров (пусто - только свой процесс);
+# очищается при запуске сервера: gunicorn.conf.py (on_starting) или python app.py
+METRICS_DIR = os.environ.get('AUTOSERVICE_METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('AUTOSERVICE_METRICS_FLUSH_INTERVAL', 5))
+# Многопроцессный режим: адрес процесса записи (см. writer.py); пусто - запись в этом процессе
+WRITER_ADDRESS = os.environ.get('AUTOSERVICE_WRITER_ADDRESS') or None
+WRITER_AUTHKEY = os.environ.get('AUTOSERVICE_WRITER_AUTHKEY') or None
+# Групповая фиксация в этом процессе: записи из разных потоков, пришедшие в пределах
+# окна (мс), фиксируются одной транзакцией; размер пачки ограничен
+DB_WRITE_BATCH = os.environ.get('AUTOSERVICE_WRITE_BATCH', '0') == '1'
+DB_WRITE_BATCH_WINDOW_MS = float(os.environ.get('AUTOSERVICE_WRITE_BATCH_WINDOW_MS', 2))
+DB_WRITE_BATCH_SIZE = int(os.environ.get('AUTOSERVICE_WRITE_BATCH_SIZE', 100))
+
+# Инициализация базы данных
+query_log = QueryLog(slow_query_ms=DB_SLOW_QUERY_MS) if DB_QUERY_LOG else None
+db_options = dict(read_pool_size=DB_READ_POOL_SIZE,
+                  pool_timeout=DB_POOL_TIMEOUT,
+                  storage_profile=DB_STORAGE_PROFILE,
+                  checkpoint_interval=DB_CHECKPOINT_INTERVAL,
+                  stats_cache_ttl=DB_STATS_CACHE_TTL,
+                  query_log=query_log)
+if WRITER_ADDRESS:
+    from writer import WorkerDatabase, parse_address
+    db = WorkerDatabase(DB_NAME, parse_address(WRITER_ADDRESS),
+                        authkey=WRITER_AUTHKEY.encode() if WRITER_AUTHKEY else None, **db_options)
+else:
+    db = Database(DB_NAME,
+                  batch_writes=DB_WRITE_BATCH,
+                  write_batch_size=DB_WRITE_BATCH_SIZE,
+                  write_batch_window_ms=DB_WRITE_BATCH_WINDOW_MS,
+                  **db_options)
+
+
+if query_log is not None:
+    @app.before_request
+    def bind_query_log_endpoint():
+        """Запросы к БД учитываются в журнале под endpoint текущего запроса"""
+        query_log.set_endpoint(request.endpoint)
+
+    @app.teardown_request
+    def unbind_query_log_endpoint(exc):
+        query_log.set_endpoint(None)
+
+
+# Метрики запросов для /metrics
+metrics = Metrics(METRICS_DIR, flush_interval=METRICS_FLUSH_INTERVAL)
+metrics.add_collector(lambda: {
+    'autoservice_stats_cache_hits_total': db.stats_cache_hits,
+    'autoservice_stats_cache_misses_total': db.stats_cache_misses
+})
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Время, размер ответа, число запросов к БД и время БД по endpoint"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        queries, db_time = query_log.request_totals() if query_log is not None else (None, None)
+        metrics.observe_request(request.endpoint, request.method, response.status_code,
+                                time.perf_counter() - started,
+                                # Потоковый ответ нельзя измерить, не прочитав его целиком
+                                size=None if response.is_streamed else response.calculate_content_length(),
+                                queries=queries, db_time=db_time)
+    return response
+
+
+# Интервал комментариев-пингов в потоке событий, секунды: держит соединение
+# открытым через прокси и позволяет заметить отключившийся браузер
+SSE_HEARTBEAT = float(os.environ.get('AUTOSERVICE_SSE_HEARTBEAT', 15))
+# Каждый поток событий держит поток обработки запросов: не больше SSE_MAX_STREAMS
+# потоков на процесс, каждый закрывается через SSE_MAX_AGE секунд, после чего
+# браузер переподключается сам. По умолчанию ограничения нет - встроенный сервер
+# (python app.py) создает поток на каждое подключение; под gunicorn значение по
+# умолчанию задает gunicorn.conf.py - половина потоков воркера
+SSE_MAX_STREAMS = int(os.environ['AUTOSERVICE_SSE_MAX_STREAMS']) if os.environ.get('AUTOSERVICE_SSE_MAX_STREAMS') else None
+SSE_MAX_AGE = float(os.environ.get('AUTOSERVICE_SSE_MAX_AGE', 300))
+db.events.max_subscribers = SSE_MAX_STREAMS
+
+
+def sse_blocks_worker():
+    """Синхронный воркер gunicorn: поток событий занял бы процесс целиком
+
+    Такой воркер обрабатывает запросы по одному в главном потоке; у gthread
+    запросы идут в пуле потоков, у gevent/eventlet - в гринлетах.
+    """
+    return (request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn')
+            and threading.current_thread() is threading.main_thread()
+            and not any(name in sys.modules for name in ('gevent', 'eventlet')))
+
+# Размер страницы списков по умолчанию и максимальный (параметр per_page)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Выгрузки CSV: разделитель для Excel с русской локалью, строк на один отправляемый фрагмент
+CSV_DELIMITER = ';'
+EXPORT_CHUNK_ROWS = 500
+
+CASH_CATEGORY_NAMES = {
+    'order_work': 'Работы по заказу',
+    'order_markup': 'Наценка на запчасти',
+    'salary_paid': 'Выплата зарплаты',
+    'cash_in': 'Внесение наличных',
+    'other_income': 'Прочий доход',
+    'salary': 'Зарплата',
+    'parts_purchase': 'Покупка запчастей',
+    'rent': 'Аренда',
+    'utilities': 'Коммунальные',
+    'cash_out': 'Изъятие наличных',
+    'other_expense': 'Прочие расходы'
+}
+
+# Импорт клиентов: строк в одной транзакции
+CLIENT_IMPORT_BATCH_SIZE = 2000
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+# Пакетные операции: максимум операций в одном запросе
+MAX_BATCH_OPERATIONS = 500
+
+WORK_ORDER_STATUS_NAMES = {'new': 'Новый', 'in_progress': 'В работе', 'completed': 'Завершен'}
+
+
+# Фильтр для форматирования чисел
+@app.template_filter('format_money')
+def format_money(value):
+    """Фильтр для форматирования денежных значений"""
+    try:
+        return f"{float(value):.2f}"
+    except:
+        return value
+
+
+def get_page_args():
+    """Параметры пагинации из запроса: (размер страницы, курсор)"""
+    per_page = request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(per_page, MAX_PAGE_SIZE)), request.args.get('after') or None
+
+
+def get_date_arg(name):
+    """Дата 'YYYY-MM-DD' из параметра запроса (None, если не задана); ValueError при неверном формате"""
+    value = request.args.get(name) or None
+    if value is not None:
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"Неверная дата {name}: {value} (нужен формат ГГГГ-ММ-ДД)")
+    return value
+
+
+def get_period_dates(period):
+    """Даты периода: явные start_date/end_date из запроса или границы period ('all' - без ограничений)"""
+    start_date, end_date = get_date_arg('start_date'), get_date_arg('end_date')
+    if start_date or end_date or period == 'all':
+        return start_date, end_date
+    return period_bounds(period)
+
+
+def get_cash_filters():
+    """Фильтры операций кассы из запроса (период или даты, тип, категория)"""
+    period = request.args.get('period', 'month')
+    transaction_type = request.args.get('type', '')
+    selected_category = request.args.get('category', '')
+
+    # Определяем даты для периода
+    start_date, end_date = get_period_dates(period)
+
+    return {
+        'period': period,
+        'start_date': start_date,
+        'end_date': end_date,
+        'transaction_type': transaction_type,
+        'category': selected_category
+    }
+
+
+def batch_response(run_batch):
+    """Пакет операций из JSON ({"operations": [...]} или список) одной транзакцией
+
+    Ответ - результат по каждой операции в том же порядке; ошибка одной
+    операции не отменяет остальные.
+    """
+    if not request.is_json:
+        return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+    data = request.get_json()
+    operations = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'success': False, 'error': 'Нужен непустой список операций'}), 400
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        return jsonify({'success': False,
+                        'error': f'Не больше {MAX_BATCH_OPERATIONS} операций в одном запросе'}), 400
+
+    results = run_batch(operations)
+    succeeded = sum(item['success'] for item in results)
+    return jsonify({'success': True, 'results': results,
+                    'succeeded': succeeded, 'failed': len(results) - succeeded})
+
+
+def page_response(page, template, name):
+    """JSON-ответ страницы списка: элементы, курсор и готовые строки HTML"""
+    items = [dict(item) for item in page['items']]
+    return jsonify({
+        'success': True,
+        'items': items,
+        'next_cursor': page['next_cursor'],
+        'html': render_template(template, **{name: items})
+    })
+
+
+# ========== ОСНОВНЫЕ СТРАНИЦЫ ==========
+
+@app.route('/')
+def index():
+    """Главная страница"""
+    stats = db.get_stats()
+    return render_template('index.html', stats=stats)
+
+
+@app.route('/clients')
+def clients_page():
+    """Страница клиентов"""
+    search_term = request.args.get('search', '')
+    per_page, after = get_page_args()
+    try:
+        page = db.get_clients_page(search_term, limit=per_page, after=after)
+    except ValueError as e:
+        return str(e), 400
+    # Конвертируем Row объекты в словари
+    clients_list = [dict(client) for client in page['items']]
+    return render_template('clients.html', clients=clients_list, search_term=search_term,
+                           next_cursor=page['next_cursor'], per_page=per_page)
+
+
+@app.route('/work_orders')
+def work_orders_page():
+    """Страница заказ-нарядов"""
+    search_term = request.args.get('search', '')
+    client_id = request.args.get('client_id', type=int)
+    per_page, after = get_page_args()
+    try:
+        page = db.get_work_orders_page(search_term, client_id=client_id, limit=per_page, after=after)
+    except ValueError as e:
+        return str(e), 400
+    # Конвертируем Row объекты в словари
+    orders_list = [dict(order) for order in page['items']]
+    return render_template('work_orders.html', orders=orders_list, search_term=search_term, client_id=client_id,
+                           next_cursor=page['next_cursor'], per_page=per_page)
+
+
+@app.route('/new_work_order')
+def new_work_order_page():
+    """Страница создания нового заказ-наряда"""
+    client_id = request.args.get('client_id', '')
+    clients = db.get_clients()
+    employees = db.get_active_employees()
+    # Конвертируем Row объекты в словари
+    clients_list = [dict(client) for client in clients]
+    employees_list = [dict(employee) for employee in employees]
+    return render_template('new_work_order.html',
+                           clients=clients_list,
+                           employees=employees_list,
+                           selected_client_id=client_id)
+
+
+@app.route('/edit_work_order/<int:order_id>')
+def edit_work_order_page(order_id):
+    """Страница редактирования заказ-наряда"""
+    order = db.get_work_order(order_id)
+    if not order:
+        return "Заказ-наряд не найден", 404
+
+    # Конвертируем Row в словарь
+    order_dict = dict(order)
+
+    if order_dict['status'] == 'completed':
+        return "Невозможно редактировать завершенный заказ", 400
+
+    clients = db.get_clients()
+    employees = db.get_active_employees()
+    # Конвертируем Row объекты в словари
+    clients_list = [dict(client) for client in clients]
+    employees_list = [dict(employee) for employee in employees]
+
+    return render_template('edit_work_order.html',
+                           order=order_dict,
+                           clients=clients_list,
+                           employees=employees_list)
+
+
+@app.route('/tasks')
+def tasks_page():
+    """Страница задач"""
+    status = request.args.get('status', '')
+    per_page, after = get_page_args()
+    try:
+        page = db.get_tasks_page(status if status else None, limit=per_page, after=after)
+    except ValueError as e:
+        return str(e), 400
+    tasks_list = [dict(task) for task in page['items']]
+    return render_template('tasks.html', tasks=tasks_list,
+                           next_cursor=page['next_cursor'], per_page=per_page)
+
+
+@app.route('/cash')
+def cash_page():
+    """Страница кассы"""
+    period = request.args.get('period', 'month')
+    transaction_type = request.args.get('type', '')
+    selected_category = request.args.get('category', '')
+    per_page, after = get_page_args()
+
+    # Операции с фильтрацией, финансовая статистика и баланс - одним обращением к БД
+    try:
+        overview = db.get_cash_overview(
+            period,
+            transaction_type if transaction_type else None,
+            selected_category if selected_category else None,
+            limit=per_page,
+            after=after
+        )
+    except ValueError as e:
+        return str(e), 400
+
+    page = overview['page']
+    financial_stats = overview['financial_stats']
+    total_balance = overview['total_balance']
+
+    # Конвертируем Row объекты в словари
+    cash_flow_list = [dict(cf) for cf in page['items']]
+
+    # Категории для фильтров
+    income_categories = ['order_work', 'order_markup', 'salary_paid', 'cash_in', 'other_income']
+    expense_categories = ['salary', 'parts_purchase', 'rent', 'utilities', 'cash_out', 'other_expense']
+
+    return render_template('cash.html',
+                           cash_flow=cash_flow_list,
+                           financial_stats=financial_stats,
+                           total_balance=total_balance,
+                           period=period,
+                           transaction_type=transaction_type,
+                           selected_category=selected_category,
+                           income_categories=income_categories,
+                           expense_categories=expense_categories,
+                           cat_names=CASH_CATEGORY_NAMES,
+                           next_cursor=page['next_cursor'],
+                           per_page=per_page)
+
+
+@app.route('/employees')
+def employees_page():
+    """Страница работников"""
+    employees = db.get_employees_with_salary()
+
+    # Рассчитываем общую статистику
+    total_salary = sum([e.get('earned_amount', 0) or 0 for e in employees])
+    paid_salary = sum([e.get('paid_amount', 0) or 0 for e in employees])
+    pending_salary = total_salary - paid_salary
+
+    return render_template('employees.html',
+                           employees=employees,
+                           total_salary=total_salary,
+                           paid_salary=paid_salary,
+                           pending_salary=pending_salary)
+
+
+# ========== ЖИВЫЕ ОБНОВЛЕНИЯ ==========
+
+@app.route('/api/events')
+def live_events():
+    """Поток событий об изменениях (Server-Sent Events)
+
+    Событие change - JSON {entity, op, id, ...} после фиксации записи;
+    событие reset - браузер не успевал забирать события, страницу нужно
+    перечитать целиком. 503 - потоки событий недоступны (синхронный воркер
+    gunicorn или уже открыто SSE_MAX_STREAMS потоков), страница работает
+    без живых обновлений.
+    """
+    if sse_blocks_worker():
+        return jsonify({'success': False, 'error': 'Потоку событий нужен воркер gunicorn -k gthread или gevent'}), 503
+    subscriber = db.events.subscribe()
+    if subscriber is None:
+        return jsonify({'success': False, 'error': 'Слишком много потоков событий'}), 503
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            deadline = time.monotonic() + SSE_MAX_AGE
+            while time.monotonic() < deadline:
+                try:
+                    change = subscriber.get(timeout=min(SSE_HEARTBEAT, max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+                if change is None:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+                yield f'event: change\ndata: {json.dumps(change, ensure_ascii=False)}\n\n'
+        finally:
+            db.events.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/stats')
+def get_stats():
+    """Счетчики главной страницы (из кэша статистики)"""
+    try:
+        return jsonify({'success': True, 'stats': db.get_stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def row_response(item, template, name):
+    """JSON-ответ одной строки списка: данные и готовый HTML"""
+    item = dict(item)
+    return jsonify({'success': True, 'item': item, 'html': render_template(template, **{name: [item]})})
+
+
+# ========== API ДЛЯ КЛИЕНТОВ ==========
+
+@app.route('/api/clients')
+def list_clients():
+    """Страница списка клиентов (keyset-пагинация, параметры search, per_page, after)"""
+    try:
+        per_page, after = get_page_args()
+        page = db.get_clients_page(request.args.get('search', ''), limit=per_page, after=after)
+        return page_response(page, '_client_rows.html', 'clients')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/clients/add', methods=['POST'])
+def add_client():
+    """Добавление нового клиента"""
+    try:
+        if not request.is_json:
+            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+        data = request.get_json()
+
+        required_fields = ['full_name', 'phone', 'car_model']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({'success': False, 'error': f'Отсутствует поле: {field}'}), 400
+
+        client_id = db.add_client(
+            full_name=data['full_name'],
+            phone=data['phone'],
+            car_model=data['car_model'],
+            car_number=data.get('car_number', ''),
+            car_year=data.get('car_year'),
+            vin=data.get('vin', ''),
+            notes=data.get('notes', '')
+        )
+
+        return jsonify({
+            'success': True,
+            'client_id': client_id,
+            'message': 'Клиент успешно добавлен'
+        })
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def iter_import_records(stream, import_format, encoding='utf-8-sig'):
+    """Записи файла импорта из потока тела запроса: (номер строки, словарь или ValueError)
+
+    CSV - первая строка с названиями колонок, разделитель (';', ',' или
+    табуляция) определяется по ней; NDJSON - по JSON-объекту в строке.
+    """
+    text = io.TextIOWrapper(stream, encoding=encoding, newline='')
+    if import_format == 'ndjson':
+        for number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, ValueError(f'Неверный JSON: {e}')
+                continue
+            yield number, record if isinstance(record, dict) else ValueError('Ожидается JSON-объект')
+        return
+
+    header = text.readline()
+    delimiter = max(';,\t', key=header.count)
+    reader = csv.DictReader(itertools.chain([header], text), delimiter=delimiter)
+    for record in reader:
+        yield reader.line_num, record
+
+
+@app.route('/api/clients/import', methods=['POST'])
+def import_clients():
+    """Импорт клиентов из CSV или NDJSON в теле запроса
+
+    Формат - по Content-Type или параметру format, кодировка - параметр
+    encoding (по умолчанию UTF-8; для CSV из Excel - cp1251).
+
+    Файл читается потоком и загружается пачками по CLIENT_IMPORT_BATCH_SIZE
+    строк; клиент с тем же телефоном обновляется. Ответ - NDJSON по мере
+    обработки: {"type": "error", "row", "error"} для отклоненных строк,
+    {"type": "progress", ...} после каждой пачки и итог {"type": "done", ...}
+    (или {"type": "failed", ...}, если пачку не удалось записать).
+    """
+    import_format = request.args.get('format') or ('ndjson' if request.mimetype in NDJSON_MIMETYPES else 'csv')
+    if import_format not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'error': f'Неизвестный формат: {import_format}'}), 400
+    encoding = request.args.get('encoding') or 'utf-8-sig'
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return jsonify({'success': False, 'error': f'Неизвестная кодировка: {encoding}'}), 400
+    records = iter_import_records(request.stream, import_format, encoding)
+
+    def line(item):
+        return json.dumps(item, ensure_ascii=False) + '\n'
+
+    def write(batch, totals):
+        result = db.import_clients(batch)
+        totals['inserted'] += result['inserted']
+        totals['updated'] += result['updated']
+        return line({'type': 'progress', **totals})
+
+    def generate():
+        totals = {'processed': 0, 'inserted': 0, 'updated': 0, 'errors': 0}
+        batch = []
+        try:
+            for number, record in records:
+                totals['processed'] += 1
+                try:
+                    if isinstance(record, ValueError):
+                        raise record
+                    batch.append(clean_client_row(record))
+                except ValueError as e:
+                    totals['errors'] += 1
+                    yield line({'type': 'error', 'row': number, 'error': str(e)})
+                    continue
+                if len(batch) >= CLIENT_IMPORT_BATCH_SIZE:
+                    yield write(batch, totals)
+                    batch = []
+            if batch:
+                yield write(batch, totals)
+        except Exception as e:
+            # Уже записанные пачки остаются в БД, итог показывает сколько
+            yield line({'type': 'failed', 'error': str(e), **totals})
+            return
+        yield line({'type': 'done', **totals})
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/clients/<int:client_id>', methods=['GET', 'PUT', 'DELETE'])
+def client_operations(client_id):
+    """Операции с клиентом"""
+    try:
+        if request.method == 'GET':
+            client = db.get_client(client_id)
+            if client:
+                return jsonify({'success': True, 'client': dict(client)})
+            return jsonify({'success': False, 'error': 'Клиент не найден'}), 404
+
+        elif request.method == 'PUT':
+            if not request.is_json:
+                return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+            data = request.get_json()
+            success = db.update_client(client_id, **data)
+
+            if success:
+                return jsonify({'success': True, 'message': 'Клиент обновлен'})
+            return jsonify({'success': False, 'error': 'Клиент не найден'}), 404
+
+        elif request.method == 'DELETE':
+            success = db.delete_client(client_id)
+            if success:
+                return jsonify({'success': True, 'message': 'Клиент удален'})
+            return jsonify({'success': False, 'error': 'Клиент не найден'}), 404
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ========== API ДЛЯ ЗАКАЗ-НАРЯДОВ ==========
+
+@app.route('/api/work_orders')
+def list_work_orders():
+    """Страница списка заказ-нарядов (параметры search, client_id, per_page, after)"""
+    try:
+        per_page, after = get_page_args()
+        page = db.get_work_orders_page(request.args.get('search', ''),
+                                       client_id=request.args.get('client_id', type=int),
+                                       limit=per_page, after=after)
+        return page_response(page, '_work_order_rows.html', 'orders')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# В методе add_work_order в app.py исправьте генерацию номера заказа:
+@app.route('/api/work_orders/add', methods=['POST'])
+def add_work_order():
+    """Добавление нового заказ-наряда"""
+    try:
+        if not request.is_json:
+            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+        data = request.get_json()
+        print(f"Получены данные для создания заказа: {data}")
+
+        if not data.get('client_id'):
+            return jsonify({'success': False, 'error': 'Отсутствует client_id'}), 400
+        if not data.get('description'):
+            return jsonify({'success': False, 'error': 'Отсутствует description'}), 400
+
+        # Используем переданный номер или генерируем новый в БД
+        order_number = data.get('order_number')
+        if order_number == 'Загрузка...':
+            order_number = None
+
+        # Шапка, работы и запчасти сохраняются одной транзакцией
+        result = db.create_work_order_with_lines(
+            client_id=data['client_id'],
+            description=data['description'],
+            works=data.get('works', []),
+            expenses=data.get('expenses', []),
+            order_number=order_number,
+            employee_id=data.get('employee_id')
+        )
+
+        order = result['order']
+        print(f"Создан заказ ID: {order['id']}, номер: {order['order_number']}")
+
+        return jsonify({
+            'success': True,
+            'order_id': order['id'],
+            'order_number': order['order_number'],
+            'total_amount': result['total_amount'],
+            'works_total': result['works_total'],
+            'expenses_price': result['expenses_price'],
+            'markup_total': result['markup_total'],
+            'message': 'Заказ-наряд создан'
+        })
+
+    except Exception as e:
+        print(f"❌ Ошибка в add_work_order: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/work_orders/<int:order_id>', methods=['GET', 'PUT', 'DELETE'])
+def work_order_operations(order_id):
+    """Операции с заказ-нарядом"""
+    try:
+        if request.method == 'GET':
+            order = db.get_work_order_full(order_id)
+            if order:
+                print(f"Загружен заказ ID: {order_id}")  # Отладочный вывод
+                print(f"Найдено работ: {len(order['works'])}")  # Отладочный вывод
+                print(f"Найдено запчастей: {len(order['expenses'])}")  # Отладочный вывод
+
+                return jsonify({
+                    'success': True,
+                    'order': order['order'],
+                    'works': order['works'],
+                    'expenses': order['expenses']
+                })
+            return jsonify({'success': False, 'error': 'Заказ-наряд не найден'}), 404
+
+        elif request.method == 'PUT':
+            if not request.is_json:
+                return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+            data = request.get_json()
+            print(f"Получены данные для обновления заказа {order_id}: {data}")  # Отладочный вывод
+
+            # Получаем текущий заказ
+            order = db.get_work_order(order_id)
+            if not order:
+                return jsonify({'success': False, 'error': 'Заказ-наряд не найден'}), 404
+
+            order_dict = dict(order)
+            if order_dict['status'] == 'completed':
+                return jsonify({'success': False, 'error': 'Невозможно редактировать завершенный заказ'}), 400
+
+            # Шапка, работы и запчасти заменяются одной транзакцией
+            result = db.update_work_order_with_lines(
+                order_id=order_id,
+                client_id=data.get('client_id', order_dict['client_id']),
+                description=data.get('description', order_dict['description']),
+                works=data.get('works', []),
+                expenses=data.get('expenses', []),
+                employee_id=data.get('employee_id')
+            )
+
+            if not result:
+                return jsonify({'success': False, 'error': 'Не удалось обновить заказ-наряд'}), 500
+
+            return jsonify({
+                'success': True,
+                'message': 'Заказ-наряд обновлен',
+                'total_amount': result['total_amount'],
+                'works_total': result['works_total'],
+                'expenses_price': result['expenses_price'],
+                'markup_total': result['markup_total']
+            })
+
+        elif request.method == 'DELETE':
+            success = db.delete_work_order(order_id)
+            if success:
+                return jsonify({'success': True, 'message': 'Заказ-наряд удален'})
+            return jsonify({'success': False, 'error': 'Заказ-наряд не найден'}), 404
+
+    except Exception as e:
+        print(f"Ошибка в work_order_operations: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/work_orders/<int:order_id>/row')
+def work_order_row(order_id):
+    """Строка заказ-наряда для списка (обновление страницы без перезагрузки)"""
+    try:
+        order = db.get_work_order_list_item(order_id)
+        if not order:
+            return jsonify({'success': False, 'error': 'Заказ-наряд не найден'}), 404
+        return row_response(order, '_work_order_rows.html', 'orders')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/work_orders/<int:order_id>/complete', methods=['POST'])
+def complete_work_order(order_id):
+    """Завершение заказ-наряда"""
+    try:
+        # Статус, проводки в кассу и зарплата фиксируются одной транзакцией;
+        # повторный запрос не создает дублей
+        result = db.complete_work_order(order_id)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Заказ-наряд не найден'}), 404
+
+        return jsonify({
+            'success': True,
+            'message': 'Заказ-наряд уже был завершен' if result['already_completed'] else 'Заказ-наряд завершен',
+            'works_total': result['works_total'],
+            'markup_total': result['markup_total'],
+            'total_income': result['total_income'],
+            'already_completed': result['already_completed']
+        })
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except Exception as e:
+        print(f"Ошибка при завершении заказа: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/work_orders/batch', methods=['POST'])
+def batch_work_orders():
+    """Пакет операций с заказ-нарядами (status, complete, delete, update) одной транзакцией"""
+    try:
+        return batch_response(db.batch_work_orders)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/work_orders/last_number')
+def get_last_order_number():
+    """Следующий номер заказа (предпросмотр, номер не резервируется)"""
+    try:
+        date_prefix = request.args.get('date', '')
+        if not date_prefix:
+            date_prefix = datetime.now().strftime('%y%m%d')
+
+        return jsonify({
+            'success': True,
+            'next_number': db.peek_order_number(date_prefix)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': True,
+            'next_number': f"{datetime.now().strftime('%y%m%d')}-001"
+        })
+
+# ========== API ДЛЯ ЗАДАЧ ==========
+
+@app.route('/api/tasks')
+def list_tasks():
+    """Страница списка задач (параметры status, per_page, after)"""
+    try:
+        per_page, after = get_page_args()
+        page = db.get_tasks_page(request.args.get('status') or None, limit=per_page, after=after)
+        return page_response(page, '_task_rows.html', 'tasks')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/tasks/add', methods=['POST'])
+def add_task():
+    """Добавление новой задачи"""
+    try:
+        if not request.is_json:
+            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+        data = request.get_json()
+
+        if not data.get('title'):
+            return jsonify({'success': False, 'error': 'Отсутствует title'}), 400
+
+        task_id = db.add_task(
+            title=data['title'],
+            description=data.get('description', ''),
+            priority=data.get('priority', 'medium'),
+            assigned_to=data.get('assigned_to', ''),
+            due_date=data.get('due_date')
+        )
+
+        return jsonify({
+            'success': True,
+            'task_id': task_id,
+            'message': 'Задача создана'
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/tasks/<int:task_id>', methods=['GET', 'PUT', 'DELETE'])
+def task_operations(task_id):
+    """Операции с задачей"""
+    try:
+        if request.method == 'GET':
+            task = db.get_task(task_id)
+            if task:
+                return jsonify({'success': True, 'task': dict(task)})
+            return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+
+        elif request.method == 'PUT':
+            if not request.is_json:
+                return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+            data = request.get_json()
+
+            if data.get('status') == 'completed' and 'completed_at' not in data:
+                data['completed_at'] = datetime.now().isoformat()
+
+            success = db.update_task(task_id, **data)
+            if success:
+                return jsonify({'success': True, 'message': 'Задача обновлена'})
+            return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+
+        elif request.method == 'DELETE':
+            success = db.delete_task(task_id)
+            if success:
+                return jsonify({'success': True, 'message': 'Задача удалена'})
+            return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/tasks/batch', methods=['POST'])
+def batch_tasks():
+    """Пакет операций с задачами (status, delete, update) одной транзакцией"""
+    try:
+        return batch_response(db.batch_tasks)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ========== API ДЛЯ КАССЫ ==========
+
+@app.route('/api/cash')
+def list_cash_flow():
+    """Страница операций кассы (параметры period, type, category, per_page, after)"""
+    try:
+        filters = get_cash_filters()
+        per_page, after = get_page_args()
+        page = db.get_cash_flow_page(filters['start_date'],
+                                     filters['end_date'],
+                                     filters['transaction_type'] or None,
+                                     filters['category'] or None,
+                                     limit=per_page, after=after)
+        return page_response(page, '_cash_rows.html', 'cash_flow')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/cash/add', methods=['POST'])
+def add_cash_flow():
+    """Добавление операции в кассу"""
+    try:
+        if not request.is_json:
+            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+        data = request.get_json()
+
+        if not data.get('transaction_type'):
+            return jsonify({'success': False, 'error': 'Отсутствует transaction_type'}), 400
+        if not data.get('category'):
+            return jsonify({'success': False, 'error': 'Отсутствует category'}), 400
+        if not data.get('amount'):
+            return jsonify({'success': False, 'error': 'Отсутствует amount'}), 400
+        if not data.get('description'):
+            return jsonify({'success': False, 'error': 'Отсутствует description'}), 400
+
+        flow_id = db.add_cash_flow(
+            transaction_type=data['transaction_type'],
+            category=data['category'],
+            amount=data['amount'],
+            description=data['description'],
+            order_id=data.get('order_id')
+        )
+
+        return jsonify({
+            'success': True,
+            'flow_id': flow_id,
+            'message': 'Операция добавлена'
+        })
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/cash/<int:flow_id>/row')
+def cash_flow_row(flow_id):
+    """Строка операции кассы для списка (обновление страницы без перезагрузки)"""
+    try:
+        flow = db.get_cash_flow_item(flow_id)
+        if not flow:
+            return jsonify({'success': False, 'error': 'Операция не найдена'}), 404
+        return row_response(flow, '_cash_rows.html', 'cash_flow')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/cash/stats')
+def get_cash_stats():
+    """Получение финансовой статистики и общего баланса"""
+    try:
+        period = request.args.get('period', 'month')
+        stats = db.get_financial_stats(period)
+        return jsonify({'success': True, 'stats': stats, 'total_balance': db.get_total_balance()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ========== API ДЛЯ РАБОТНИКОВ ==========
+
+@app.route('/api/employees/add', methods=['POST'])
+def add_employee():
+    """Добавление нового работника"""
+    try:
+        if not request.is_json:
+            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+        data = request.get_json()
+
+        if not data.get('full_name'):
+            return jsonify({'success': False, 'error': 'Отсутствует full_name'}), 400
+        if not data.get('position'):
+            return jsonify({'success': False, 'error': 'Отсутствует position'}), 400
+        if not data.get('commission_rate'):
+            return jsonify({'success': False, 'error': 'Отсутствует commission_rate'}), 400
+
+        employee_id = db.add_employee(
+            full_name=data['full_name'],
+            position=data['position'],
+            phone=data.get('phone', ''),
+            commission_rate=data['commission_rate'],
+            hire_date=data.get('hire_date'),
+            is_active=data.get('is_active', True),
+            notes=data.get('notes', '')
+        )
+
+        return jsonify({
+            'success': True,
+            'employee_id': employee_id,
+            'message': 'Работник успешно добавлен'
+        })
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/employees/<int:employee_id>', methods=['GET', 'PUT'])
+def employee_operations(employee_id):
+    """Операции с работником"""
+    try:
+        if request.method == 'GET':
+            employee = db.get_employee_with_salary(employee_id)
+            if employee:
+                return jsonify({'success': True, 'employee': dict(employee)})
+            return jsonify({'success': False, 'error': 'Работник не найден'}), 404
+
+        elif request.method == 'PUT':
+            if not request.is_json:
+                return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+            data = request.get_json()
+            success = db.update_employee(employee_id, **data)
+
+            if success:
+                return jsonify({'success': True, 'message': 'Работник обновлен'})
+            return jsonify({'success': False, 'error': 'Работник не найден'}), 404
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/employees/<int:employee_id>/status', methods=['PUT'])
+def update_employee_status(employee_id):
+    """Обновление статуса работника"""
+    try:
+        if not request.is_json:
+            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+        data = request.get_json()
+        if 'is_active' not in data:
+            return jsonify({'success': False, 'error': 'Отсутствует is_active'}), 400
+
+        success = db.update_employee_status(employee_id, data['is_active'])
+        if success:
+            return jsonify({'success': True, 'message': 'Статус обновлен'})
+        return jsonify({'success': False, 'error': 'Работник не найден'}), 404
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/employees/<int:employee_id>/pay', methods=['POST'])
+def pay_employee_salary(employee_id):
+    """Выплата зарплаты работнику"""
+    try:
+        if not request.is_json:
+            return jsonify({'success': False, 'error': 'Требуется JSON'}), 400
+
+        data = request.get_json()
+        if not data.get('amount'):
+            return jsonify({'success': False, 'error': 'Отсутствует amount'}), 400
+
+        amount = float(data['amount'])
+
+        # Проверка задолженности, выплата и расход в кассе - одна транзакция
+        result = db.pay_employee_salary(employee_id, amount)
+        if result is None:
+            return jsonify({'success': False, 'error': 'Работник не найден'}), 404
+
+        return jsonify({
+            'success': True,
+            'message': 'Зарплата выплачена',
+            'amount': result['amount'],
+            'pending': result['pending']
+        })
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ========== ВЫГРУЗКИ ==========
+
+def gzip_chunks(chunks):
+    """Сжатие потока байтов в gzip на лету"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_response(name, header, rows):
+    """Потоковая выгрузка CSV: строки отдаются фрагментами по мере чтения из БД
+
+    rows - генератор строк (например, db.iter_cash_flow), поэтому память не
+    зависит от размера выгрузки. Параметр запроса gzip=1 - сжатый файл .csv.gz.
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=CSV_DELIMITER)
+        buffer.write('\ufeff')  # BOM: Excel открывает UTF-8 с кириллицей
+        writer.writerow(header)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+            if count % EXPORT_CHUNK_ROWS == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode('utf-8')
+
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d')}.csv"
+    chunks, mimetype = generate(), 'text/csv; charset=utf-8'
+    if request.args.get('gzip') == '1':
+        chunks, mimetype, filename = gzip_chunks(chunks), 'application/gzip', filename + '.gz'
+    return Response(chunks, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
+
+
+def format_amount(value):
+    """Сумма для CSV: два знака после точки, пусто для NULL"""
+    return '' if value is None else f'{value:.2f}'
+
+
+@app.route('/export/cash.csv')
+def export_cash():
+    """Выгрузка операций кассы (фильтры как у /cash: period или start_date/end_date, type, category)"""
+    try:
+        filters = get_cash_filters()
+    except ValueError as e:
+        return str(e), 400
+
+    rows = ((flow['id'], flow['date'], 'Доход' if flow['transaction_type'] == 'income' else 'Расход',
+             CASH_CATEGORY_NAMES.get(flow['category'], flow['category']), format_amount(flow['amount']),
+             flow['description'] or '', flow['order_id'] or '')
+            for flow in db.iter_cash_flow(filters['start_date'], filters['end_date'],
+                                          filters['transaction_type'] or None, filters['category'] or None))
+    return csv_response('cash', ['ID', 'Дата', 'Тип', 'Категория', 'Сумма', 'Описание', 'Заказ-наряд'], rows)
+
+
+@app.route('/export/work_orders.csv')
+def export_work_orders():
+    """Выгрузка заказ-нарядов (search, client_id; period или start_date/end_date, по умолчанию - все)"""
+    try:
+        start_date, end_date = get_period_dates(request.args.get('period', 'all'))
+    except ValueError as e:
+        return str(e), 400
+
+    rows = ((order['id'], order['order_number'] or '', order['created_at'],
+             WORK_ORDER_STATUS_NAMES.get(order['status'], order['status']), order['full_name'],
+             order['phone'], order['car_model'] or '', order['car_number'] or '', order['employee_name'] or '',
+             order['description'] or '', format_amount(order['total_amount']), order['completed_at'] or '')
+            for order in db.iter_work_orders(request.args.get('search') or None,
+                                             request.args.get('client_id', type=int),
+                                             start_date, end_date))
+    return csv_response('work_orders', ['ID', 'Номер', 'Создан', 'Статус', 'Клиент', 'Телефон', 'Автомобиль',
+                                        'Госномер', 'Исполнитель', 'Описание', 'Сумма', 'Завершен'], rows)
+
+
+@app.route('/export/payroll.csv')
+def export_payroll():
+    """Выгрузка начислений и выплат зарплаты (period или start_date/end_date, employee_id)"""
+    try:
+        start_date, end_date = get_period_dates(request.args.get('period', 'month'))
+    except ValueError as e:
+        return str(e), 400
+
+    rows = ((entry['date'], 'Начисление' if entry['entry_type'] == 'accrual' else 'Выплата',
+             entry['employee_name'], entry['position'] or '', entry['order_number'] or '',
+             format_amount(entry['works_total']),
+             '' if entry['commission_rate'] is None else entry['commission_rate'],
+             format_amount(entry['amount']), entry['description'] or '')
+            for entry in db.iter_payroll(start_date, end_date, request.args.get('employee_id', type=int)))
+    return csv_response('payroll', ['Дата', 'Операция', 'Работник', 'Должность', 'Заказ-наряд', 'Сумма работ',
+                                    'Процент', 'Сумма', 'Описание'], rows)
+
+
+# ========== API СИСТЕМЫ ==========
+
+@app.route('/api/system/storage')
+def get_storage_settings():
+    """Текущий профиль хранения и фактические PRAGMA SQLite"""
+    try:
+        return jsonify({'success': True, 'storage': db.get_storage_settings()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/system/cache')
+def get_cache_stats():
+    """Счетчики попаданий и промахов кэша статистики"""
+    try:
+        return jsonify({'success': True, 'stats_cache': db.get_cache_stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/system/writes')
+def get_write_batch_stats():
+    """Счетчики групповой фиксации записей"""
+    try:
+        return jsonify({'success': True, 'write_batching': db.get_write_batch_stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Метрики в формате Prometheus (сумма по всем процессам при AUTOSERVICE_METRICS_DIR)"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/api/changes')
+def get_changes():
+    """Журнал изменений после версии after (параметры after, limit, table - можно несколько)"""
+    try:
+        limit = max(1, min(request.args.get('limit', 500, type=int), 5000))
+        changes = db.get_changes(after=request.args.get('after', 0, type=int), limit=limit,
+                                 tables=request.args.getlist('table'))
+        return jsonify({'success': True, **changes})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/system/queries')
+def get_query_stats():
+    """Статистика SQL-запросов и последние медленные запросы (параметры limit, order_by)"""
+    try:
+        stats = db.get_query_stats(limit=request.args.get('limit', 50, type=int),
+                                   order_by=request.args.get('order_by', 'total_ms'))
+        if stats is None:
+            return jsonify({'success': False, 'error': 'Журнал запросов выключен'}), 404
+        return jsonify({'success': True, 'queries': stats})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ========== ЗАПУСК ПРИЛОЖЕНИЯ ==========
+
+if __name__ == '__main__':
+    print("🚀 Запуск CRM Автосервиса...")
+    clear_metrics_directory(METRICS_DIR)
     app.run(debug=True, port=5000)
\ No newline at end of file
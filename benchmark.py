@@ -0,0 +1,423 @@
+# benchmark.py
+import argparse
+import glob
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date
+
+from create_test_db import generate_large_database
+from database import Database, period_bounds
+from maintenance import check_plans
+
+
+class QueryCounter:
+    """Подсчет SQL-запросов на соединении через sqlite3 trace callback
+
+    Считаются только запросы приложения: строки триггеров ("-- ...") и
+    внутренние запросы FTS5 к теневым таблицам ('main'.'..._fts_...')
+    пропускаются.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.count = 0
+
+    def _trace(self, statement):
+        if statement.startswith('--') or "'main'." in statement:
+            return
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        self.conn.set_trace_callback(self._trace)
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.set_trace_callback(None)
+
+
+def open_benchmark_db(tmp_dir, name):
+    """Пустая БД для бенчмарка
+
+    Пул чтения отключен, чтобы все запросы шли через одно соединение
+    и их можно было посчитать.
+    """
+    return Database(os.path.join(tmp_dir, f'{name}.db'), read_pool_size=0, storage_profile='fast')
+
+
+def fill_employees(db, count, salary_rows=20, payment_rows=5):
+    """Работники с историей начислений и выплат"""
+    with db._write() as conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+                           INSERT INTO employees (full_name, position, commission_rate)
+                           VALUES (?, ?, ?)
+                           ''', [(f'Работник {i:05d}', 'Механик', 15.0) for i in range(count)])
+        cursor.execute('SELECT id FROM employees')
+        employee_ids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany('''
+                           INSERT INTO employee_salary (employee_id, amount, commission_rate, works_total)
+                           VALUES (?, ?, ?, ?)
+                           ''', [(emp_id, 150.0, 15.0, 1000.0)
+                                 for emp_id in employee_ids for _ in range(salary_rows)])
+        cursor.executemany('''
+                           INSERT INTO salary_payments (employee_id, amount)
+                           VALUES (?, ?)
+                           ''', [(emp_id, 100.0) for emp_id in employee_ids for _ in range(payment_rows)])
+
+
+def bench_employees_with_salary(tmp_dir, sizes=(10, 100, 1000), repeat=5):
+    """get_employees_with_salary: число запросов и время в зависимости от числа работников"""
+    print("\n👷 get_employees_with_salary")
+    print(f"{'работников':>12} {'запросов':>10} {'мс/вызов':>10}")
+
+    query_counts = []
+    for size in sizes:
+        db = open_benchmark_db(tmp_dir, f'employees_{size}')
+        fill_employees(db, size)
+
+        with QueryCounter(db.conn) as counter:
+            db.get_employees_with_salary()
+        query_counts.append(counter.count)
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            db.get_employees_with_salary()
+        elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+
+        print(f"{size:>12} {counter.count:>10} {elapsed_ms:>10.2f}")
+        db.close()
+
+    if len(set(query_counts)) != 1:
+        print("❌ Число запросов растет вместе с числом работников (N+1)")
+        return False
+
+    print("✅ Число запросов не зависит от числа работников")
+    return True
+
+
+def bench_write_batching(tmp_dir, threads=8, writes=50, window_ms=2):
+    """add_cash_flow из нескольких потоков: фиксация каждой записи и групповая фиксация
+
+    Профиль durable, чтобы стоимость fsync на каждую фиксацию была видна.
+    """
+    print(f"\n✍️  add_cash_flow: {threads} потоков × {writes} записей (профиль durable)")
+    print(f"{'режим':<28} {'записей/с':>10} {'транзакций':>11}")
+
+    for name, options in (('без группировки', {}),
+                          (f'группами, окно {window_ms} мс', {'batch_writes': True,
+                                                              'write_batch_window_ms': window_ms})):
+        db = Database(os.path.join(tmp_dir, f"batching_{bool(options)}.db"), read_pool_size=0,
+                      storage_profile='durable', **options)
+
+        def write():
+            for i in range(writes):
+                db.add_cash_flow('income', 'cash_in', 100, f'Бенчмарк {i}')
+
+        workers = [threading.Thread(target=write) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        batch_stats = db.get_write_batch_stats()
+        transactions = batch_stats['batches'] if batch_stats else threads * writes
+        print(f"{name:<28} {threads * writes / elapsed:>10.0f} {transactions:>11}")
+        db.close()
+
+
+# ========== НАБОРЫ ДАННЫХ ==========
+
+# Размеры фикстур: (клиентов, заказ-нарядов)
+FIXTURE_SIZES = {
+    'small': (1000, 10000),
+    'medium': (10000, 100000),
+    'large': (50000, 500000),
+}
+
+
+def get_fixture(fixtures_dir, size, seed=42):
+    """Файл фикстуры заданного размера, сгенерированный create_test_db
+
+    Фикстура строится один раз в день (история заканчивается сегодня,
+    чтобы периоды кассы попадали в данные) и переиспользуется.
+    """
+    os.makedirs(fixtures_dir, exist_ok=True)
+    today = date.today().isoformat()
+    path = os.path.join(fixtures_dir, f'{size}_seed{seed}_{today}.db')
+    if not os.path.exists(path):
+        for stale in glob.glob(os.path.join(fixtures_dir, f'{size}_seed{seed}_*.db')):
+            os.remove(stale)
+        clients, orders = FIXTURE_SIZES[size]
+        generate_large_database(path, clients=clients, orders=orders, seed=seed, end_date=today)
+    return path
+
+
+def open_fixture_copy(fixture, tmp_dir):
+    """Копия фикстуры для замеров: методы записи меняют данные
+
+    Пул чтения отключен, чтобы все запросы шли через одно соединение и
+    их можно было посчитать; кэш статистики отключен, чтобы замерять
+    запросы, а не словарь в памяти.
+    """
+    path = os.path.join(tmp_dir, os.path.basename(fixture))
+    shutil.copy(fixture, path)
+    return Database(path, read_pool_size=0, stats_cache_ttl=0)
+
+
+def check_fixture_plans(size, fixture, tmp_dir):
+    """Планы выборок кассы (maintenance.PLAN_CHECKS) на фикстуре: False при полном сканировании"""
+    print(f"\n🔎 Планы запросов кассы на фикстуре {size}")
+    db = open_fixture_copy(fixture, tmp_dir)
+    try:
+        return check_plans(db)
+    finally:
+        db.close()
+
+
+# ========== ЗАМЕРЫ ==========
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def measure(db, call, repeat):
+    """Время вызовов (мс), число запросов и пик памяти Python для call(i)"""
+    with QueryCounter(db.conn) as counter:
+        call(0)
+    queries = counter.count
+
+    tracemalloc.start()
+    call(1)
+    peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    timings = []
+    for i in range(repeat):
+        started = time.perf_counter()
+        call(i + 2)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'p50': round(percentile(timings, 0.50), 3),
+        'p95': round(percentile(timings, 0.95), 3),
+        'p99': round(percentile(timings, 0.99), 3),
+        'queries': queries,
+        'peak_kib': round(peak_kib, 1),
+    }
+
+
+def sample_ids(db):
+    """ID для замеров: клиент, заказ, работник и незавершенные заказы"""
+    with db._read() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, phone_digits FROM clients ORDER BY id DESC LIMIT 1')
+        client = cursor.fetchone()
+        cursor.execute('SELECT MAX(id) FROM work_orders')
+        order_id = cursor.fetchone()[0]
+        cursor.execute('SELECT employee_id FROM employee_balances ORDER BY pending_amount DESC LIMIT 1')
+        employee_id = cursor.fetchone()[0]
+        cursor.execute("SELECT id FROM work_orders WHERE status != 'completed' ORDER BY id")
+        open_orders = [row[0] for row in cursor.fetchall()]
+    return {
+        'client_id': client['id'],
+        'phone_prefix': client['phone_digits'][:7],
+        'order_id': order_id,
+        'employee_id': employee_id,
+        'open_orders': open_orders,
+    }
+
+
+def method_cases(ids):
+    """Методы Database: (имя, вызов(db, i))
+
+    Списки без ограничения (get_clients, get_work_orders) не замеряются:
+    страницы интерфейса используют их постраничные варианты.
+    """
+    year_start, year_end = period_bounds('year')
+    works = [{'name': 'Замена масла', 'quantity': 1, 'price': 1200}]
+    expenses = [{'name': 'Масло', 'type': 'material', 'quantity': 1, 'cost': 3000, 'markup': 20}]
+    return [
+        ('get_clients_page', lambda db, i: db.get_clients_page()),
+        ('get_clients_page(поиск)', lambda db, i: db.get_clients_page('Иванов')),
+        ('find_clients_by_phone', lambda db, i: db.find_clients_by_phone(ids['phone_prefix'], prefix=True)),
+        ('get_client', lambda db, i: db.get_client(ids['client_id'])),
+        ('get_work_orders_page', lambda db, i: db.get_work_orders_page()),
+        ('get_work_orders_page(поиск)', lambda db, i: db.get_work_orders_page('Замена')),
+        ('get_work_orders_page(клиент)', lambda db, i: db.get_work_orders_page(client_id=ids['client_id'])),
+        ('get_work_order_full', lambda db, i: db.get_work_order_full(ids['order_id'])),
+        ('get_tasks_page', lambda db, i: db.get_tasks_page()),
+        ('get_cash_flow_page', lambda db, i: db.get_cash_flow_page(year_start, year_end)),
+        ('get_cash_overview', lambda db, i: db.get_cash_overview('year')),
+        ('get_financial_stats', lambda db, i: db.get_financial_stats('year')),
+        ('get_total_balance', lambda db, i: db.get_total_balance()),
+        ('get_employees_with_salary', lambda db, i: db.get_employees_with_salary()),
+        ('get_employee_with_salary', lambda db, i: db.get_employee_with_salary(ids['employee_id'])),
+        ('get_stats', lambda db, i: db.get_stats()),
+        ('peek_order_number', lambda db, i: db.peek_order_number()),
+        ('add_client', lambda db, i: db.add_client(f'Бенчмарк {i}', f'+7 (800) {i:03d}-{i % 97:02d}-{i % 89:02d}'
+                                                    f'-{time.perf_counter_ns()}', 'Lada Vesta')),
+        ('create_work_order_with_lines', lambda db, i: db.create_work_order_with_lines(
+            ids['client_id'], 'Бенчмарк', works, expenses, employee_id=ids['employee_id'])),
+        ('complete_work_order', lambda db, i: db.complete_work_order(
+            ids['open_orders'][i % len(ids['open_orders'])])),
+        ('add_cash_flow', lambda db, i: db.add_cash_flow('expense', 'other_expense', 100, 'Бенчмарк')),
+        ('pay_employee_salary', lambda db, i: db.pay_employee_salary(ids['employee_id'], 0.01)),
+    ]
+
+
+def route_cases(ids):
+    """Ключевые маршруты Flask: (имя, вызов(client, i))"""
+    def complete(client, i):
+        order_id = ids['open_orders'][i % len(ids['open_orders'])]
+        return client.post(f'/api/work_orders/{order_id}/complete')
+
+    return [
+        ('GET /', lambda client, i: client.get('/')),
+        ('GET /clients?search=', lambda client, i: client.get('/clients?search=Петров')),
+        ('GET /work_orders', lambda client, i: client.get('/work_orders')),
+        ('GET /cash?period=year', lambda client, i: client.get('/cash?period=year')),
+        ('GET /employees', lambda client, i: client.get('/employees')),
+        ('POST /api/work_orders/<id>/complete', complete),
+    ]
+
+
+def checked(response):
+    """Ответ маршрута без ошибки сервера"""
+    if response.status_code >= 500:
+        raise RuntimeError(f'HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    return response
+
+
+def bench_fixture(size, fixture, tmp_dir, repeat):
+    """Замеры методов Database и маршрутов на одной фикстуре"""
+    results = {}
+
+    db = open_fixture_copy(fixture, tmp_dir)
+    ids = sample_ids(db)
+    for name, call in method_cases(ids):
+        results[name] = measure(db, lambda i, call=call: call(db, i), repeat)
+    db.close()
+
+    # Маршруты - на свежей копии, через тестовый клиент Flask
+    db = open_fixture_copy(fixture, tmp_dir)
+    ids = sample_ids(db)
+    # app открывает свою БД при импорте - направляем ее на копию фикстуры,
+    # чтобы рабочая autoservice.db не затрагивалась
+    if 'app' not in sys.modules:
+        os.environ['AUTOSERVICE_DB'] = db.db_name
+    import app as app_module
+    previous_db, app_module.db = app_module.db, db
+    client = app_module.app.test_client()
+    try:
+        for name, call in route_cases(ids):
+            results[name] = measure(db, lambda i, call=call: checked(call(client, i)), repeat)
+    finally:
+        app_module.db = previous_db
+        db.close()
+
+    return results
+
+
+def print_results(size, results):
+    print(f"\n📦 {size}")
+    print(f"{'операция':<40} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'запросов':>9} {'пик КиБ':>9}")
+    for name, r in results.items():
+        print(f"{name:<40} {r['p50']:>9.2f} {r['p95']:>9.2f} {r['p99']:>9.2f} {r['queries']:>9} {r['peak_kib']:>9.1f}")
+
+
+def compare_with_baseline(results, baseline, tolerance, min_delta_ms):
+    """Регрессии относительно базовой линии
+
+    Регрессия - рост p95 больше чем на tolerance (доля) и на min_delta_ms,
+    или рост числа запросов.
+    """
+    regressions = []
+    for size, cases in results.items():
+        for name, current in cases.items():
+            base = baseline.get(size, {}).get(name)
+            if not base:
+                continue
+            slower = (current['p95'] > base['p95'] * (1 + tolerance)
+                      and current['p95'] - base['p95'] > min_delta_ms)
+            if slower:
+                regressions.append(f"{size} / {name}: p95 {base['p95']:.2f} → {current['p95']:.2f} мс")
+            if current['queries'] > base['queries']:
+                regressions.append(f"{size} / {name}: запросов {base['queries']} → {current['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки слоя данных и маршрутов CRM автосервиса')
+    parser.add_argument('--sizes', default='10,100,1000',
+                        help='число работников для проверки N+1 через запятую (по умолчанию 10,100,1000)')
+    parser.add_argument('--fixtures', default='small',
+                        help=f"размеры фикстур через запятую: {', '.join(FIXTURE_SIZES)} (по умолчанию small); "
+                             f"пустая строка - без фикстур")
+    parser.add_argument('--fixtures-dir', default='.bench_fixtures', help='каталог сгенерированных фикстур')
+    parser.add_argument('--seed', type=int, default=42, help='seed генератора фикстур')
+    parser.add_argument('--repeat', type=int, default=50, help='повторов каждого замера (по умолчанию 50)')
+    parser.add_argument('--baseline', help='JSON базовой линии: регрессии завершают запуск с кодом 1')
+    parser.add_argument('--save-baseline', help='сохранить результаты в JSON как новую базовую линию')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='допустимый рост p95 относительно базовой линии (по умолчанию 0.5 = 50%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='рост p95 меньше этого значения не считается регрессией (по умолчанию 2 мс)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    fixtures = [size for size in args.fixtures.split(',') if size]
+    for size in fixtures:
+        if size not in FIXTURE_SIZES:
+            parser.error(f'неизвестный размер фикстуры: {size}')
+
+    tmp_dir = tempfile.mkdtemp(prefix='autoservice_bench_')
+    results = {}
+    try:
+        ok = bench_employees_with_salary(tmp_dir, sizes)
+        bench_write_batching(tmp_dir)
+        for size in fixtures:
+            fixture = get_fixture(args.fixtures_dir, size, args.seed)
+            ok = check_fixture_plans(size, fixture, tmp_dir) and ok
+            results[size] = bench_fixture(size, fixture, tmp_dir, args.repeat)
+            print_results(size, results[size])
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    max_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\n🧠 Пиковый RSS процесса: {max_rss_mib:.1f} МиБ")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"💾 Базовая линия сохранена: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n❌ Регрессии относительно {args.baseline}: {len(regressions)}")
+            for line in regressions:
+                print(f"  {line}")
+            ok = False
+        else:
+            print(f"\n✅ Регрессий относительно {args.baseline} нет")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
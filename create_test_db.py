@@ -1,459 +1,855 @@
-# create_test_db.py
-import sqlite3
-from datetime import datetime, timedelta
-import random
-
-
-def create_test_database(db_name='autoservice_test.db'):
-    """Создание тестовой базы данных с примерами"""
-
-    conn = sqlite3.connect(db_name)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    print(f"🔧 Создание тестовой базы данных: {db_name}")
-
-    # ========== СОЗДАНИЕ ТАБЛИЦ ==========
-
-    # Удаляем старые таблицы если они есть
-    cursor.execute('DROP TABLE IF EXISTS order_expenses')
-    cursor.execute('DROP TABLE IF EXISTS order_works')
-    cursor.execute('DROP TABLE IF EXISTS work_orders')
-    cursor.execute('DROP TABLE IF EXISTS tasks')
-    cursor.execute('DROP TABLE IF EXISTS cash_flow')
-    cursor.execute('DROP TABLE IF EXISTS clients')
-    cursor.execute('DROP TABLE IF EXISTS settings')
-
-    # Включаем поддержку внешних ключей
-    cursor.execute('PRAGMA foreign_keys = ON')
-
-    # Клиенты
-    cursor.execute('''
-                   CREATE TABLE clients
-                   (
-                       id         INTEGER PRIMARY KEY AUTOINCREMENT,
-                       full_name  TEXT NOT NULL,
-                       phone      TEXT NOT NULL UNIQUE,
-                       car_model  TEXT NOT NULL,
-                       car_number TEXT,
-                       car_year   INTEGER,
-                       vin        TEXT,
-                       notes      TEXT,
-                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                   )
-                   ''')
-
-    # Заказ-наряды
-    cursor.execute('''
-                   CREATE TABLE work_orders
-                   (
-                       id           INTEGER PRIMARY KEY AUTOINCREMENT,
-                       client_id    INTEGER NOT NULL,
-                       order_number TEXT UNIQUE,
-                       description  TEXT    NOT NULL,
-                       status       TEXT      DEFAULT 'new',
-                       total_amount REAL      DEFAULT 0,
-                       created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                       completed_at TIMESTAMP,
-                       FOREIGN KEY (client_id) REFERENCES clients (id) ON DELETE CASCADE
-                   )
-                   ''')
-
-    # Работы в заказ-наряде
-    cursor.execute('''
-                   CREATE TABLE order_works
-                   (
-                       id             INTEGER PRIMARY KEY AUTOINCREMENT,
-                       order_id       INTEGER NOT NULL,
-                       work_name      TEXT    NOT NULL,
-                       quantity       INTEGER DEFAULT 1,
-                       price_per_unit REAL    DEFAULT 0,
-                       total_price    REAL    DEFAULT 0,
-                       FOREIGN KEY (order_id) REFERENCES work_orders (id) ON DELETE CASCADE
-                   )
-                   ''')
-
-    # Расходы в заказ-наряде
-    cursor.execute('''
-                   CREATE TABLE order_expenses
-                   (
-                       id            INTEGER PRIMARY KEY AUTOINCREMENT,
-                       order_id      INTEGER NOT NULL,
-                       expense_name  TEXT    NOT NULL,
-                       expense_type  TEXT    DEFAULT 'material',
-                       quantity      INTEGER DEFAULT 1,
-                       cost_per_unit REAL    DEFAULT 0,
-                       total_cost    REAL    DEFAULT 0,
-                       notes         TEXT,
-                       FOREIGN KEY (order_id) REFERENCES work_orders (id) ON DELETE CASCADE
-                   )
-                   ''')
-
-    # Задачи
-    cursor.execute('''
-                   CREATE TABLE tasks
-                   (
-                       id           INTEGER PRIMARY KEY AUTOINCREMENT,
-                       title        TEXT NOT NULL,
-                       description  TEXT,
-                       priority     TEXT      DEFAULT 'medium',
-                       status       TEXT      DEFAULT 'pending',
-                       assigned_to  TEXT,
-                       due_date     TIMESTAMP,
-                       created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                       completed_at TIMESTAMP
-                   )
-                   ''')
-
-    # Касса (доходы и расходы)
-    cursor.execute('''
-                   CREATE TABLE cash_flow
-                   (
-                       id               INTEGER PRIMARY KEY AUTOINCREMENT,
-                       transaction_type TEXT NOT NULL,
-                       category         TEXT NOT NULL,
-                       amount           REAL NOT NULL,
-                       description      TEXT,
-                       order_id         INTEGER,
-                       date             TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                       created_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                       FOREIGN KEY (order_id) REFERENCES work_orders (id) ON DELETE SET NULL
-                   )
-                   ''')
-
-    # Настройки
-    cursor.execute('''
-                   CREATE TABLE settings
-                   (
-                       id         INTEGER PRIMARY KEY AUTOINCREMENT,
-                       key        TEXT NOT NULL UNIQUE,
-                       value      TEXT,
-                       category   TEXT      DEFAULT 'general',
-                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                       updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                   )
-                   ''')
-
-    # Индексы
-    cursor.execute('CREATE INDEX idx_clients_phone ON clients(phone)')
-    cursor.execute('CREATE INDEX idx_orders_status ON work_orders(status)')
-    cursor.execute('CREATE INDEX idx_cashflow_date ON cash_flow(date)')
-    cursor.execute('CREATE INDEX idx_cashflow_type ON cash_flow(transaction_type)')
-
-    print("✅ Таблицы созданы")
-
-    # ========== ТЕСТОВЫЕ ДАННЫЕ ==========
-
-    # Настройки по умолчанию
-    print("\n📝 Добавление настроек...")
-    default_settings = [
-        ('dashboard_period', 'month', 'dashboard'),
-        ('dashboard_show_expenses', 'true', 'dashboard'),
-        ('dashboard_quick_actions', 'new_client,new_order,new_task,cash_view', 'dashboard'),
-        ('tax_rate', '20', 'finance'),
-        ('currency', '₽', 'general'),
-        ('company_name', 'Тестовый Автосервис', 'general')
-    ]
-
-    for key, value, category in default_settings:
-        cursor.execute('''
-                       INSERT INTO settings (key, value, category)
-                       VALUES (?, ?, ?)
-                       ''', (key, value, category))
-
-    print("✅ Настройки добавлены")
-
-    # Тестовые клиенты
-    print("\n👥 Добавление тестовых клиентов...")
-    clients = [
-        ('Иванов Иван Иванович', '+79161234567', 'Toyota Camry', 'А123ВС77', 2020, 'JTDBR32E160123456',
-         'Постоянный клиент, VIP'),
-        ('Петров Петр Петрович', '+79165556677', 'Lada Vesta', 'В456ОР78', 2021, 'XTA210300Y1234567', 'Новый клиент'),
-        ('Сидорова Анна Сергеевна', '+79167778899', 'Hyundai Solaris', 'С789ТУ79', 2019, 'Z94CB41AAGR123456',
-         'Часто обслуживается'),
-        ('Козлов Алексей Владимирович', '+79169990011', 'Kia Rio', 'Е012ХК80', 2022, 'KNAGN814BC1234567',
-         'Корпоративный клиент'),
-        ('Морозова Екатерина Дмитриевна', '+79162223344', 'Volkswagen Polo', 'М345РА81', 2021, 'WVWZZZ6RZBY123456',
-         'Сервисное обслуживание')
-    ]
-
-    client_ids = []
-    for client in clients:
-        cursor.execute('''
-                       INSERT INTO clients (full_name, phone, car_model, car_number, car_year, vin, notes)
-                       VALUES (?, ?, ?, ?, ?, ?, ?)
-                       ''', client)
-        client_ids.append(cursor.lastrowid)
-
-    print(f"✅ Добавлено {len(clients)} клиентов")
-
-    # Тестовые заказ-наряды
-    print("\n📋 Добавление тестовых заказ-нарядов...")
-    order_descriptions = [
-        'Замена масла и фильтров',
-        'Диагностика ходовой части',
-        'Ремонт тормозной системы',
-        'Замена свечей зажигания',
-        'Комплексное обслуживание'
-    ]
-
-    order_statuses = ['new', 'in_progress', 'completed', 'completed', 'completed']
-    order_ids = []
-
-    for i in range(5):
-        date_str = datetime.now().strftime("%y%m%d")
-        order_number = f"{date_str}-{i + 1:03d}"
-        client_id = client_ids[i]
-        status = order_statuses[i]
-        total_amount = random.randint(5000, 30000)
-
-        cursor.execute('''
-                       INSERT INTO work_orders (client_id, order_number, description, status, total_amount)
-                       VALUES (?, ?, ?, ?, ?)
-                       ''', (client_id, order_number, order_descriptions[i], status, total_amount))
-
-        order_id = cursor.lastrowid
-        order_ids.append(order_id)
-
-        # Для завершенных заказов добавляем дату завершения
-        if status == 'completed':
-            completed_date = datetime.now() - timedelta(days=random.randint(1, 30))
-            cursor.execute('UPDATE work_orders SET completed_at = ? WHERE id = ?',
-                           (completed_date.strftime('%Y-%m-%d %H:%M:%S'), order_id))
-
-    print(f"✅ Добавлено {len(order_ids)} заказ-нарядов")
-
-    # Тестовые работы в заказ-нарядах
-    print("\n🔧 Добавление тестовых работ...")
-    works = [
-        ['Замена моторного масла', 'Замена масляного фильтра', 'Диагностика двигателя'],
-        ['Диагностика подвески', 'Замена амортизаторов', 'Балансировка колес'],
-        ['Замена тормозных колодок', 'Замена тормозных дисков', 'Прокачка тормозов'],
-        ['Замена свечей зажигания', 'Чистка инжектора', 'Диагностика зажигания'],
-        ['Комплексная диагностика', 'Замена всех жидкостей', 'Регулировка фар']
-    ]
-
-    for i, order_id in enumerate(order_ids):
-        for work_name in works[i]:
-            quantity = random.randint(1, 3)
-            price = random.randint(500, 5000)
-            total = quantity * price
-
-            cursor.execute('''
-                           INSERT INTO order_works (order_id, work_name, quantity, price_per_unit, total_price)
-                           VALUES (?, ?, ?, ?, ?)
-                           ''', (order_id, work_name, quantity, price, total))
-
-    print("✅ Работы добавлены")
-
-    # Тестовые расходы в заказ-нарядах
-    print("\n💰 Добавление тестовых расходов...")
-    expense_types = ['material', 'parts', 'other']
-    expense_items = [
-        ['Моторное масло 5W-30', 'Масляный фильтр', 'Воздушный фильтр'],
-        ['Амортизатор передний', 'Сайлентблок', 'Шаровая опора'],
-        ['Тормозные колодки', 'Тормозные диски', 'Тормозная жидкость'],
-        ['Свечи зажигания', 'ВВ провода', 'Катушка зажигания'],
-        ['Охлаждающая жидкость', 'Трансмиссионное масло', 'Жидкость ГУР']
-    ]
-
-    for i, order_id in enumerate(order_ids):
-        for expense_name in expense_items[i]:
-            expense_type = random.choice(expense_types)
-            quantity = random.randint(1, 4)
-            cost = random.randint(300, 4000)
-            total = quantity * cost
-
-            cursor.execute('''
-                           INSERT INTO order_expenses (order_id, expense_name, expense_type, quantity, cost_per_unit,
-                                                       total_cost)
-                           VALUES (?, ?, ?, ?, ?, ?)
-                           ''', (order_id, expense_name, expense_type, quantity, cost, total))
-
-    print("✅ Расходы добавлены")
-
-    # Тестовые задачи
-    print("\n📋 Добавление тестовых задач...")
-    tasks = [
-        ('Позвонить клиенту Иванову', 'Уточнить время визита', 'high', 'pending', 'Механик 1',
-         (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')),
-        ('Заказать запчасти', 'Тормозные колодки для Lada Vesta', 'medium', 'in_progress', 'Менеджер',
-         (datetime.now() + timedelta(days=3)).strftime('%Y-%m-%d')),
-        ('Составить отчет за месяц', 'Финансовый отчет', 'low', 'pending', 'Администратор',
-         (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')),
-        ('Провести инвентаризацию', 'Склад запчастей', 'medium', 'completed', 'Складской',
-         (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')),
-        ('Обновить программное обеспечение', 'Обновить CRM систему', 'high', 'in_progress', 'IT специалист',
-         (datetime.now() + timedelta(days=2)).strftime('%Y-%m-%d'))
-    ]
-
-    for task in tasks:
-        cursor.execute('''
-                       INSERT INTO tasks (title, description, priority, status, assigned_to, due_date)
-                       VALUES (?, ?, ?, ?, ?, ?)
-                       ''', task)
-
-    print("✅ Задачи добавлены")
-
-    # Тестовые операции кассы
-    print("\n💵 Добавление тестовых операций кассы...")
-
-    # Доходы от завершенных заказов
-    for i, order_id in enumerate(order_ids[:3]):  # Только первые 3 заказа как завершенные
-        cursor.execute('SELECT order_number, total_amount FROM work_orders WHERE id = ?', (order_id,))
-        order = cursor.fetchone()
-
-        if order and order['total_amount'] > 0:
-            date = datetime.now() - timedelta(days=random.randint(1, 30))
-
-            cursor.execute('''
-                           INSERT INTO cash_flow (transaction_type, category, amount, description, order_id, date)
-                           VALUES ('income', 'order_income', ?, ?, ?, ?)
-                           ''', (order['total_amount'], f'Доход от заказа {order["order_number"]}', order_id,
-                                 date.strftime('%Y-%m-%d %H:%M:%S')))
-
-    # Прочие доходы
-    other_incomes = [
-        ('income', 'other_income', 15000, 'Продажа запчастей со склада'),
-        ('income', 'other_income', 8000, 'Дополнительные услуги'),
-    ]
-
-    for income in other_incomes:
-        date = datetime.now() - timedelta(days=random.randint(5, 20))
-        cursor.execute('''
-                       INSERT INTO cash_flow (transaction_type, category, amount, description, date)
-                       VALUES (?, ?, ?, ?, ?)
-                       ''', (*income, date.strftime('%Y-%m-%d %H:%M:%S')))
-
-    # Расходы
-    expenses = [
-        ('expense', 'material', 12000, 'Закупка материалов'),
-        ('expense', 'parts', 25000, 'Закупка запчастей'),
-        ('expense', 'salary', 150000, 'Зарплата сотрудникам'),
-        ('expense', 'rent', 50000, 'Аренда помещения'),
-        ('expense', 'utilities', 15000, 'Коммунальные услуги'),
-        ('expense', 'other_expense', 8000, 'Прочие расходы')
-    ]
-
-    for expense in expenses:
-        date = datetime.now() - timedelta(days=random.randint(1, 30))
-        cursor.execute('''
-                       INSERT INTO cash_flow (transaction_type, category, amount, description, date)
-                       VALUES (?, ?, ?, ?, ?)
-                       ''', (*expense, date.strftime('%Y-%m-%d %H:%M:%S')))
-
-    print("✅ Операции кассы добавлены")
-
-    # ========== ПРОВЕРКА ДАННЫХ ==========
-
-    conn.commit()
-
-    print("\n" + "=" * 50)
-    print("📊 СТАТИСТИКА ТЕСТОВОЙ БАЗЫ ДАННЫХ")
-    print("=" * 50)
-
-    # Подсчет записей
-    tables = ['clients', 'work_orders', 'order_works', 'order_expenses', 'tasks', 'cash_flow', 'settings']
-
-    for table in tables:
-        cursor.execute(f'SELECT COUNT(*) as count FROM {table}')
-        count = cursor.fetchone()['count']
-        print(f"📁 {table:15} → {count:3} записей")
-
-    # Финансовая статистика
-    cursor.execute('SELECT COALESCE(SUM(total_amount), 0) FROM work_orders WHERE status = "completed"')
-    total_revenue = cursor.fetchone()[0]
-
-    cursor.execute('SELECT COALESCE(SUM(amount), 0) FROM cash_flow WHERE transaction_type = "income"')
-    total_income = cursor.fetchone()[0]
-
-    cursor.execute('SELECT COALESCE(SUM(amount), 0) FROM cash_flow WHERE transaction_type = "expense"')
-    total_expenses = cursor.fetchone()[0]
-
-    print("\n💰 ФИНАНСОВАЯ СТАТИСТИКА:")
-    print(f"Выручка от заказов: {total_revenue:,.2f} ₽")
-    print(f"Доходы в кассе:     {total_income:,.2f} ₽")
-    print(f"Расходы в кассе:    {total_expenses:,.2f} ₽")
-    print(f"Баланс:             {total_income - total_expenses:,.2f} ₽")
-
-    # Статистика по заказам
-    cursor.execute('SELECT status, COUNT(*) as count FROM work_orders GROUP BY status')
-    order_stats = cursor.fetchall()
-
-    print("\n📋 СТАТУСЫ ЗАКАЗ-НАРЯДОВ:")
-    for stat in order_stats:
-        print(f"  {stat['status']:12} → {stat['count']:2} шт.")
-
-    conn.close()
-
-    print("\n" + "=" * 50)
-    print("✅ ТЕСТОВАЯ БАЗА ДАННЫХ УСПЕШНО СОЗДАНА!")
-    print(f"📁 Файл: {db_name}")
-    print("=" * 50)
-
-    print("\n🎯 ДЛЯ ИСПОЛЬЗОВАНИЯ:")
-    print("1. Переименуйте файл в app.py:")
-    print("   database = Database('autoservice_test.db')")
-    print("\n2. Или создайте копию для тестирования:")
-    print("   import shutil")
-    print("   shutil.copy('autoservice_test.db', 'autoservice.db')")
-
-
-def create_database_with_realistic_data(db_name='autoservice_realistic.db'):
-    """Создание базы данных с более реалистичными данными"""
-
-    conn = sqlite3.connect(db_name)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    print(f"\n🔧 Создание реалистичной базы данных: {db_name}")
-
-    # Создаем те же таблицы
-    create_test_database.__code__ = create_test_database.__code__  # Просто чтобы использовать ту же логику
-
-    # Но добавляем больше данных
-    print("Добавляем расширенные тестовые данные...")
-
-    conn.close()
-
-    return db_name
-
-
-def copy_to_main_db():
-    """Копирование тестовой БД в основную"""
-    import shutil
-    import os
-
-    if not os.path.exists('autoservice_test.db'):
-        print("❌ Файл autoservice_test.db не найден!")
-        print("   Сначала запустите create_test_database()")
-        return
-
-    try:
-        shutil.copy('autoservice_test.db', 'autoservice.db')
-        print("✅ Тестовая БД скопирована в autoservice.db")
-        print("🎯 Теперь можно запускать основное приложение!")
-    except Exception as e:
-        print(f"❌ Ошибка при копировании: {e}")
-
-
-if __name__ == '__main__':
-    print("=" * 60)
-    print("🛠️  ГЕНЕРАТОР ТЕСТОВОЙ БАЗЫ ДАННЫХ ДЛЯ CRM АВТОСЕРВИСА")
-    print("=" * 60)
-    print("\nВыберите действие:")
-    print("1. Создать тестовую БД (autoservice_test.db)")
-    print("2. Создать и скопировать в основную БД")
-    print("3. Только скопировать существующую тестовую БД")
-
-    choice = input("\nВаш выбор (1-3): ").strip()
-
-    if choice == '1':
-        create_test_database('autoservice_test.db')
-    elif choice == '2':
-        create_test_database('autoservice_test.db')
-        copy_to_main_db()
-    elif choice == '3':
-        copy_to_main_db()
-    else:
-        print("❌ Неверный выбор. Завершение.")
\ No newline at end of file
+# create_test_db.py
+import argparse
+import bisect
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+import random
+
+from database import Database, normalize_phone, normalize_plate
+
+
+def create_test_database(db_name='autoservice_test.db'):
+    """Создание тестовой базы данных с примерами"""
+
+    conn = sqlite3.connect(db_name)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    print(f"🔧 Создание тестовой базы данных: {db_name}")
+
+    # ========== СОЗДАНИЕ ТАБЛИЦ ==========
+
+    # Удаляем старые таблицы если они есть
+    cursor.execute('DROP TABLE IF EXISTS order_expenses')
+    cursor.execute('DROP TABLE IF EXISTS order_works')
+    cursor.execute('DROP TABLE IF EXISTS work_orders')
+    cursor.execute('DROP TABLE IF EXISTS tasks')
+    cursor.execute('DROP TABLE IF EXISTS cash_flow')
+    cursor.execute('DROP TABLE IF EXISTS clients')
+    cursor.execute('DROP TABLE IF EXISTS settings')
+
+    # Включаем поддержку внешних ключей
+    cursor.execute('PRAGMA foreign_keys = ON')
+
+    # Клиенты
+    cursor.execute('''
+                   CREATE TABLE clients
+                   (
+                       id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                       full_name  TEXT NOT NULL,
+                       phone      TEXT NOT NULL UNIQUE,
+                       car_model  TEXT NOT NULL,
+                       car_number TEXT,
+                       car_year   INTEGER,
+                       vin        TEXT,
+                       notes      TEXT,
+                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                   )
+                   ''')
+
+    # Заказ-наряды
+    cursor.execute('''
+                   CREATE TABLE work_orders
+                   (
+                       id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                       client_id    INTEGER NOT NULL,
+                       order_number TEXT UNIQUE,
+                       description  TEXT    NOT NULL,
+                       status       TEXT      DEFAULT 'new',
+                       total_amount REAL      DEFAULT 0,
+                       created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                       completed_at TIMESTAMP,
+                       FOREIGN KEY (client_id) REFERENCES clients (id) ON DELETE CASCADE
+                   )
+                   ''')
+
+    # Работы в заказ-наряде
+    cursor.execute('''
+                   CREATE TABLE order_works
+                   (
+                       id             INTEGER PRIMARY KEY AUTOINCREMENT,
+                       order_id       INTEGER NOT NULL,
+                       work_name      TEXT    NOT NULL,
+                       quantity       INTEGER DEFAULT 1,
+                       price_per_unit REAL    DEFAULT 0,
+                       total_price    REAL    DEFAULT 0,
+                       FOREIGN KEY (order_id) REFERENCES work_orders (id) ON DELETE CASCADE
+                   )
+                   ''')
+
+    # Расходы в заказ-наряде
+    cursor.execute('''
+                   CREATE TABLE order_expenses
+                   (
+                       id            INTEGER PRIMARY KEY AUTOINCREMENT,
+                       order_id      INTEGER NOT NULL,
+                       expense_name  TEXT    NOT NULL,
+                       expense_type  TEXT    DEFAULT 'material',
+                       quantity      INTEGER DEFAULT 1,
+                       cost_per_unit REAL    DEFAULT 0,
+                       total_cost    REAL    DEFAULT 0,
+                       notes         TEXT,
+                       FOREIGN KEY (order_id) REFERENCES work_orders (id) ON DELETE CASCADE
+                   )
+                   ''')
+
+    # Задачи
+    cursor.execute('''
+                   CREATE TABLE tasks
+                   (
+                       id           INTEGER PRIMARY KEY AUTOINCREMENT,
+                       title        TEXT NOT NULL,
+                       description  TEXT,
+                       priority     TEXT      DEFAULT 'medium',
+                       status       TEXT      DEFAULT 'pending',
+                       assigned_to  TEXT,
+                       due_date     TIMESTAMP,
+                       created_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                       completed_at TIMESTAMP
+                   )
+                   ''')
+
+    # Касса (доходы и расходы)
+    cursor.execute('''
+                   CREATE TABLE cash_flow
+                   (
+                       id               INTEGER PRIMARY KEY AUTOINCREMENT,
+                       transaction_type TEXT NOT NULL,
+                       category         TEXT NOT NULL,
+                       amount           REAL NOT NULL,
+                       description      TEXT,
+                       order_id         INTEGER,
+                       date             TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                       created_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                       FOREIGN KEY (order_id) REFERENCES work_orders (id) ON DELETE SET NULL
+                   )
+                   ''')
+
+    # Настройки
+    cursor.execute('''
+                   CREATE TABLE settings
+                   (
+                       id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                       key        TEXT NOT NULL UNIQUE,
+                       value      TEXT,
+                       category   TEXT      DEFAULT 'general',
+                       created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                       updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                   )
+                   ''')
+
+    # Индексы
+    cursor.execute('CREATE INDEX idx_clients_phone ON clients(phone)')
+    cursor.execute('CREATE INDEX idx_orders_status ON work_orders(status)')
+    cursor.execute('CREATE INDEX idx_cashflow_date ON cash_flow(date)')
+    cursor.execute('CREATE INDEX idx_cashflow_type ON cash_flow(transaction_type)')
+
+    print("✅ Таблицы созданы")
+
+    # ========== ТЕСТОВЫЕ ДАННЫЕ ==========
+
+    # Настройки по умолчанию
+    print("\n📝 Добавление настроек...")
+    default_settings = [
+        ('dashboard_period', 'month', 'dashboard'),
+        ('dashboard_show_expenses', 'true', 'dashboard'),
+        ('dashboard_quick_actions', 'new_client,new_order,new_task,cash_view', 'dashboard'),
+        ('tax_rate', '20', 'finance'),
+        ('currency', '₽', 'general'),
+        ('company_name', 'Тестовый Автосервис', 'general')
+    ]
+
+    for key, value, category in default_settings:
+        cursor.execute('''
+                       INSERT INTO settings (key, value, category)
+                       VALUES (?, ?, ?)
+                       ''', (key, value, category))
+
+    print("✅ Настройки добавлены")
+
+    # Тестовые клиенты
+    print("\n👥 Добавление тестовых клиентов...")
+    clients = [
+        ('Иванов Иван Иванович', '+79161234567', 'Toyota Camry', 'А123ВС77', 2020, 'JTDBR32E160123456',
+         'Постоянный клиент, VIP'),
+        ('Петров Петр Петрович', '+79165556677', 'Lada Vesta', 'В456ОР78', 2021, 'XTA210300Y1234567', 'Новый клиент'),
+        ('Сидорова Анна Сергеевна', '+79167778899', 'Hyundai Solaris', 'С789ТУ79', 2019, 'Z94CB41AAGR123456',
+         'Часто обслуживается'),
+        ('Козлов Алексей Владимирович', '+79169990011', 'Kia Rio', 'Е012ХК80', 2022, 'KNAGN814BC1234567',
+         'Корпоративный клиент'),
+        ('Морозова Екатерина Дмитриевна', '+79162223344', 'Volkswagen Polo', 'М345РА81', 2021, 'WVWZZZ6RZBY123456',
+         'Сервисное обслуживание')
+    ]
+
+    client_ids = []
+    for client in clients:
+        cursor.execute('''
+                       INSERT INTO clients (full_name, phone, car_model, car_number, car_year, vin, notes)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       ''', client)
+        client_ids.append(cursor.lastrowid)
+
+    print(f"✅ Добавлено {len(clients)} клиентов")
+
+    # Тестовые заказ-наряды
+    print("\n📋 Добавление тестовых заказ-нарядов...")
+    order_descriptions = [
+        'Замена масла и фильтров',
+        'Диагностика ходовой части',
+        'Ремонт тормозной системы',
+        'Замена свечей зажигания',
+        'Комплексное обслуживание'
+    ]
+
+    order_statuses = ['new', 'in_progress', 'completed', 'completed', 'completed']
+    order_ids = []
+
+    for i in range(5):
+        date_str = datetime.now().strftime("%y%m%d")
+        order_number = f"{date_str}-{i + 1:03d}"
+        client_id = client_ids[i]
+        status = order_statuses[i]
+        total_amount = random.randint(5000, 30000)
+
+        cursor.execute('''
+                       INSERT INTO work_orders (client_id, order_number, description, status, total_amount)
+                       VALUES (?, ?, ?, ?, ?)
+                       ''', (client_id, order_number, order_descriptions[i], status, total_amount))
+
+        order_id = cursor.lastrowid
+        order_ids.append(order_id)
+
+        # Для завершенных заказов добавляем дату завершения
+        if status == 'completed':
+            completed_date = datetime.now() - timedelta(days=random.randint(1, 30))
+            cursor.execute('UPDATE work_orders SET completed_at = ? WHERE id = ?',
+                           (completed_date.strftime('%Y-%m-%d %H:%M:%S'), order_id))
+
+    print(f"✅ Добавлено {len(order_ids)} заказ-нарядов")
+
+    # Тестовые работы в заказ-нарядах
+    print("\n🔧 Добавление тестовых работ...")
+    works = [
+        ['Замена моторного масла', 'Замена масляного фильтра', 'Диагностика двигателя'],
+        ['Диагностика подвески', 'Замена амортизаторов', 'Балансировка колес'],
+        ['Замена тормозных колодок', 'Замена тормозных дисков', 'Прокачка тормозов'],
+        ['Замена свечей зажигания', 'Чистка инжектора', 'Диагностика зажигания'],
+        ['Комплексная диагностика', 'Замена всех жидкостей', 'Регулировка фар']
+    ]
+
+    for i, order_id in enumerate(order_ids):
+        for work_name in works[i]:
+            quantity = random.randint(1, 3)
+            price = random.randint(500, 5000)
+            total = quantity * price
+
+            cursor.execute('''
+                           INSERT INTO order_works (order_id, work_name, quantity, price_per_unit, total_price)
+                           VALUES (?, ?, ?, ?, ?)
+                           ''', (order_id, work_name, quantity, price, total))
+
+    print("✅ Работы добавлены")
+
+    # Тестовые расходы в заказ-нарядах
+    print("\n💰 Добавление тестовых расходов...")
+    expense_types = ['material', 'parts', 'other']
+    expense_items = [
+        ['Моторное масло 5W-30', 'Масляный фильтр', 'Воздушный фильтр'],
+        ['Амортизатор передний', 'Сайлентблок', 'Шаровая опора'],
+        ['Тормозные колодки', 'Тормозные диски', 'Тормозная жидкость'],
+        ['Свечи зажигания', 'ВВ провода', 'Катушка зажигания'],
+        ['Охлаждающая жидкость', 'Трансмиссионное масло', 'Жидкость ГУР']
+    ]
+
+    for i, order_id in enumerate(order_ids):
+        for expense_name in expense_items[i]:
+            expense_type = random.choice(expense_types)
+            quantity = random.randint(1, 4)
+            cost = random.randint(300, 4000)
+            total = quantity * cost
+
+            cursor.execute('''
+                           INSERT INTO order_expenses (order_id, expense_name, expense_type, quantity, cost_per_unit,
+                                                       total_cost)
+                           VALUES (?, ?, ?, ?, ?, ?)
+                           ''', (order_id, expense_name, expense_type, quantity, cost, total))
+
+    print("✅ Расходы добавлены")
+
+    # Тестовые задачи
+    print("\n📋 Добавление тестовых задач...")
+    tasks = [
+        ('Позвонить клиенту Иванову', 'Уточнить время визита', 'high', 'pending', 'Механик 1',
+         (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')),
+        ('Заказать запчасти', 'Тормозные колодки для Lada Vesta', 'medium', 'in_progress', 'Менеджер',
+         (datetime.now() + timedelta(days=3)).strftime('%Y-%m-%d')),
+        ('Составить отчет за месяц', 'Финансовый отчет', 'low', 'pending', 'Администратор',
+         (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')),
+        ('Провести инвентаризацию', 'Склад запчастей', 'medium', 'completed', 'Складской',
+         (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')),
+        ('Обновить программное обеспечение', 'Обновить CRM систему', 'high', 'in_progress', 'IT специалист',
+         (datetime.now() + timedelta(days=2)).strftime('%Y-%m-%d'))
+    ]
+
+    for task in tasks:
+        cursor.execute('''
+                       INSERT INTO tasks (title, description, priority, status, assigned_to, due_date)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ''', task)
+
+    print("✅ Задачи добавлены")
+
+    # Тестовые операции кассы
+    print("\n💵 Добавление тестовых операций кассы...")
+
+    # Доходы от завершенных заказов
+    for i, order_id in enumerate(order_ids[:3]):  # Только первые 3 заказа как завершенные
+        cursor.execute('SELECT order_number, total_amount FROM work_orders WHERE id = ?', (order_id,))
+        order = cursor.fetchone()
+
+        if order and order['total_amount'] > 0:
+            date = datetime.now() - timedelta(days=random.randint(1, 30))
+
+            cursor.execute('''
+                           INSERT INTO cash_flow (transaction_type, category, amount, description, order_id, date)
+                           VALUES ('income', 'order_income', ?, ?, ?, ?)
+                           ''', (order['total_amount'], f'Доход от заказа {order["order_number"]}', order_id,
+                                 date.strftime('%Y-%m-%d %H:%M:%S')))
+
+    # Прочие доходы
+    other_incomes = [
+        ('income', 'other_income', 15000, 'Продажа запчастей со склада'),
+        ('income', 'other_income', 8000, 'Дополнительные услуги'),
+    ]
+
+    for income in other_incomes:
+        date = datetime.now() - timedelta(days=random.randint(5, 20))
+        cursor.execute('''
+                       INSERT INTO cash_flow (transaction_type, category, amount, description, date)
+                       VALUES (?, ?, ?, ?, ?)
+                       ''', (*income, date.strftime('%Y-%m-%d %H:%M:%S')))
+
+    # Расходы
+    expenses = [
+        ('expense', 'material', 12000, 'Закупка материалов'),
+        ('expense', 'parts', 25000, 'Закупка запчастей'),
+        ('expense', 'salary', 150000, 'Зарплата сотрудникам'),
+        ('expense', 'rent', 50000, 'Аренда помещения'),
+        ('expense', 'utilities', 15000, 'Коммунальные услуги'),
+        ('expense', 'other_expense', 8000, 'Прочие расходы')
+    ]
+
+    for expense in expenses:
+        date = datetime.now() - timedelta(days=random.randint(1, 30))
+        cursor.execute('''
+                       INSERT INTO cash_flow (transaction_type, category, amount, description, date)
+                       VALUES (?, ?, ?, ?, ?)
+                       ''', (*expense, date.strftime('%Y-%m-%d %H:%M:%S')))
+
+    print("✅ Операции кассы добавлены")
+
+    # ========== ПРОВЕРКА ДАННЫХ ==========
+
+    conn.commit()
+
+    print("\n" + "=" * 50)
+    print("📊 СТАТИСТИКА ТЕСТОВОЙ БАЗЫ ДАННЫХ")
+    print("=" * 50)
+
+    # Подсчет записей
+    tables = ['clients', 'work_orders', 'order_works', 'order_expenses', 'tasks', 'cash_flow', 'settings']
+
+    for table in tables:
+        cursor.execute(f'SELECT COUNT(*) as count FROM {table}')
+        count = cursor.fetchone()['count']
+        print(f"📁 {table:15} → {count:3} записей")
+
+    # Финансовая статистика
+    cursor.execute('SELECT COALESCE(SUM(total_amount), 0) FROM work_orders WHERE status = "completed"')
+    total_revenue = cursor.fetchone()[0]
+
+    cursor.execute('SELECT COALESCE(SUM(amount), 0) FROM cash_flow WHERE transaction_type = "income"')
+    total_income = cursor.fetchone()[0]
+
+    cursor.execute('SELECT COALESCE(SUM(amount), 0) FROM cash_flow WHERE transaction_type = "expense"')
+    total_expenses = cursor.fetchone()[0]
+
+    print("\n💰 ФИНАНСОВАЯ СТАТИСТИКА:")
+    print(f"Выручка от заказов: {total_revenue:,.2f} ₽")
+    print(f"Доходы в кассе:     {total_income:,.2f} ₽")
+    print(f"Расходы в кассе:    {total_expenses:,.2f} ₽")
+    print(f"Баланс:             {total_income - total_expenses:,.2f} ₽")
+
+    # Статистика по заказам
+    cursor.execute('SELECT status, COUNT(*) as count FROM work_orders GROUP BY status')
+    order_stats = cursor.fetchall()
+
+    print("\n📋 СТАТУСЫ ЗАКАЗ-НАРЯДОВ:")
+    for stat in order_stats:
+        print(f"  {stat['status']:12} → {stat['count']:2} шт.")
+
+    conn.close()
+
+    print("\n" + "=" * 50)
+    print("✅ ТЕСТОВАЯ БАЗА ДАННЫХ УСПЕШНО СОЗДАНА!")
+    print(f"📁 Файл: {db_name}")
+    print("=" * 50)
+
+    print("\n🎯 ДЛЯ ИСПОЛЬЗОВАНИЯ:")
+    print("1. Переименуйте файл в app.py:")
+    print("   database = Database('autoservice_test.db')")
+    print("\n2. Или создайте копию для тестирования:")
+    print("   import shutil")
+    print("   shutil.copy('autoservice_test.db', 'autoservice.db')")
+
+
+def create_database_with_realistic_data(db_name='autoservice_realistic.db'):
+    """Создание базы данных с более реалистичными данными"""
+
+    conn = sqlite3.connect(db_name)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    print(f"\n🔧 Создание реалистичной базы данных: {db_name}")
+
+    # Создаем те же таблицы
+    create_test_database.__code__ = create_test_database.__code__  # Просто чтобы использовать ту же логику
+
+    # Но добавляем больше данных
+    print("Добавляем расширенные тестовые данные...")
+
+    conn.close()
+
+    return db_name
+
+
+def copy_to_main_db():
+    """Копирование тестовой БД в основную"""
+    import shutil
+    import os
+
+    if not os.path.exists('autoservice_test.db'):
+        print("❌ Файл autoservice_test.db не найден!")
+        print("   Сначала запустите create_test_database()")
+        return
+
+    try:
+        shutil.copy('autoservice_test.db', 'autoservice.db')
+        print("✅ Тестовая БД скопирована в autoservice.db")
+        print("🎯 Теперь можно запускать основное приложение!")
+    except Exception as e:
+        print(f"❌ Ошибка при копировании: {e}")
+
+
+# ========== ГЕНЕРАТОР БОЛЬШОЙ БАЗЫ ==========
+
+LAST_NAMES = ['Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев', 'Соколов',
+              'Михайлов', 'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семенов',
+              'Егоров', 'Павлов', 'Козлов', 'Степанов', 'Николаев', 'Орлов', 'Андреев', 'Макаров',
+              'Никитин', 'Захаров', 'Зайцев', 'Соловьев', 'Борисов', 'Яковлев', 'Григорьев', 'Романов']
+MALE_NAMES = ['Александр', 'Алексей', 'Андрей', 'Артем', 'Владимир', 'Дмитрий', 'Евгений', 'Иван',
+              'Игорь', 'Максим', 'Михаил', 'Никита', 'Николай', 'Павел', 'Роман', 'Сергей']
+FEMALE_NAMES = ['Анна', 'Екатерина', 'Елена', 'Ирина', 'Мария', 'Наталья', 'Ольга', 'Светлана',
+                'Татьяна', 'Юлия']
+PATRONYMICS = ['Александров', 'Алексеев', 'Андреев', 'Викторов', 'Владимиров', 'Дмитриев', 'Иванов',
+               'Михайлов', 'Николаев', 'Петров', 'Сергеев', 'Юрьев']
+
+# Модель автомобиля и относительная частота
+CAR_MODELS = [('Lada Vesta', 14), ('Lada Granta', 12), ('Kia Rio', 10), ('Hyundai Solaris', 10),
+              ('Volkswagen Polo', 7), ('Renault Logan', 6), ('Skoda Octavia', 6), ('Toyota Camry', 5),
+              ('Toyota RAV4', 4), ('Kia Sportage', 4), ('Hyundai Creta', 5), ('Nissan Qashqai', 3),
+              ('Chery Tiggo 7', 4), ('Haval Jolion', 4), ('Geely Coolray', 3), ('BMW X5', 1),
+              ('Mercedes-Benz E-Class', 1), ('Ford Focus', 3)]
+CAR_MODELS_NAMES = [model for model, _ in CAR_MODELS]
+CAR_MODELS_WEIGHTS = [weight for _, weight in CAR_MODELS]
+PLATE_LETTERS = 'АВЕКМНОРСТУХ'
+VIN_CHARS = 'ABCDEFGHJKLMNPRSTUVWXYZ0123456789'
+
+# Работа: название и диапазон цены за единицу
+WORK_CATALOG = [('Замена моторного масла', 800, 1500), ('Замена масляного фильтра', 300, 600),
+                ('Компьютерная диагностика', 1000, 2500), ('Диагностика подвески', 800, 1500),
+                ('Замена тормозных колодок', 1200, 2500), ('Замена тормозных дисков', 1500, 3500),
+                ('Замена амортизаторов', 2000, 4500), ('Развал-схождение', 1500, 3000),
+                ('Замена свечей зажигания', 600, 1800), ('Замена ремня ГРМ', 5000, 12000),
+                ('Замена сцепления', 6000, 15000), ('Шиномонтаж', 1600, 3200),
+                ('Заправка кондиционера', 2000, 4000), ('Замена антифриза', 1200, 2500),
+                ('Ремонт стартера', 2500, 6000), ('Кузовной ремонт', 5000, 30000)]
+# Запчасть: название, тип, диапазон закупочной цены
+PART_CATALOG = [('Моторное масло 5W-30', 'material', 2500, 5500), ('Масляный фильтр', 'parts', 300, 900),
+                ('Воздушный фильтр', 'parts', 400, 1200), ('Тормозные колодки', 'parts', 1500, 6000),
+                ('Тормозной диск', 'parts', 2500, 9000), ('Амортизатор', 'parts', 3000, 12000),
+                ('Свеча зажигания', 'parts', 300, 1500), ('Комплект ГРМ', 'parts', 6000, 20000),
+                ('Антифриз', 'material', 800, 2000), ('Тормозная жидкость', 'material', 400, 900),
+                ('Хладагент', 'material', 1500, 3500), ('Ветошь и расходники', 'other', 100, 500)]
+MARKUPS = [0, 10, 15, 20, 20, 25, 30]
+ORDER_DESCRIPTIONS = ['Плановое ТО', 'Замена масла и фильтров', 'Диагностика ходовой части',
+                      'Ремонт тормозной системы', 'Стук в подвеске', 'Не заводится', 'Сезонная замена шин',
+                      'Комплексное обслуживание', 'Проверка перед покупкой', 'Кузовной ремонт']
+TASK_TITLES = ['Позвонить клиенту', 'Заказать запчасти', 'Проверить поставку', 'Провести инвентаризацию',
+               'Подготовить отчет', 'Согласовать скидку', 'Перезвонить по гарантии', 'Обновить прайс']
+POSITIONS = [('Механик', 6), ('Автоэлектрик', 2), ('Диагност', 1), ('Маляр', 1)]
+
+# Распределения для random.choices: значения и накопленные веса
+WORKS_PER_ORDER = ([1, 2, 3, 4, 5], [30, 60, 80, 92, 100])
+PARTS_PER_ORDER = ([0, 1, 2, 3, 4], [25, 55, 80, 92, 100])
+PART_QUANTITY = ([1, 2, 4], [70, 90, 100])
+RECENT_STATUS = (['completed', 'in_progress', 'new'], [60, 95, 100])
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _work_time(rng, start, offset_days):
+    """Момент в рабочее время (9:00-19:00) дня start + offset_days"""
+    return start + timedelta(days=int(offset_days), seconds=rng.randrange(9 * 3600, 19 * 3600))
+
+
+def _client_row(rng, client_id, created_at):
+    """Клиент со случайными, но правдоподобными данными"""
+    last_name = rng.choice(LAST_NAMES)
+    patronymic = rng.choice(PATRONYMICS)
+    if rng.random() < 0.7:
+        full_name = f'{last_name} {rng.choice(MALE_NAMES)} {patronymic}ич'
+    else:
+        full_name = f'{last_name}а {rng.choice(FEMALE_NAMES)} {patronymic}на'
+
+    # Уникальный телефон: умножение на простое число переставляет номера
+    digits = f'{9_000_000_000 + client_id * 7919 % 1_000_000_000}'
+    phone = f'+7 ({digits[:3]}) {digits[3:6]}-{digits[6:8]}-{digits[8:]}'
+
+    car_model = rng.choices(CAR_MODELS_NAMES, CAR_MODELS_WEIGHTS)[0]
+    car_number = (rng.choice(PLATE_LETTERS) + f'{rng.randrange(1, 1000):03d}' +
+                  rng.choice(PLATE_LETTERS) + rng.choice(PLATE_LETTERS) + str(rng.choice([77, 97, 99, 177, 197, 50, 750])))
+    vin = ''.join(rng.choice(VIN_CHARS) for _ in range(17)) if rng.random() < 0.6 else ''
+    car_year = rng.randrange(2005, created_at.year + 1)
+
+    return (client_id, full_name, phone, car_model, car_number, car_year, vin, '',
+            created_at.strftime(TIME_FORMAT), normalize_phone(phone), normalize_plate(car_number))
+
+
+class BatchWriter:
+    """Буферы строк по таблицам; пакетная вставка через executemany"""
+
+    def __init__(self, conn, batch_size):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, sql, row):
+        rows = self.buffers.setdefault(sql, [])
+        rows.append(row)
+        if len(rows) >= self.batch_size:
+            self.flush(sql)
+
+    def flush(self, sql=None):
+        for key in ([sql] if sql else list(self.buffers)):
+            rows = self.buffers.get(key)
+            if rows:
+                self.conn.executemany(key, rows)
+                table = key.split()[2]
+                self.counts[table] = self.counts.get(table, 0) + len(rows)
+                rows.clear()
+
+
+INSERT_CLIENT = '''INSERT INTO clients (id, full_name, phone, car_model, car_number, car_year, vin, notes,
+                   created_at, phone_digits, car_number_norm) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+INSERT_EMPLOYEE = '''INSERT INTO employees (id, full_name, position, phone, commission_rate, hire_date, is_active,
+                     created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+INSERT_ORDER = '''INSERT INTO work_orders (id, client_id, employee_id, order_number, description, status,
+                  total_amount, created_at, completed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+INSERT_WORK = '''INSERT INTO order_works (order_id, work_name, quantity, price_per_unit, total_price)
+                 VALUES (?, ?, ?, ?, ?)'''
+INSERT_EXPENSE = '''INSERT INTO order_expenses (order_id, expense_name, expense_type, quantity, cost_per_unit,
+                    markup, total_cost) VALUES (?, ?, ?, ?, ?, ?, ?)'''
+INSERT_SALARY = '''INSERT INTO employee_salary (employee_id, order_id, amount, commission_rate, works_total,
+                   created_at) VALUES (?, ?, ?, ?, ?, ?)'''
+INSERT_PAYMENT = '''INSERT INTO salary_payments (employee_id, amount, description, payment_date, created_at)
+                    VALUES (?, ?, ?, ?, ?)'''
+INSERT_CASH = '''INSERT INTO cash_flow (transaction_type, category, amount, description, order_id, date,
+                 created_at) VALUES (?, ?, ?, ?, ?, ?, ?)'''
+INSERT_TASK = '''INSERT INTO tasks (title, description, priority, status, assigned_to, due_date, created_at,
+                 completed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)'''
+
+
+def generate_large_database(db_name='autoservice_large.db', clients=10000, orders=100000, employees=15,
+                            tasks=None, years=3, seed=42, end_date=None, batch_size=50000):
+    """Генерация большой базы с историей за несколько лет
+
+    Схема создается классом Database, данные вставляются пакетами через
+    executemany при отключенных триггерах, после чего производные таблицы
+    (поиск, балансы зарплаты, итоги кассы) пересобираются целиком.
+    Результат детерминирован для одинаковых seed и end_date.
+    """
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    end = datetime.strptime(end_date, '%Y-%m-%d') if end_date else datetime.now()
+    end = end.replace(hour=19, minute=0, second=0, microsecond=0)
+    start = (end - timedelta(days=365 * years)).replace(hour=0)
+    total_days = (end - start).days
+
+    print(f"🔧 Генерация базы {db_name}: {clients} клиентов, {orders} заказ-нарядов, "
+          f"{employees} работников, seed={seed}")
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_name + suffix):
+            os.remove(db_name + suffix)
+
+    db = Database(db_name, read_pool_size=0, storage_profile='fast', checkpoint_interval=0)
+    conn = db.conn
+
+    # Триггеры производных таблиц при массовой загрузке только мешают:
+    # удаляем их, а Database создаст их заново при следующем открытии
+    triggers = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")]
+    for name in triggers:
+        conn.execute(f'DROP TRIGGER {name}')
+    conn.commit()
+    conn.execute('PRAGMA foreign_keys = OFF')
+
+    writer = BatchWriter(conn, batch_size)
+
+    # Работники
+    commission_by_employee = {}
+    employee_ids = list(range(1, employees + 1))
+    for employee_id in employee_ids:
+        hired = start - timedelta(days=rng.randrange(0, 720))
+        rate = rng.choice([10.0, 12.0, 15.0, 15.0, 18.0, 20.0, 25.0])
+        commission_by_employee[employee_id] = rate
+        position = rng.choices([p for p, _ in POSITIONS], [w for _, w in POSITIONS])[0]
+        name = f'{rng.choice(LAST_NAMES)} {rng.choice(MALE_NAMES)} {rng.choice(PATRONYMICS)}ич'
+        phone = f'+7 (900) 100-{employee_id // 100 % 100:02d}-{employee_id % 100:02d}'
+        writer.add(INSERT_EMPLOYEE, (employee_id, name, position, phone, rate, hired.strftime('%Y-%m-%d'), True,
+                                     hired.strftime(TIME_FORMAT), hired.strftime(TIME_FORMAT)))
+    # Нагрузка на работников неравномерная
+    employee_weights = [rng.uniform(0.5, 2.0) for _ in employee_ids]
+
+    # Клиенты: поток регистраций, постепенно растущий к концу периода
+    client_days = sorted(total_days * rng.random() ** 0.8 for _ in range(clients))
+    for i, offset in enumerate(client_days):
+        writer.add(INSERT_CLIENT, _client_row(rng, i + 1, _work_time(rng, start, offset)))
+    writer.flush()
+    conn.commit()
+    print(f"✅ Клиенты: {clients}")
+
+    # Заказ-наряды в хронологическом порядке
+    sequences = {}
+    accrued = {}          # (работник, месяц) -> начислено
+    parts_by_month = {}   # месяц -> закупочная стоимость запчастей
+    order_rate = orders / total_days
+    day = 0.0
+    for order_id in range(1, orders + 1):
+        day = min(day + rng.expovariate(order_rate), total_days - 1e-6)
+        created = _work_time(rng, start, day)
+        if created > end:
+            created = end - timedelta(seconds=rng.randrange(1, 3600))
+
+        # Клиент из уже зарегистрированных, постоянные клиенты приходят чаще
+        registered = max(1, bisect.bisect_right(client_days, day))
+        client_id = int(registered * rng.random() ** 2) + 1
+
+        employee_id = rng.choices(employee_ids, employee_weights)[0] if rng.random() < 0.9 else None
+
+        prefix = created.strftime('%y%m%d')
+        sequences[prefix] = sequences.get(prefix, 0) + 1
+        order_number = f'{prefix}-{sequences[prefix]:03d}'
+
+        works_total = 0
+        for _ in range(rng.choices(WORKS_PER_ORDER[0], cum_weights=WORKS_PER_ORDER[1])[0]):
+            name, low, high = rng.choice(WORK_CATALOG)
+            quantity = 1 if rng.random() < 0.8 else rng.randrange(2, 5)
+            price = rng.randrange(low, high + 1, 50)
+            works_total += quantity * price
+            writer.add(INSERT_WORK, (order_id, name, quantity, price, quantity * price))
+
+        expenses_price = 0
+        markup_total = 0
+        parts_cost = 0
+        for _ in range(rng.choices(PARTS_PER_ORDER[0], cum_weights=PARTS_PER_ORDER[1])[0]):
+            name, expense_type, low, high = rng.choice(PART_CATALOG)
+            quantity = rng.choices(PART_QUANTITY[0], cum_weights=PART_QUANTITY[1])[0]
+            cost = rng.randrange(low, high + 1, 10)
+            markup = rng.choice(MARKUPS)
+            item_cost = quantity * cost
+            item_price = item_cost * (1 + markup / 100)
+            parts_cost += item_cost
+            expenses_price += item_price
+            markup_total += item_price - item_cost
+            writer.add(INSERT_EXPENSE, (order_id, name, expense_type, quantity, cost, markup, item_cost))
+
+        # Так же, как Database.calculate_order_totals
+        works_total = round(works_total, 2)
+        markup_total = round(markup_total, 2)
+        total_amount = works_total + round(expenses_price, 2)
+
+        age_days = (end - created).days
+        if age_days > 14:
+            status = 'completed' if rng.random() < 0.97 else 'in_progress'
+        else:
+            status = rng.choices(RECENT_STATUS[0], cum_weights=RECENT_STATUS[1])[0]
+
+        completed_at = None
+        if status == 'completed':
+            completed = min(created + timedelta(seconds=rng.randrange(3600, 3 * 86400)), end)
+            completed_at = completed.strftime(TIME_FORMAT)
+            month = completed_at[:7]
+            # Проводки как в Database.complete_work_order
+            if works_total > 0:
+                writer.add(INSERT_CASH, ('income', 'order_work', works_total,
+                                         f'Доход от работ по заказу {order_number}', order_id,
+                                         completed_at, completed_at))
+            if markup_total > 0:
+                writer.add(INSERT_CASH, ('income', 'order_markup', markup_total,
+                                         f'Наценка на запчасти по заказу {order_number}', order_id,
+                                         completed_at, completed_at))
+            if employee_id:
+                rate = commission_by_employee[employee_id]
+                salary = round(works_total * rate / 100, 2)
+                if salary > 0:
+                    writer.add(INSERT_SALARY, (employee_id, order_id, salary, rate, works_total, completed_at))
+                    accrued[(employee_id, month)] = accrued.get((employee_id, month), 0) + salary
+            parts_by_month[month] = parts_by_month.get(month, 0) + parts_cost
+
+        writer.add(INSERT_ORDER, (order_id, client_id, employee_id, order_number, rng.choice(ORDER_DESCRIPTIONS),
+                                  status, total_amount, created.strftime(TIME_FORMAT), completed_at))
+
+        # Большие транзакции: фиксация на каждой полной пачке заказов
+        if order_id % batch_size == 0:
+            writer.flush()
+            conn.commit()
+            print(f"   ... заказ-нарядов: {order_id}")
+
+    writer.flush()
+    conn.commit()
+    print(f"✅ Заказ-наряды: {orders}")
+
+    # Ежемесячные операции: зарплата за прошлый месяц, аренда, коммунальные, закупка запчастей
+    month_start = start.replace(day=1)
+    while month_start <= end:
+        month = month_start.strftime('%Y-%m')
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+
+        pay_day = next_month.replace(day=5, hour=12)
+        if pay_day <= end:
+            for employee_id in employee_ids:
+                amount = round(accrued.get((employee_id, month), 0), 2)
+                if amount > 0:
+                    paid_at = pay_day.strftime(TIME_FORMAT)
+                    writer.add(INSERT_PAYMENT, (employee_id, amount, f'Зарплата за {month}', paid_at, paid_at))
+                    writer.add(INSERT_CASH, ('expense', 'salary', amount,
+                                             f'Выплата зарплаты за {month}', None, paid_at, paid_at))
+
+        postings = [('rent', rng.randrange(70000, 90001, 1000), 'Аренда помещения', 1),
+                    ('utilities', rng.randrange(12000, 25001, 100), 'Коммунальные услуги', 10)]
+        parts = parts_by_month.get(month, 0)
+        for week in range(4):
+            if parts > 0:
+                postings.append(('parts_purchase', round(parts / 4 * rng.uniform(0.9, 1.1), 2),
+                                 'Закупка запчастей', 3 + week * 7))
+        if rng.random() < 0.3:
+            postings.append(('other_expense', rng.randrange(2000, 20001, 500), 'Прочие расходы',
+                             rng.randrange(1, 28)))
+        for category, amount, description, day_of_month in postings:
+            posted = month_start.replace(day=day_of_month, hour=11)
+            if start <= posted <= end:
+                writer.add(INSERT_CASH, ('expense', category, amount, description, None,
+                                         posted.strftime(TIME_FORMAT), posted.strftime(TIME_FORMAT)))
+        month_start = next_month
+
+    # Задачи
+    task_count = tasks if tasks is not None else max(20, orders // 50)
+    for _ in range(task_count):
+        created = _work_time(rng, start, total_days * rng.random())
+        due = created + timedelta(days=rng.randrange(1, 15))
+        if (end - created).days > 30:
+            status = 'completed' if rng.random() < 0.95 else 'pending'
+        else:
+            status = rng.choice(['pending', 'in_progress', 'completed'])
+        completed_at = due.strftime(TIME_FORMAT) if status == 'completed' else None
+        writer.add(INSERT_TASK, (rng.choice(TASK_TITLES), '', rng.choice(['high', 'medium', 'medium', 'low']),
+                                 status, rng.choice(['Менеджер', 'Администратор', 'Механик']),
+                                 due.strftime('%Y-%m-%d') if rng.random() < 0.8 else None,
+                                 created.strftime(TIME_FORMAT), completed_at))
+
+    writer.flush()
+    conn.executemany('INSERT OR REPLACE INTO order_sequences (day, last_value) VALUES (?, ?)',
+                     sorted(sequences.items()))
+    conn.commit()
+    conn.execute('PRAGMA foreign_keys = ON')
+    db.close()
+
+    # Повторное открытие создает триггеры, затем пересобираем производные таблицы
+    print("\n🔄 Пересборка поиска, балансов и итогов кассы...")
+    db = Database(db_name, read_pool_size=0, storage_profile='fast', checkpoint_interval=0)
+    db.rebuild_search_index()
+    db.rebuild_employee_balances()
+    db.rebuild_cash_rollups()
+    db.conn.execute('ANALYZE')
+    db.conn.commit()
+    db.checkpoint('TRUNCATE')
+    db.close()
+
+    elapsed = time.perf_counter() - started
+    total_rows = sum(writer.counts.values())
+    print("\n📊 Записано строк:")
+    for table, count in sorted(writer.counts.items()):
+        print(f"📁 {table:16} → {count:>10}")
+    print(f"\n✅ Готово: {total_rows} строк за {elapsed:.1f} с ({total_rows / elapsed:,.0f} строк/с)")
+    return db_name
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Тестовая база CRM автосервиса. Без параметров - интерактивное меню, '
+                    'с --clients/--orders - генерация большой базы.')
+    parser.add_argument('--db', default='autoservice_large.db', help='файл базы (по умолчанию autoservice_large.db)')
+    parser.add_argument('--clients', type=int, help='число клиентов')
+    parser.add_argument('--orders', type=int, help='число заказ-нарядов')
+    parser.add_argument('--employees', type=int, default=15, help='число работников (по умолчанию 15)')
+    parser.add_argument('--tasks', type=int, help='число задач (по умолчанию заказы / 50)')
+    parser.add_argument('--years', type=int, default=3, help='длина истории в годах (по умолчанию 3)')
+    parser.add_argument('--seed', type=int, default=42, help='seed генератора (по умолчанию 42)')
+    parser.add_argument('--end-date', help='последний день истории YYYY-MM-DD (по умолчанию сегодня)')
+    parser.add_argument('--batch-size', type=int, default=50000, help='строк в одном executemany')
+    args = parser.parse_args()
+
+    if args.clients is None and args.orders is None:
+        interactive_menu()
+        return
+
+    generate_large_database(args.db,
+                            clients=args.clients or 1000,
+                            orders=args.orders or 10000,
+                            employees=args.employees,
+                            tasks=args.tasks,
+                            years=args.years,
+                            seed=args.seed,
+                            end_date=args.end_date,
+                            batch_size=args.batch_size)
+
+
+def interactive_menu():
+    """Интерактивное меню создания небольшой тестовой БД"""
+    print("=" * 60)
+    print("🛠️  ГЕНЕРАТОР ТЕСТОВОЙ БАЗЫ ДАННЫХ ДЛЯ CRM АВТОСЕРВИСА")
+    print("=" * 60)
+    print("\nВыберите действие:")
+    print("1. Создать тестовую БД (autoservice_test.db)")
+    print("2. Создать и скопировать в основную БД")
+    print("3. Только скопировать существующую тестовую БД")
+
+    choice = input("\nВаш выбор (1-3): ").strip()
+
+    if choice == '1':
+        create_test_database('autoservice_test.db')
+    elif choice == '2':
+        create_test_database('autoservice_test.db')
+        copy_to_main_db()
+    elif choice == '3':
+        copy_to_main_db()
+    else:
+        print("❌ Неверный выбор. Завершение.")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,1138 +1,3702 @@
-import sqlite3
-import traceback
-from datetime import datetime, timedelta
-
-
-class Database:
-    def __init__(self, db_name='autoservice.db'):
-        self.db_name = db_name
-        self._init_db()
-
-    def _init_db(self):
-        """Инициализация базы данных"""
-        try:
-            self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
-            self.create_tables()
-            print(f"✅ База данных {self.db_name} инициализирована")
-        except Exception as e:
-            print(f"❌ Ошибка инициализации БД: {e}")
-            traceback.print_exc()
-            raise
-
-    def create_tables(self):
-        """Создание всех таблиц"""
-        cursor = self.conn.cursor()
-
-        # Включаем поддержку внешних ключей
-        cursor.execute('PRAGMA foreign_keys = ON')
-
-        # Клиенты
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS clients
-                       (
-                           id
-                           INTEGER
-                           PRIMARY
-                           KEY
-                           AUTOINCREMENT,
-                           full_name
-                           TEXT
-                           NOT
-                           NULL,
-                           phone
-                           TEXT
-                           NOT
-                           NULL
-                           UNIQUE,
-                           car_model
-                           TEXT
-                           NOT
-                           NULL,
-                           car_number
-                           TEXT,
-                           car_year
-                           INTEGER,
-                           vin
-                           TEXT,
-                           notes
-                           TEXT,
-                           created_at
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP
-                       )
-                       ''')
-
-        # Работники
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS employees
-                       (
-                           id
-                           INTEGER
-                           PRIMARY
-                           KEY
-                           AUTOINCREMENT,
-                           full_name
-                           TEXT
-                           NOT
-                           NULL,
-                           position
-                           TEXT
-                           NOT
-                           NULL,
-                           phone
-                           TEXT,
-                           commission_rate
-                           REAL
-                           NOT
-                           NULL
-                           DEFAULT
-                           15.0,
-                           hire_date
-                           DATE,
-                           is_active
-                           BOOLEAN
-                           DEFAULT
-                           TRUE,
-                           notes
-                           TEXT,
-                           created_at
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP,
-                           updated_at
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP
-                       )
-                       ''')
-
-        # Заказ-наряды
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS work_orders
-                       (
-                           id
-                           INTEGER
-                           PRIMARY
-                           KEY
-                           AUTOINCREMENT,
-                           client_id
-                           INTEGER
-                           NOT
-                           NULL,
-                           employee_id
-                           INTEGER,
-                           order_number
-                           TEXT
-                           UNIQUE,
-                           description
-                           TEXT
-                           NOT
-                           NULL,
-                           status
-                           TEXT
-                           DEFAULT
-                           'new',
-                           total_amount
-                           REAL
-                           DEFAULT
-                           0,
-                           created_at
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP,
-                           completed_at
-                           TIMESTAMP,
-                           FOREIGN
-                           KEY
-                       (
-                           client_id
-                       ) REFERENCES clients
-                       (
-                           id
-                       ) ON DELETE CASCADE,
-                           FOREIGN KEY
-                       (
-                           employee_id
-                       ) REFERENCES employees
-                       (
-                           id
-                       )
-                         ON DELETE SET NULL
-                           )
-                       ''')
-
-        # Работы в заказ-наряде
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS order_works
-                       (
-                           id
-                           INTEGER
-                           PRIMARY
-                           KEY
-                           AUTOINCREMENT,
-                           order_id
-                           INTEGER
-                           NOT
-                           NULL,
-                           work_name
-                           TEXT
-                           NOT
-                           NULL,
-                           quantity
-                           INTEGER
-                           DEFAULT
-                           1,
-                           price_per_unit
-                           REAL
-                           DEFAULT
-                           0,
-                           total_price
-                           REAL
-                           DEFAULT
-                           0,
-                           FOREIGN
-                           KEY
-                       (
-                           order_id
-                       ) REFERENCES work_orders
-                       (
-                           id
-                       ) ON DELETE CASCADE
-                           )
-                       ''')
-
-        # Расходы в заказ-наряде (запчасти с наценкой)
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS order_expenses
-                       (
-                           id
-                           INTEGER
-                           PRIMARY
-                           KEY
-                           AUTOINCREMENT,
-                           order_id
-                           INTEGER
-                           NOT
-                           NULL,
-                           expense_name
-                           TEXT
-                           NOT
-                           NULL,
-                           expense_type
-                           TEXT
-                           DEFAULT
-                           'material',
-                           quantity
-                           INTEGER
-                           DEFAULT
-                           1,
-                           cost_per_unit
-                           REAL
-                           DEFAULT
-                           0,
-                           markup
-                           REAL
-                           DEFAULT
-                           0, -- наценка в процентах
-                           total_cost
-                           REAL
-                           DEFAULT
-                           0,
-                           FOREIGN
-                           KEY
-                       (
-                           order_id
-                       ) REFERENCES work_orders
-                       (
-                           id
-                       ) ON DELETE CASCADE
-                           )
-                       ''')
-
-        # Начисления зарплаты работникам
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS employee_salary
-                       (
-                           id
-                           INTEGER
-                           PRIMARY
-                           KEY
-                           AUTOINCREMENT,
-                           employee_id
-                           INTEGER
-                           NOT
-                           NULL,
-                           order_id
-                           INTEGER,
-                           amount
-                           REAL
-                           NOT
-                           NULL,
-                           commission_rate
-                           REAL
-                           NOT
-                           NULL,
-                           works_total
-                           REAL
-                           NOT
-                           NULL,
-                           created_at
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP,
-                           FOREIGN
-                           KEY
-                       (
-                           employee_id
-                       ) REFERENCES employees
-                       (
-                           id
-                       ) ON DELETE CASCADE,
-                           FOREIGN KEY
-                       (
-                           order_id
-                       ) REFERENCES work_orders
-                       (
-                           id
-                       )
-                         ON DELETE SET NULL
-                           )
-                       ''')
-
-        # Выплаты зарплаты
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS salary_payments
-                       (
-                           id
-                           INTEGER
-                           PRIMARY
-                           KEY
-                           AUTOINCREMENT,
-                           employee_id
-                           INTEGER
-                           NOT
-                           NULL,
-                           amount
-                           REAL
-                           NOT
-                           NULL,
-                           description
-                           TEXT,
-                           payment_date
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP,
-                           created_at
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP,
-                           FOREIGN
-                           KEY
-                       (
-                           employee_id
-                       ) REFERENCES employees
-                       (
-                           id
-                       ) ON DELETE CASCADE
-                           )
-                       ''')
-
-        # Задачи
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS tasks
-                       (
-                           id
-                           INTEGER
-                           PRIMARY
-                           KEY
-                           AUTOINCREMENT,
-                           title
-                           TEXT
-                           NOT
-                           NULL,
-                           description
-                           TEXT,
-                           priority
-                           TEXT
-                           DEFAULT
-                           'medium',
-                           status
-                           TEXT
-                           DEFAULT
-                           'pending',
-                           assigned_to
-                           TEXT,
-                           due_date
-                           TIMESTAMP,
-                           created_at
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP,
-                           completed_at
-                           TIMESTAMP
-                       )
-                       ''')
-
-        # Касса (доходы и расходы)
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS cash_flow
-                       (
-                           id
-                           INTEGER
-                           PRIMARY
-                           KEY
-                           AUTOINCREMENT,
-                           transaction_type
-                           TEXT
-                           NOT
-                           NULL,
-                           category
-                           TEXT
-                           NOT
-                           NULL,
-                           amount
-                           REAL
-                           NOT
-                           NULL,
-                           description
-                           TEXT,
-                           order_id
-                           INTEGER,
-                           date
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP,
-                           created_at
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP,
-                           FOREIGN
-                           KEY
-                       (
-                           order_id
-                       ) REFERENCES work_orders
-                       (
-                           id
-                       ) ON DELETE SET NULL
-                           )
-                       ''')
-
-        # Индексы
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_phone ON clients(phone)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_active ON employees(is_active)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON work_orders(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cashflow_date ON cash_flow(date)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cashflow_type ON cash_flow(transaction_type)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cashflow_category ON cash_flow(category)')
-
-        self.conn.commit()
-        print("✅ Все таблицы созданы/проверены")
-
-    # ========== КЛИЕНТЫ ==========
-
-    def add_client(self, full_name, phone, car_model='', car_number='', car_year=None, vin='', notes=''):
-        """Добавление нового клиента"""
-        cursor = self.conn.cursor()
-        try:
-            if car_year:
-                try:
-                    car_year = int(car_year)
-                except:
-                    car_year = None
-
-            cursor.execute('''
-                           INSERT INTO clients (full_name, phone, car_model, car_number, car_year, vin, notes)
-                           VALUES (?, ?, ?, ?, ?, ?, ?)
-                           ''', (full_name, phone, car_model, car_number, car_year, vin, notes))
-
-            self.conn.commit()
-            return cursor.lastrowid
-
-        except sqlite3.IntegrityError as e:
-            self.conn.rollback()
-            if 'UNIQUE constraint failed' in str(e):
-                raise ValueError(f"Клиент с телефоном {phone} уже существует")
-            raise
-
-    def get_clients(self, search_term=None):
-        """Получение всех клиентов с возможностью поиска"""
-        cursor = self.conn.cursor()
-        if search_term:
-            search_pattern = f'%{search_term}%'
-            cursor.execute('''
-                           SELECT *
-                           FROM clients
-                           WHERE full_name LIKE ?
-                              OR phone LIKE ?
-                              OR car_model LIKE ?
-                              OR car_number LIKE ?
-                           ORDER BY created_at DESC
-                           ''', (search_pattern, search_pattern, search_pattern, search_pattern))
-        else:
-            cursor.execute('SELECT * FROM clients ORDER BY created_at DESC')
-        return cursor.fetchall()
-
-    def get_client(self, client_id):
-        """Получение клиента по ID"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM clients WHERE id = ?', (client_id,))
-        return cursor.fetchone()
-
-    def update_client(self, client_id, **kwargs):
-        """Обновление данных клиента"""
-        cursor = self.conn.cursor()
-        if not kwargs:
-            return False
-
-        set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
-        values = list(kwargs.values())
-        values.append(client_id)
-
-        cursor.execute(f'UPDATE clients SET {set_clause} WHERE id = ?', values)
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    def delete_client(self, client_id):
-        """Удаление клиента"""
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM clients WHERE id = ?', (client_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    # ========== РАБОТНИКИ ==========
-
-    def add_employee(self, full_name, position, phone='', commission_rate=15.0, hire_date=None, is_active=True,
-                     notes=''):
-        """Добавление нового работника"""
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute('''
-                           INSERT INTO employees (full_name, position, phone, commission_rate, hire_date, is_active,
-                                                  notes)
-                           VALUES (?, ?, ?, ?, ?, ?, ?)
-                           ''', (full_name, position, phone, commission_rate, hire_date, is_active, notes))
-
-            self.conn.commit()
-            return cursor.lastrowid
-
-        except Exception as e:
-            self.conn.rollback()
-            raise
-
-    def get_employees(self):
-        """Получение всех работников"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM employees ORDER BY full_name')
-        return cursor.fetchall()
-
-    def get_active_employees(self):
-        """Получение активных работников"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM employees WHERE is_active = TRUE ORDER BY full_name')
-        return cursor.fetchall()
-
-    def get_employee(self, employee_id):
-        """Получение работника по ID"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM employees WHERE id = ?', (employee_id,))
-        return cursor.fetchone()
-
-    def get_employee_with_salary(self, employee_id):
-        """Получение работника с информацией о зарплате"""
-        cursor = self.conn.cursor()
-
-        # Получаем основную информацию о работнике
-        cursor.execute('SELECT * FROM employees WHERE id = ?', (employee_id,))
-        employee = cursor.fetchone()
-
-        if not employee:
-            return None
-
-        employee_dict = dict(employee)
-
-        # Получаем начисленную зарплату
-        cursor.execute('''
-                       SELECT COALESCE(SUM(amount), 0) as earned_amount
-                       FROM employee_salary
-                       WHERE employee_id = ?
-                       ''', (employee_id,))
-        earned_result = cursor.fetchone()
-        employee_dict['earned_amount'] = earned_result[0] if earned_result else 0
-
-        # Получаем выплаченную зарплату
-        cursor.execute('''
-                       SELECT COALESCE(SUM(amount), 0) as paid_amount
-                       FROM salary_payments
-                       WHERE employee_id = ?
-                       ''', (employee_id,))
-        paid_result = cursor.fetchone()
-        employee_dict['paid_amount'] = paid_result[0] if paid_result else 0
-
-        return employee_dict
-
-    def get_employees_with_salary(self):
-        """Получение всех работников с информацией о зарплате"""
-        cursor = self.conn.cursor()
-
-        cursor.execute('SELECT * FROM employees ORDER BY full_name')
-        employees = cursor.fetchall()
-
-        result = []
-        for employee in employees:
-            employee_dict = dict(employee)
-
-            # Начисленная зарплата
-            cursor.execute('''
-                           SELECT COALESCE(SUM(amount), 0) as earned_amount
-                           FROM employee_salary
-                           WHERE employee_id = ?
-                           ''', (employee['id'],))
-            earned_result = cursor.fetchone()
-            employee_dict['earned_amount'] = earned_result[0] if earned_result else 0
-
-            # Выплаченная зарплата
-            cursor.execute('''
-                           SELECT COALESCE(SUM(amount), 0) as paid_amount
-                           FROM salary_payments
-                           WHERE employee_id = ?
-                           ''', (employee['id'],))
-            paid_result = cursor.fetchone()
-            employee_dict['paid_amount'] = paid_result[0] if paid_result else 0
-
-            result.append(employee_dict)
-
-        return result
-
-    def update_employee(self, employee_id, **kwargs):
-        """Обновление данных работника"""
-        cursor = self.conn.cursor()
-        if not kwargs:
-            return False
-
-        # Добавляем updated_at
-        kwargs['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
-        values = list(kwargs.values())
-        values.append(employee_id)
-
-        cursor.execute(f'UPDATE employees SET {set_clause} WHERE id = ?', values)
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    def update_employee_status(self, employee_id, is_active):
-        """Обновление статуса работника"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-                       UPDATE employees
-                       SET is_active  = ?,
-                           updated_at = CURRENT_TIMESTAMP
-                       WHERE id = ?
-                       ''', (is_active, employee_id))
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    def add_employee_salary(self, employee_id, order_id, amount, commission_rate, works_total):
-        """Добавление начисления зарплаты"""
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute('''
-                           INSERT INTO employee_salary (employee_id, order_id, amount, commission_rate, works_total)
-                           VALUES (?, ?, ?, ?, ?)
-                           ''', (employee_id, order_id, amount, commission_rate, works_total))
-
-            self.conn.commit()
-            return cursor.lastrowid
-
-        except Exception as e:
-            self.conn.rollback()
-            raise
-
-    def add_salary_payment(self, employee_id, amount, description=''):
-        """Добавление выплаты зарплаты"""
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute('''
-                           INSERT INTO salary_payments (employee_id, amount, description)
-                           VALUES (?, ?, ?)
-                           ''', (employee_id, amount, description))
-
-            self.conn.commit()
-            return cursor.lastrowid
-
-        except Exception as e:
-            self.conn.rollback()
-            raise
-
-    # ========== ЗАКАЗ-НАРЯДЫ ==========
-
-    def add_work_order(self, client_id, description, order_number=None, total_amount=0, employee_id=None):
-        """Добавление нового заказ-наряда"""
-        cursor = self.conn.cursor()
-        try:
-            if not order_number:
-                date_str = datetime.now().strftime("%y%m%d")
-                cursor.execute('SELECT COUNT(*) FROM work_orders WHERE order_number LIKE ?', (f'{date_str}%',))
-                count = cursor.fetchone()[0] + 1
-                order_number = f"{date_str}-{count:03d}"
-
-            # Сразу ставим статус "в работе" вместо "новый"
-            cursor.execute('''
-                           INSERT INTO work_orders (client_id, employee_id, order_number, description,
-                                                    total_amount, status)
-                           VALUES (?, ?, ?, ?, ?, ?)
-                           ''', (client_id, employee_id, order_number, description, total_amount, 'in_progress'))
-
-            self.conn.commit()
-            return cursor.lastrowid
-
-        except Exception as e:
-            self.conn.rollback()
-            raise
-
-    def update_work_order(self, order_id, **kwargs):
-        """Обновление заказ-наряда"""
-        cursor = self.conn.cursor()
-        if not kwargs:
-            return False
-
-        set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
-        values = list(kwargs.values())
-        values.append(order_id)
-
-        cursor.execute(f'UPDATE work_orders SET {set_clause} WHERE id = ?', values)
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    def add_order_work(self, order_id, work_name, quantity=1, price_per_unit=0):
-        """Добавление работы в заказ-наряд"""
-        cursor = self.conn.cursor()
-        total_price = round(quantity * price_per_unit, 2)
-
-        cursor.execute('''
-                       INSERT INTO order_works (order_id, work_name, quantity, price_per_unit, total_price)
-                       VALUES (?, ?, ?, ?, ?)
-                       ''', (order_id, work_name, quantity, price_per_unit, total_price))
-
-        self.conn.commit()
-        return cursor.lastrowid
-
-    def add_order_expense(self, order_id, expense_name, expense_type='material', quantity=1, cost_per_unit=0, markup=0):
-        """Добавление расхода в заказ-наряд с наценкой"""
-        cursor = self.conn.cursor()
-        item_cost = quantity * cost_per_unit
-        total_cost = round(item_cost * (1 + markup / 100), 2)  # Цена с наценкой для клиента
-
-        cursor.execute('''
-                       INSERT INTO order_expenses (order_id, expense_name, expense_type, quantity,
-                                                   cost_per_unit, markup, total_cost)
-                       VALUES (?, ?, ?, ?, ?, ?, ?)
-                       ''', (order_id, expense_name, expense_type, quantity, cost_per_unit, markup, total_cost))
-
-        self.conn.commit()
-        return cursor.lastrowid
-
-    def get_work_orders(self, search_term=None):
-        """Получение всех заказ-нарядов"""
-        cursor = self.conn.cursor()
-        if search_term:
-            search_pattern = f'%{search_term}%'
-            cursor.execute('''
-                           SELECT wo.*,
-                                  c.full_name,
-                                  c.phone,
-                                  c.car_model,
-                                  c.car_number,
-                                  e.full_name as employee_name
-                           FROM work_orders wo
-                                    JOIN clients c ON wo.client_id = c.id
-                                    LEFT JOIN employees e ON wo.employee_id = e.id
-                           WHERE wo.order_number LIKE ?
-                              OR c.full_name LIKE ?
-                              OR c.phone LIKE ?
-                           ORDER BY wo.created_at DESC
-                           ''', (search_pattern, search_pattern, search_pattern))
-        else:
-            cursor.execute('''
-                           SELECT wo.*,
-                                  c.full_name,
-                                  c.phone,
-                                  c.car_model,
-                                  c.car_number,
-                                  e.full_name as employee_name
-                           FROM work_orders wo
-                                    JOIN clients c ON wo.client_id = c.id
-                                    LEFT JOIN employees e ON wo.employee_id = e.id
-                           ORDER BY wo.created_at DESC
-                           ''')
-        return cursor.fetchall()
-
-    def get_work_order(self, order_id):
-        """Получение заказ-наряда по ID"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-                       SELECT wo.*,
-                              c.full_name,
-                              c.phone,
-                              c.car_model,
-                              c.car_number,
-                              c.car_year,
-                              c.vin,
-                              e.full_name as employee_name,
-                              e.commission_rate
-                       FROM work_orders wo
-                                JOIN clients c ON wo.client_id = c.id
-                                LEFT JOIN employees e ON wo.employee_id = e.id
-                       WHERE wo.id = ?
-                       ''', (order_id,))
-        return cursor.fetchone()
-
-    def get_order_works(self, order_id):
-        """Получение работ заказ-наряда"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM order_works WHERE order_id = ? ORDER BY id', (order_id,))
-        return cursor.fetchall()
-
-    def get_order_expenses(self, order_id):
-        """Получение расходов заказ-наряда"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM order_expenses WHERE order_id = ? ORDER BY id', (order_id,))
-        return cursor.fetchall()
-
-    def delete_order_works(self, order_id):
-        """Удаление всех работ заказ-наряда"""
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM order_works WHERE order_id = ?', (order_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    def delete_order_expenses(self, order_id):
-        """Удаление всех расходов заказ-наряда"""
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM order_expenses WHERE order_id = ?', (order_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    def update_work_order_status(self, order_id, status):
-        """Обновление статуса заказ-наряда"""
-        cursor = self.conn.cursor()
-        try:
-            if status == 'completed':
-                cursor.execute('''
-                               UPDATE work_orders
-                               SET status       = ?,
-                                   completed_at = CURRENT_TIMESTAMP
-                               WHERE id = ?
-                               ''', (status, order_id))
-            else:
-                cursor.execute('''
-                               UPDATE work_orders
-                               SET status       = ?,
-                                   completed_at = NULL
-                               WHERE id = ?
-                               ''', (status, order_id))
-
-            self.conn.commit()
-            return cursor.rowcount > 0
-        except Exception as e:
-            print(f"Ошибка при обновлении статуса заказа {order_id}: {e}")
-            self.conn.rollback()
-            return False
-
-    def delete_work_order(self, order_id):
-        """Удаление заказ-наряда"""
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM work_orders WHERE id = ?', (order_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    # ========== ЗАДАЧИ ==========
-
-    def add_task(self, title, description='', priority='medium', assigned_to='', due_date=None):
-        """Добавление новой задачи"""
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute('''
-                           INSERT INTO tasks (title, description, priority, assigned_to, due_date)
-                           VALUES (?, ?, ?, ?, ?)
-                           ''', (title, description, priority, assigned_to, due_date))
-
-            self.conn.commit()
-            return cursor.lastrowid
-
-        except Exception as e:
-            self.conn.rollback()
-            raise
-
-    def get_tasks(self, status=None):
-        """Получение задач"""
-        cursor = self.conn.cursor()
-        if status:
-            cursor.execute('''
-                           SELECT *
-                           FROM tasks
-                           WHERE status = ?
-                           ORDER BY CASE priority
-                                        WHEN 'high' THEN 1
-                                        WHEN 'medium' THEN 2
-                                        WHEN 'low' THEN 3
-                                        END,
-                                    due_date ASC,
-                                    created_at DESC
-                           ''', (status,))
-        else:
-            cursor.execute('''
-                           SELECT *
-                           FROM tasks
-                           ORDER BY CASE priority
-                                        WHEN 'high' THEN 1
-                                        WHEN 'medium' THEN 2
-                                        WHEN 'low' THEN 3
-                                        END,
-                                    due_date ASC,
-                                    created_at DESC
-                           ''')
-        return cursor.fetchall()
-
-    def get_task(self, task_id):
-        """Получение задачи по ID"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
-        return cursor.fetchone()
-
-    def update_task(self, task_id, **kwargs):
-        """Обновление задачи"""
-        cursor = self.conn.cursor()
-        if not kwargs:
-            return False
-
-        set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
-        values = list(kwargs.values())
-        values.append(task_id)
-
-        cursor.execute(f'UPDATE tasks SET {set_clause} WHERE id = ?', values)
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    def delete_task(self, task_id):
-        """Удаление задачи"""
-        cursor = self.conn.cursor()
-        cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-        self.conn.commit()
-        return cursor.rowcount > 0
-
-    # ========== КАССА ==========
-
-    def add_cash_flow(self, transaction_type, category, amount, description='', order_id=None):
-        """Добавление операции в кассу"""
-        cursor = self.conn.cursor()
-        try:
-            cursor.execute('''
-                           INSERT INTO cash_flow (transaction_type, category, amount, description, order_id)
-                           VALUES (?, ?, ?, ?, ?)
-                           ''', (transaction_type, category, amount, description, order_id))
-
-            self.conn.commit()
-            return cursor.lastrowid
-
-        except Exception as e:
-            self.conn.rollback()
-            raise
-
-    def get_cash_flow(self, start_date=None, end_date=None, transaction_type=None, category=None):
-        """Получение операций кассы за период"""
-        cursor = self.conn.cursor()
-
-        query = 'SELECT * FROM cash_flow WHERE 1=1'
-        params = []
-
-        if start_date:
-            query += ' AND date(date) >= date(?)'
-            params.append(start_date)
-
-        if end_date:
-            query += ' AND date(date) <= date(?)'
-            params.append(end_date)
-
-        if transaction_type:
-            query += ' AND transaction_type = ?'
-            params.append(transaction_type)
-
-        if category:
-            query += ' AND category = ?'
-            params.append(category)
-
-        query += ' ORDER BY date DESC'
-        cursor.execute(query, params)
-        return cursor.fetchall()
-
-    def get_financial_stats(self, period='month'):
-        """Получение финансовой статистики"""
-        cursor = self.conn.cursor()
-
-        # Определяем период
-        end_date = datetime.now()
-        if period == 'day':
-            start_date = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif period == 'week':
-            start_date = end_date - timedelta(days=end_date.weekday())
-        elif period == 'month':
-            start_date = end_date.replace(day=1)
-        elif period == 'year':
-            start_date = end_date.replace(month=1, day=1)
-        else:
-            start_date = end_date - timedelta(days=30)
-
-        # Конвертируем в строки для SQL
-        start_date_str = start_date.strftime('%Y-%m-%d')
-        end_date_str = end_date.strftime('%Y-%m-%d')
-
-        stats = {
-            'period': period,
-            'start_date': start_date_str,
-            'end_date': end_date_str,
-            'total_income': 0.0,
-            'total_expenses': 0.0,
-            'net_profit': 0.0,
-            'income_by_category': [],
-            'expenses_by_category': []
-        }
-
-        try:
-            # Доходы за период (исключая cash_out_no_expense)
-            cursor.execute('''
-                           SELECT COALESCE(SUM(amount), 0) as total_income
-                           FROM cash_flow
-                           WHERE transaction_type = 'income'
-                             AND date (date) BETWEEN date (?)
-                             AND date (?)
-                           ''', (start_date_str, end_date_str))
-            result = cursor.fetchone()
-            stats['total_income'] = float(result[0]) if result and result[0] else 0.0
-
-            # Доходы по категориям
-            cursor.execute('''
-                           SELECT category, COALESCE(SUM(amount), 0) as amount
-                           FROM cash_flow
-                           WHERE transaction_type = 'income'
-                             AND date (date) BETWEEN date (?)
-                             AND date (?)
-                           GROUP BY category
-                           ORDER BY amount DESC
-                           ''', (start_date_str, end_date_str))
-
-            income_by_category = []
-            for row in cursor.fetchall():
-                income_by_category.append({
-                    'category': row[0],
-                    'amount': float(row[1]) if row[1] else 0.0
-                })
-            stats['income_by_category'] = income_by_category
-
-            # Расходы за период (исключая cash_out_no_expense)
-            cursor.execute('''
-                           SELECT COALESCE(SUM(amount), 0) as total_expenses
-                           FROM cash_flow
-                           WHERE transaction_type = 'expense'
-                             AND category != 'cash_out_no_expense'
-                             AND date(date) BETWEEN date(?) AND date(?)
-                           ''', (start_date_str, end_date_str))
-            result = cursor.fetchone()
-            stats['total_expenses'] = float(result[0]) if result and result[0] else 0.0
-
-            # Расходы по категориям
-            cursor.execute('''
-                           SELECT category, COALESCE(SUM(amount), 0) as amount
-                           FROM cash_flow
-                           WHERE transaction_type = 'expense'
-                             AND category != 'cash_out_no_expense'
-                             AND date(date) BETWEEN date(?) AND date(?)
-                           GROUP BY category
-                           ORDER BY amount DESC
-                           ''', (start_date_str, end_date_str))
-
-            expenses_by_category = []
-            for row in cursor.fetchall():
-                expenses_by_category.append({
-                    'category': row[0],
-                    'amount': float(row[1]) if row[1] else 0.0
-                })
-            stats['expenses_by_category'] = expenses_by_category
-
-            # Чистая прибыль
-            stats['net_profit'] = stats['total_income'] - stats['total_expenses']
-
-        except Exception as e:
-            print(f"Ошибка при получении статистики: {e}")
-
-        return stats
-
-    def get_total_balance(self):
-        """Получение общего баланса"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-                       SELECT COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END),
-                                       0) as total_income,
-                              COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount ELSE 0 END),
-                                       0) as total_expenses
-                       FROM cash_flow
-                       ''')
-        result = cursor.fetchone()
-        total_income = result[0] or 0
-        total_expenses = result[1] or 0
-        return total_income - total_expenses
-
-    # ========== СТАТИСТИКА ==========
-
-    def get_stats(self):
-        """Получение общей статистики"""
-        cursor = self.conn.cursor()
-
-        stats = {}
-
-        # Клиенты
-        cursor.execute('SELECT COUNT(*) FROM clients')
-        stats['total_clients'] = cursor.fetchone()[0]
-
-        # Работники
-        cursor.execute('SELECT COUNT(*) FROM employees WHERE is_active = TRUE')
-        stats['total_employees'] = cursor.fetchone()[0]
-
-        # Заказ-наряды
-        cursor.execute('SELECT COUNT(*) FROM work_orders')
-        stats['total_orders'] = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM work_orders WHERE status = "new"')
-        stats['new_orders'] = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM work_orders WHERE status = "in_progress"')
-        stats['in_progress_orders'] = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM work_orders WHERE status = "completed"')
-        stats['completed_orders'] = cursor.fetchone()[0]
-
-        # Общая выручка
-        cursor.execute('SELECT COALESCE(SUM(total_amount), 0) FROM work_orders WHERE status = "completed"')
-        stats['total_revenue'] = cursor.fetchone()[0] or 0
-
-        # Задачи
-        cursor.execute('SELECT COUNT(*) FROM tasks WHERE status = "pending"')
-        stats['pending_tasks'] = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM tasks WHERE status = "in_progress"')
-        stats['in_progress_tasks'] = cursor.fetchone()[0]
-
-        cursor.execute('SELECT COUNT(*) FROM tasks WHERE status = "completed"')
-        stats['completed_tasks'] = cursor.fetchone()[0]
-
-        # Баланс
-        stats['total_balance'] = self.get_total_balance()
-
-        return stats
-
-    def close(self):
-        """Закрытие соединения"""
-        if hasattr(self, 'conn'):
-            self.conn.close()
\ No newline at end of file
+import base64
+import functools
+import json
+import logging
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+slow_query_logger = logging.getLogger('autoservice.slow_query')
+
+
+# Профили хранения: компромисс между пропускной способностью и надежностью.
+# durable  - WAL + synchronous=FULL: зафиксированная транзакция переживает отключение питания;
+# balanced - WAL + synchronous=NORMAL: при сбое питания можно потерять последние
+#            транзакции, но база остается целостной (по умолчанию);
+# fast     - WAL + synchronous=OFF: максимум скорости, только для тестов и генерации данных;
+# legacy   - журнал отката и настройки SQLite по умолчанию (поведение до WAL).
+STORAGE_PROFILES = {
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -20000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 1000,
+    },
+    'balanced': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -20000,
+        'mmap_size': 268435456,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 1000,
+    },
+    'fast': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -64000,
+        'mmap_size': 1073741824,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 10000,
+    },
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+    },
+}
+
+# PRAGMA, которые имеют смысл только для соединения записи
+WRITER_ONLY_PRAGMAS = ('journal_mode', 'synchronous', 'wal_autocheckpoint')
+
+# Таблицы, изменения которых пишутся в change_log (производные таблицы -
+# балансы, итоги кассы, счетчики номеров, поиск - восстанавливаются из них)
+CHANGE_LOG_TABLES = ('clients', 'employees', 'work_orders', 'order_works', 'order_expenses',
+                     'tasks', 'cash_flow', 'employee_salary', 'salary_payments')
+
+
+# Статусы и поля, которые можно менять пакетными операциями (batch_work_orders, batch_tasks)
+WORK_ORDER_STATUSES = ('new', 'in_progress', 'completed')
+WORK_ORDER_BATCH_FIELDS = ('client_id', 'employee_id', 'description')
+TASK_STATUSES = ('pending', 'in_progress', 'completed')
+TASK_BATCH_FIELDS = ('title', 'description', 'priority', 'status', 'assigned_to', 'due_date', 'completed_at')
+
+# Номер заказ-наряда: YYMMDD-NNN
+ORDER_NUMBER_RE = re.compile(r'^(\d{6})-(\d+)$')
+
+# Латинские буквы, совпадающие по начертанию с буквами российских госномеров
+PLATE_LATIN_TO_CYRILLIC = str.maketrans('ABEKMHOPCTYX', 'АВЕКМНОРСТУХ')
+PLATE_LETTERS = set('АВЕКМНОРСТУХ')
+
+
+def normalize_phone(phone):
+    """Телефон только цифрами в формате 7XXXXXXXXXX
+
+    Российские номера, набранные с 8 или без кода страны, приводятся к 7...
+    """
+    digits = ''.join(ch for ch in str(phone or '') if ch.isdigit())
+    if len(digits) == 11 and digits.startswith('8'):
+        digits = '7' + digits[1:]
+    elif digits.startswith('9') and len(digits) <= 10:
+        digits = '7' + digits
+    return digits
+
+
+def normalize_plate(plate):
+    """Госномер в каноническом виде: заглавные кириллические буквы и цифры без пробелов"""
+    plate = str(plate or '').upper().translate(PLATE_LATIN_TO_CYRILLIC)
+    return ''.join(ch for ch in plate if ch.isalnum())
+
+
+# Колонки файла импорта клиентов (в нижнем регистре) -> поля clients
+CLIENT_IMPORT_COLUMNS = {
+    'full_name': 'full_name', 'name': 'full_name', 'фио': 'full_name', 'клиент': 'full_name',
+    'phone': 'phone', 'телефон': 'phone',
+    'car_model': 'car_model', 'автомобиль': 'car_model', 'модель': 'car_model',
+    'car_number': 'car_number', 'госномер': 'car_number',
+    'car_year': 'car_year', 'год': 'car_year', 'год выпуска': 'car_year',
+    'vin': 'vin',
+    'notes': 'notes', 'примечание': 'notes', 'примечания': 'notes', 'комментарий': 'notes',
+}
+
+VIN_RE = re.compile(r'^[A-HJ-NPR-Z0-9]{17}$')
+
+
+def clean_client_row(record):
+    """Проверка и нормализация строки импорта клиентов
+
+    record - словарь из CSV или NDJSON (ключи - поля clients или названия
+    колонок из CLIENT_IMPORT_COLUMNS). Возвращает словарь полей для
+    Database.import_clients, при ошибке - ValueError с описанием.
+    """
+    fields = {}
+    for key, value in record.items():
+        field = CLIENT_IMPORT_COLUMNS.get(str(key).strip().lower())
+        if field and value is not None and str(value).strip():
+            fields[field] = str(value).strip()
+
+    if not fields.get('full_name'):
+        raise ValueError('Не указано ФИО')
+    phone = fields.get('phone', '')
+    phone_digits = normalize_phone(phone)
+    if not 10 <= len(phone_digits) <= 15:
+        raise ValueError(f'Неверный телефон: {phone!r}' if phone else 'Не указан телефон')
+
+    car_year = fields.get('car_year')
+    if car_year is not None:
+        try:
+            car_year = int(float(car_year))
+        except ValueError:
+            raise ValueError(f'Неверный год выпуска: {car_year!r}')
+        if not 1900 <= car_year <= datetime.now().year + 1:
+            raise ValueError(f'Неверный год выпуска: {car_year}')
+
+    vin = fields.get('vin', '').upper()
+    if vin and not VIN_RE.match(vin):
+        raise ValueError(f'Неверный VIN: {vin!r}')
+
+    car_number = normalize_plate(fields.get('car_number'))
+    return {
+        'full_name': ' '.join(fields['full_name'].split()),
+        'phone': phone,
+        'phone_digits': phone_digits,
+        'car_model': fields.get('car_model', ''),
+        'car_number': car_number,
+        'car_number_norm': car_number,
+        'car_year': car_year,
+        'vin': vin,
+        'notes': fields.get('notes', ''),
+    }
+
+
+def looks_like_phone(term):
+    """Поисковый запрос похож на телефон (цифры и символы форматирования)"""
+    digits = sum(ch.isdigit() for ch in term)
+    return digits >= 3 and all(ch.isdigit() or ch in '+-() ' for ch in term)
+
+
+def looks_like_plate(term):
+    """Поисковый запрос похож на госномер (буквы госномера и цифры)"""
+    plate = normalize_plate(term)
+    has_letter = any(ch in PLATE_LETTERS for ch in plate)
+    has_digit = any(ch.isdigit() for ch in plate)
+    return len(plate) >= 3 and has_letter and has_digit and all(ch.isdigit() or ch in PLATE_LETTERS for ch in plate)
+
+
+def prefix_range(prefix):
+    """Границы [prefix, upper) для поиска по префиксу через индекс"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def period_bounds(period, now=None):
+    """Первый и последний день периода ('day', 'week', 'month', 'year',
+    иначе - последние 30 дней) в виде строк 'YYYY-MM-DD'"""
+    end_date = now or datetime.now()
+    if period == 'day':
+        start_date = end_date
+    elif period == 'week':
+        start_date = end_date - timedelta(days=end_date.weekday())
+    elif period == 'month':
+        start_date = end_date.replace(day=1)
+    elif period == 'year':
+        start_date = end_date.replace(month=1, day=1)
+    else:
+        start_date = end_date - timedelta(days=30)
+    return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+
+
+def day_after(day):
+    """Следующий день для полуинтервала [start, day_after(end)) по дате 'YYYY-MM-DD'
+
+    Даты в cash_flow хранятся строкой 'YYYY-MM-DD HH:MM:SS', поэтому условие
+    date >= start AND date < следующий_день совпадает с date(date) BETWEEN
+    start AND end, но в отличие от него использует индекс по date.
+    """
+    return (datetime.strptime(day[:10], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+# Keyset-пагинация: порядок выдачи задается списком (выражение SQL, ключ в строке,
+# направление). Курсор страницы - значения ключей последней выданной строки.
+
+def encode_cursor(values):
+    """Курсор страницы: значения ключей сортировки в base64 JSON"""
+    data = json.dumps(list(values), ensure_ascii=False, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Значения ключей сортировки из курсора страницы (None - первая страница)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except ValueError:
+        raise ValueError('Некорректный курсор страницы')
+    if not isinstance(values, list) or not all(
+            value is None or isinstance(value, (str, int, float)) for value in values):
+        raise ValueError('Некорректный курсор страницы')
+    return values
+
+
+def keyset_condition(order, values):
+    """Условие WHERE "строка после курсора" для порядка order
+
+    При одинаковом направлении всех ключей - сравнение row values, которое
+    SQLite выполняет по индексу; при смешанном - цепочка OR.
+    """
+    directions = {direction for _, _, direction in order}
+    if len(directions) == 1:
+        columns = ', '.join(expr for expr, _, _ in order)
+        placeholders = ', '.join('?' * len(order))
+        operator = '<' if 'DESC' in directions else '>'
+        return f'({columns}) {operator} ({placeholders})', list(values)
+
+    clauses, params = [], []
+    for i, (expr, _, direction) in enumerate(order):
+        parts = [f'{prev_expr} = ?' for prev_expr, _, _ in order[:i]]
+        parts.append(f"{expr} {'<' if direction == 'DESC' else '>'} ?")
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params.extend(values[:i + 1])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def make_page(rows, order, limit):
+    """Страница из limit + 1 выбранных строк: элементы и курсор следующей страницы"""
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit and items:
+        next_cursor = encode_cursor([items[-1][key] for _, key, _ in order])
+    return {'items': items, 'next_cursor': next_cursor}
+
+
+class ConnectionPool:
+    """Ограниченный пул соединений SQLite
+
+    Соединения создаются лениво, пока их число не достигнет size. Если все
+    соединения заняты, запрос ждет освобождения не дольше timeout секунд.
+    """
+
+    def __init__(self, connect, size=4, timeout=30.0):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    def acquire(self):
+        """Получение свободного соединения из пула"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"Нет свободных соединений в пуле (size={self.size}, timeout={self.timeout}s)")
+
+    def release(self, conn):
+        """Возврат соединения в пул"""
+        if self._closed:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Соединение из пула на время блока with
+
+        Вложенные вызовы в одном потоке получают то же самое соединение.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self.acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self.release(conn)
+
+    def close(self):
+        """Закрытие всех свободных соединений"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+# ========== ИНСТРУМЕНТИРОВАНИЕ ЗАПРОСОВ ==========
+
+class _QueryStat:
+    """Накопленная статистика одного запроса в контексте (endpoint, метод)"""
+    __slots__ = ('endpoint', 'method', 'sql', 'calls', 'total_time', 'max_time', 'rows')
+
+    def __init__(self, endpoint, method, sql):
+        self.endpoint = endpoint
+        self.method = method
+        self.sql = sql
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'sql': self.sql,
+            'calls': self.calls,
+            'total_ms': round(self.total_time * 1000, 3),
+            'avg_ms': round(self.total_time * 1000 / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_time * 1000, 3),
+            'rows': self.rows
+        }
+
+
+class _Execution:
+    """Одно выполнение запроса: время копится от execute до последнего fetch"""
+    __slots__ = ('stat', 'sql', 'params', 'elapsed', 'rows', 'logged')
+
+    def __init__(self, stat, sql, params):
+        self.stat = stat
+        self.sql = sql
+        self.params = params
+        self.elapsed = 0.0
+        self.rows = 0
+        self.logged = False
+
+
+# Файлы, кадры которых пропускаются при поиске метода Database, выполнившего запрос
+_TRANSPARENT_FILES = {__file__, contextmanager.__code__.co_filename}
+
+
+class QueryLog:
+    """Журнал SQL-запросов соединений Database
+
+    Для каждого запроса копятся число вызовов, время (execute и fetch*),
+    число строк (выбранных или измененных), а также публичный метод
+    Database и endpoint Flask, из которых он выполнен. Запросы дольше
+    slow_query_ms пишутся в лог autoservice.slow_query вместе с EXPLAIN
+    QUERY PLAN и сохраняются в списке последних медленных запросов.
+    slow_query_ms=0 отключает журнал медленных запросов.
+
+    На запрос приходится пара вызовов perf_counter, проход по нескольким
+    кадрам стека и короткая блокировка, поэтому журнал можно держать
+    включенным постоянно.
+    """
+
+    def __init__(self, slow_query_ms=200, explain=True, max_slow_queries=100, max_statements=2000):
+        self.slow_query_ms = slow_query_ms
+        self.explain = explain
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._slow = deque(maxlen=max_slow_queries)
+        self._sql_text = {}
+        self._local = threading.local()
+
+    def set_endpoint(self, endpoint):
+        """Endpoint Flask, к которому относятся запросы текущего потока
+
+        Заодно обнуляет счетчики запросов и времени БД текущего HTTP-запроса.
+        """
+        local = self._local
+        local.endpoint = endpoint
+        local.queries = 0
+        local.db_time = 0.0
+
+    def request_totals(self):
+        """Число запросов и время БД (секунды) с последнего set_endpoint в текущем потоке"""
+        local = self._local
+        return getattr(local, 'queries', 0), getattr(local, 'db_time', 0.0)
+
+    def _normalize(self, sql):
+        """Текст запроса без лишних пробелов (с кэшем по исходной строке)"""
+        text = self._sql_text.get(sql)
+        if text is None:
+            if len(self._sql_text) >= 4 * self.max_statements:
+                self._sql_text.clear()
+            text = self._sql_text[sql] = ' '.join(sql.split())
+        return text
+
+    @staticmethod
+    def _caller(frame):
+        """Публичный метод Database, из которого выполнен запрос
+
+        Внутренние методы (_write, _query_*) и contextlib пропускаются; если
+        запрос выполнен в обход Database, возвращается имя вызвавшей функции.
+        """
+        name = None
+        for _ in range(16):
+            if frame is None:
+                break
+            code = frame.f_code
+            if code.co_filename not in _TRANSPARENT_FILES:
+                return name or code.co_name
+            if code.co_filename == __file__:
+                name = code.co_name
+                if not name.startswith(('_', '<')):
+                    return name
+            frame = frame.f_back
+        return name or '?'
+
+    def start(self, sql, params, frame):
+        """Начало учета выполнения запроса"""
+        local = self._local
+        local.queries = getattr(local, 'queries', 0) + 1
+        key = (getattr(local, 'endpoint', None), self._caller(frame), self._normalize(sql))
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                if len(self._stats) >= self.max_statements:
+                    key = (key[0], key[1], '<прочие запросы>')
+                    stat = self._stats.get(key)
+                if stat is None:
+                    stat = self._stats[key] = _QueryStat(*key)
+            stat.calls += 1
+        return _Execution(stat, sql, params)
+
+    def add(self, conn, execution, elapsed, rows=0, check_slow=True):
+        """Учет времени и строк выполнения; медленный запрос пишется в лог один раз
+
+        Для SELECT проверка порога откладывается до fetch*, когда известно
+        число выбранных строк.
+        """
+        local = self._local
+        local.db_time = getattr(local, 'db_time', 0.0) + elapsed
+        with self._lock:
+            stat = execution.stat
+            stat.total_time += elapsed
+            stat.rows += rows
+            execution.elapsed += elapsed
+            execution.rows += rows
+            if execution.elapsed > stat.max_time:
+                stat.max_time = execution.elapsed
+
+        if (check_slow and self.slow_query_ms and not execution.logged
+                and execution.elapsed * 1000 >= self.slow_query_ms):
+            execution.logged = True
+            self._log_slow(conn, execution)
+
+    def _log_slow(self, conn, execution):
+        """Запись медленного запроса с планом выполнения"""
+        plan = []
+        if self.explain and conn is not None and execution.params is not None:
+            try:
+                plan = [row[3] for row in sqlite3.Connection.execute(
+                    conn, 'EXPLAIN QUERY PLAN ' + execution.sql, execution.params)]
+            except sqlite3.Error as e:
+                plan = [f'EXPLAIN QUERY PLAN недоступен: {e}']
+
+        stat = execution.stat
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'endpoint': stat.endpoint,
+            'method': stat.method,
+            'sql': stat.sql,
+            'elapsed_ms': round(execution.elapsed * 1000, 3),
+            'rows': execution.rows,
+            'plan': plan
+        }
+        with self._lock:
+            self._slow.append(entry)
+        slow_query_logger.warning(
+            'Медленный запрос %.1f мс (endpoint=%s, метод=%s, строк=%d): %s%s',
+            entry['elapsed_ms'], stat.endpoint, stat.method, execution.rows, stat.sql,
+            ''.join(f'\n    {detail}' for detail in plan))
+
+    def snapshot(self, limit=50, order_by='total_ms'):
+        """Статистика запросов (первые limit по order_by) и последние медленные запросы"""
+        if order_by not in ('calls', 'total_ms', 'avg_ms', 'max_ms', 'rows'):
+            raise ValueError(f"Неизвестное поле сортировки: {order_by}")
+        with self._lock:
+            statements = [stat.as_dict() for stat in self._stats.values()]
+            slow = list(self._slow)
+        statements.sort(key=lambda item: item[order_by], reverse=True)
+        return {
+            'slow_query_ms': self.slow_query_ms,
+            'statements': statements[:limit],
+            'slow_queries': slow
+        }
+
+    def reset(self):
+        """Сброс накопленной статистики"""
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Курсор, передающий время и число строк каждого запроса в QueryLog"""
+
+    _execution = None
+
+    def __init__(self, connection):
+        super().__init__(connection)
+        self._query_log = connection.query_log
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sqlite3.Cursor.execute, sql, parameters, parameters, sys._getframe(1))
+
+    def executemany(self, sql, seq_of_parameters):
+        # Для EXPLAIN берется первый набор параметров, если он доступен без итерации
+        sample = seq_of_parameters[0] if isinstance(seq_of_parameters, (list, tuple)) and seq_of_parameters \
+            else None
+        return self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters, sample, sys._getframe(1))
+
+    def _timed(self, method, sql, parameters, sample, frame):
+        started = time.perf_counter()
+        try:
+            return method(self, sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._execution = self._query_log.start(sql, sample, frame)
+            self._query_log.add(self.connection, self._execution, elapsed, max(self.rowcount, 0),
+                                check_slow=self.description is None)
+
+    def _fetched(self, started, rows):
+        if self._execution is not None:
+            self._query_log.add(self.connection, self._execution, time.perf_counter() - started, rows)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, int(row is not None))
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Соединение SQLite, все курсоры которого инструментированы
+
+    Фиксация транзакции учитывается как запрос COMMIT: в ней происходит fsync.
+    """
+
+    query_log = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor()._timed(sqlite3.Cursor.execute, sql, parameters, parameters, sys._getframe(1))
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor()._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters, None,
+                                    sys._getframe(1))
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            elapsed = time.perf_counter() - started
+            self.query_log.add(None, self.query_log.start('COMMIT', None, sys._getframe(1)), elapsed)
+
+
+# ========== СОБЫТИЯ ОБ ИЗМЕНЕНИЯХ ==========
+
+class ChangeEvents:
+    """Рассылка событий об изменениях данных подписчикам
+
+    Подписчик - очередь событий (словари entity, op, id, ...). op - только
+    'created', 'updated' или 'deleted', как и в событиях из журнала
+    change_log в многопроцессном режиме (writer.ChangeLogEvents), поэтому
+    страницы должны опираться лишь на entity, op и id. id None - изменено
+    сразу много записей (загрузка клиентов); в многопроцессном режиме
+    вместо него приходят события по каждой записи.
+
+    Если подписчик не успевает забирать события и очередь переполняется, она
+    очищается, в нее кладется None (признак "перечитать все") и подписчик
+    отключается. max_subscribers ограничивает число подписчиков (None - без
+    ограничения).
+    """
+
+    def __init__(self, max_queue=1000, max_subscribers=None):
+        self.max_queue = max_queue
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self):
+        """Новая очередь событий; None, если подписчиков уже max_subscribers"""
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, changes):
+        """Отправка событий всем подписчикам без ожидания"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                for change in changes:
+                    subscriber.put_nowait(change)
+            except queue.Full:
+                self.unsubscribe(subscriber)
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait(None)
+
+
+# ========== ГРУППОВАЯ ФИКСАЦИЯ ==========
+
+class _WriteJob:
+    """Вызов метода записи, ожидающий фиксации своей пачки"""
+    __slots__ = ('func', 'args', 'kwargs', 'result', 'error', 'done')
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class WriteBatcher:
+    """Поток записи с групповой фиксацией
+
+    Вызовы методов записи из любых потоков ставятся в очередь. Поток записи
+    забирает из нее все накопившиеся вызовы (не больше max_size), а если
+    задано окно window (секунды) - еще и ждет новые вызовы до window после
+    первого, и выполняет их одной транзакцией: каждый вызов - в своей точке
+    сохранения, так что ошибка одного вызова откатывает только его
+    изменения. Вызывающий поток получает результат после фиксации всей
+    пачки, то есть когда его запись уже надежно сохранена.
+    """
+
+    def __init__(self, db, max_size=100, window=0.0):
+        self.db = db
+        self.max_size = max_size
+        self.window = window
+        self.batches = 0
+        self.calls = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='write-batcher', daemon=True)
+        self._thread.start()
+
+    def in_writer_thread(self):
+        """Текущий поток - поток записи"""
+        return threading.get_ident() == self._thread.ident
+
+    def submit(self, func, args=(), kwargs=None):
+        """Выполнение func(*args, **kwargs) в потоке записи; результат - после фиксации"""
+        job = _WriteJob(func, args, kwargs or {})
+        self._queue.put(job)
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _collect(self):
+        """Следующая пачка: первый вызов ждем, остальные - пока не истечет окно"""
+        job = self._queue.get()
+        if job is None:
+            return None
+        batch = [job]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                self._queue.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._execute(batch)
+
+    def _execute(self, batch):
+        """Пачка вызовов одной транзакцией с точкой сохранения на каждый вызов"""
+        try:
+            with self.db._write() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                for job in batch:
+                    job.result, job.error = self.db._call_in_savepoint(conn, 'write_batch_item', job.func,
+                                                                       *job.args, **job.kwargs)
+        except BaseException as e:
+            # Транзакция пачки откатилась целиком
+            for job in batch:
+                job.result = None
+                job.error = job.error or e
+        finally:
+            self.batches += 1
+            self.calls += len(batch)
+            for job in batch:
+                job.done.set()
+
+    def get_stats(self):
+        """Число пачек и вызовов для мониторинга"""
+        return {
+            'batches': self.batches,
+            'calls': self.calls,
+            'window_ms': round(self.window * 1000, 3),
+            'max_size': self.max_size,
+            'avg_batch_size': round(self.calls / self.batches, 2) if self.batches else 0.0,
+            'queued': self._queue.qsize()
+        }
+
+    def close(self):
+        """Выполнение уже поставленных вызовов и остановка потока записи"""
+        self._queue.put(None)
+        self._thread.join()
+
+
+def write_method(func):
+    """Метод Database, изменяющий данные
+
+    Такие методы перечислены в WRITE_METHODS (их вызовы воркеры передают
+    процессу записи, см. writer.py). Если у Database включена групповая
+    фиксация, вызов выполняется в потоке записи WriteBatcher; вложенные
+    вызовы и вызовы внутри уже открытой транзакции выполняются сразу.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        batcher = self._write_batcher
+        if (batcher is None or batcher.in_writer_thread()
+                or self._write_owner == threading.get_ident()):
+            return func(self, *args, **kwargs)
+        return batcher.submit(func, (self,) + args, kwargs)
+
+    wrapper.is_write_method = True
+    return wrapper
+
+
+class Database:
+    def __init__(self, db_name='autoservice.db', read_pool_size=4, pool_timeout=30.0,
+                 storage_profile='balanced', checkpoint_interval=300, stats_cache_ttl=30, query_log=None,
+                 batch_writes=False, write_batch_size=100, write_batch_window_ms=0):
+        self.db_name = db_name
+        self.read_pool_size = read_pool_size
+        self.pool_timeout = pool_timeout
+        self.checkpoint_interval = checkpoint_interval
+        self.stats_cache_ttl = stats_cache_ttl
+        # Журнал запросов (QueryLog); None - соединения без инструментирования
+        self.query_log = query_log
+        # Групповая фиксация: методы записи выполняются пачками в потоке WriteBatcher;
+        # записи, пришедшие в пределах окна write_batch_window_ms, фиксируются вместе
+        self.batch_writes = batch_writes
+        self.write_batch_size = write_batch_size
+        self.write_batch_window_ms = write_batch_window_ms
+
+        if isinstance(storage_profile, dict):
+            self.storage_profile = 'custom'
+            self.pragmas = dict(storage_profile)
+        elif storage_profile in STORAGE_PROFILES:
+            self.storage_profile = storage_profile
+            self.pragmas = dict(STORAGE_PROFILES[storage_profile])
+        else:
+            raise ValueError(f"Неизвестный профиль хранения: {storage_profile}")
+
+        self._init_db()
+
+    def _connect(self, read_only=False):
+        """Открытие нового соединения с БД и применение профиля хранения"""
+        if self.query_log is not None:
+            conn = sqlite3.connect(self.db_name, timeout=self.pool_timeout, check_same_thread=False,
+                                   factory=InstrumentedConnection)
+            conn.query_log = self.query_log
+        else:
+            conn = sqlite3.connect(self.db_name, timeout=self.pool_timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA foreign_keys = ON')
+        for name, value in self.pragmas.items():
+            if read_only and name in WRITER_ONLY_PRAGMAS:
+                continue
+            conn.execute(f'PRAGMA {name} = {value}')
+        if read_only:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    def get_storage_settings(self):
+        """Фактические значения PRAGMA соединения записи"""
+        with self._write_lock:
+            settings = {'profile': self.storage_profile}
+            for name in ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store',
+                         'busy_timeout', 'wal_autocheckpoint'):
+                settings[name] = self.conn.execute(f'PRAGMA {name}').fetchone()[0]
+            return settings
+
+    def checkpoint(self, mode='PASSIVE'):
+        """Перенос WAL-журнала в основной файл БД
+
+        Возвращает (busy, log_frames, checkpointed_frames) как PRAGMA wal_checkpoint.
+        """
+        if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"Неизвестный режим checkpoint: {mode}")
+        with self._write_lock:
+            self._last_checkpoint = time.monotonic()
+            return tuple(self.conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone())
+
+    def _maybe_checkpoint(self):
+        """Периодический checkpoint после фиксации транзакций"""
+        if not self.checkpoint_interval or self.pragmas.get('journal_mode', '').upper() != 'WAL':
+            return
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            try:
+                self.checkpoint('PASSIVE')
+            except sqlite3.Error as e:
+                print(f"Ошибка checkpoint: {e}")
+
+    def _init_db(self):
+        """Инициализация базы данных
+
+        Все записи идут через одно соединение (self.conn) под блокировкой,
+        чтение - через пул соединений. Для БД в памяти пул не создается:
+        каждое соединение с ':memory:' видело бы свою отдельную базу.
+        """
+        try:
+            self._write_lock = threading.RLock()
+            self._write_depth = 0
+            self._write_owner = None
+            self._read_pool = None
+            self._last_checkpoint = time.monotonic()
+            # Кэш get_stats: (версия данных, срок годности, статистика);
+            # версия увеличивается при каждой фиксации транзакции записи
+            self._stats_lock = threading.Lock()
+            self._stats_cache = None
+            self._data_version = 0
+            self.stats_cache_hits = 0
+            self.stats_cache_misses = 0
+            self._write_batcher = None
+            # События об изменениях текущей транзакции записи и их подписчики
+            self._pending_changes = []
+            self.events = ChangeEvents()
+            self.conn = self._connect()
+            self.create_tables()
+
+            if self.db_name != ':memory:' and self.read_pool_size > 0:
+                self._read_pool = ConnectionPool(
+                    lambda: self._connect(read_only=True),
+                    size=self.read_pool_size,
+                    timeout=self.pool_timeout
+                )
+            if self.batch_writes:
+                self._write_batcher = WriteBatcher(self, max_size=self.write_batch_size,
+                                                   window=self.write_batch_window_ms / 1000)
+            print(f"✅ База данных {self.db_name} инициализирована (профиль хранения: {self.storage_profile})")
+        except Exception as e:
+            print(f"❌ Ошибка инициализации БД: {e}")
+            traceback.print_exc()
+            raise
+
+    def create_tables(self):
+        """Создание всех таблиц"""
+        cursor = self.conn.cursor()
+
+        # Включаем поддержку внешних ключей
+        cursor.execute('PRAGMA foreign_keys = ON')
+
+        # Клиенты
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS clients
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           full_name
+                           TEXT
+                           NOT
+                           NULL,
+                           phone
+                           TEXT
+                           NOT
+                           NULL
+                           UNIQUE,
+                           car_model
+                           TEXT
+                           NOT
+                           NULL,
+                           car_number
+                           TEXT,
+                           car_year
+                           INTEGER,
+                           vin
+                           TEXT,
+                           notes
+                           TEXT,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP
+                       )
+                       ''')
+
+        # Работники
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS employees
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           full_name
+                           TEXT
+                           NOT
+                           NULL,
+                           position
+                           TEXT
+                           NOT
+                           NULL,
+                           phone
+                           TEXT,
+                           commission_rate
+                           REAL
+                           NOT
+                           NULL
+                           DEFAULT
+                           15.0,
+                           hire_date
+                           DATE,
+                           is_active
+                           BOOLEAN
+                           DEFAULT
+                           TRUE,
+                           notes
+                           TEXT,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           updated_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP
+                       )
+                       ''')
+
+        # Заказ-наряды
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS work_orders
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           client_id
+                           INTEGER
+                           NOT
+                           NULL,
+                           employee_id
+                           INTEGER,
+                           order_number
+                           TEXT
+                           UNIQUE,
+                           description
+                           TEXT
+                           NOT
+                           NULL,
+                           status
+                           TEXT
+                           DEFAULT
+                           'new',
+                           total_amount
+                           REAL
+                           DEFAULT
+                           0,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           completed_at
+                           TIMESTAMP,
+                           FOREIGN
+                           KEY
+                       (
+                           client_id
+                       ) REFERENCES clients
+                       (
+                           id
+                       ) ON DELETE CASCADE,
+                           FOREIGN KEY
+                       (
+                           employee_id
+                       ) REFERENCES employees
+                       (
+                           id
+                       )
+                         ON DELETE SET NULL
+                           )
+                       ''')
+
+        # Работы в заказ-наряде
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS order_works
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           order_id
+                           INTEGER
+                           NOT
+                           NULL,
+                           work_name
+                           TEXT
+                           NOT
+                           NULL,
+                           quantity
+                           INTEGER
+                           DEFAULT
+                           1,
+                           price_per_unit
+                           REAL
+                           DEFAULT
+                           0,
+                           total_price
+                           REAL
+                           DEFAULT
+                           0,
+                           FOREIGN
+                           KEY
+                       (
+                           order_id
+                       ) REFERENCES work_orders
+                       (
+                           id
+                       ) ON DELETE CASCADE
+                           )
+                       ''')
+
+        # Расходы в заказ-наряде (запчасти с наценкой)
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS order_expenses
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           order_id
+                           INTEGER
+                           NOT
+                           NULL,
+                           expense_name
+                           TEXT
+                           NOT
+                           NULL,
+                           expense_type
+                           TEXT
+                           DEFAULT
+                           'material',
+                           quantity
+                           INTEGER
+                           DEFAULT
+                           1,
+                           cost_per_unit
+                           REAL
+                           DEFAULT
+                           0,
+                           markup
+                           REAL
+                           DEFAULT
+                           0, -- наценка в процентах
+                           total_cost
+                           REAL
+                           DEFAULT
+                           0,
+                           FOREIGN
+                           KEY
+                       (
+                           order_id
+                       ) REFERENCES work_orders
+                       (
+                           id
+                       ) ON DELETE CASCADE
+                           )
+                       ''')
+
+        # Начисления зарплаты работникам
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS employee_salary
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           employee_id
+                           INTEGER
+                           NOT
+                           NULL,
+                           order_id
+                           INTEGER,
+                           amount
+                           REAL
+                           NOT
+                           NULL,
+                           commission_rate
+                           REAL
+                           NOT
+                           NULL,
+                           works_total
+                           REAL
+                           NOT
+                           NULL,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           FOREIGN
+                           KEY
+                       (
+                           employee_id
+                       ) REFERENCES employees
+                       (
+                           id
+                       ) ON DELETE CASCADE,
+                           FOREIGN KEY
+                       (
+                           order_id
+                       ) REFERENCES work_orders
+                       (
+                           id
+                       )
+                         ON DELETE SET NULL
+                           )
+                       ''')
+
+        # Выплаты зарплаты
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS salary_payments
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           employee_id
+                           INTEGER
+                           NOT
+                           NULL,
+                           amount
+                           REAL
+                           NOT
+                           NULL,
+                           description
+                           TEXT,
+                           payment_date
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           FOREIGN
+                           KEY
+                       (
+                           employee_id
+                       ) REFERENCES employees
+                       (
+                           id
+                       ) ON DELETE CASCADE
+                           )
+                       ''')
+
+        # Задачи
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS tasks
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           title
+                           TEXT
+                           NOT
+                           NULL,
+                           description
+                           TEXT,
+                           priority
+                           TEXT
+                           DEFAULT
+                           'medium',
+                           status
+                           TEXT
+                           DEFAULT
+                           'pending',
+                           assigned_to
+                           TEXT,
+                           due_date
+                           TIMESTAMP,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           completed_at
+                           TIMESTAMP
+                       )
+                       ''')
+
+        # Касса (доходы и расходы)
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS cash_flow
+                       (
+                           id
+                           INTEGER
+                           PRIMARY
+                           KEY
+                           AUTOINCREMENT,
+                           transaction_type
+                           TEXT
+                           NOT
+                           NULL,
+                           category
+                           TEXT
+                           NOT
+                           NULL,
+                           amount
+                           REAL
+                           NOT
+                           NULL,
+                           description
+                           TEXT,
+                           order_id
+                           INTEGER,
+                           date
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           created_at
+                           TIMESTAMP
+                           DEFAULT
+                           CURRENT_TIMESTAMP,
+                           FOREIGN
+                           KEY
+                       (
+                           order_id
+                       ) REFERENCES work_orders
+                       (
+                           id
+                       ) ON DELETE SET NULL
+                           )
+                       ''')
+
+        # Индексы
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_phone ON clients(phone)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_created ON clients(created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_employees_active ON employees(is_active)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON work_orders(status)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_client ON work_orders(client_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_orders_created ON work_orders(created_at)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cashflow_date ON cash_flow(date)')
+        # Выборки кассы за период идут по idx_cashflow_date, суммы - по cash_daily;
+        # индексы по типу операции ни один запрос не использует, они только
+        # замедляли бы каждую вставку в cash_flow
+        cursor.execute('DROP INDEX IF EXISTS idx_cashflow_type')
+        cursor.execute('DROP INDEX IF EXISTS idx_cashflow_type_date')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cashflow_category ON cash_flow(category)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_salary_employee ON employee_salary(employee_id, amount)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_payments_employee ON salary_payments(employee_id, amount)')
+
+        self._create_posting_indexes(cursor)
+        self._create_client_lookup(cursor)
+        self._create_employee_balances(cursor)
+        self._create_cash_rollups(cursor)
+        self._create_order_sequences(cursor)
+        self._create_search_index(cursor)
+        self._create_change_log(cursor)
+
+        self.conn.commit()
+        print("✅ Все таблицы созданы/проверены")
+
+    def _add_column_if_missing(self, cursor, table, column, definition):
+        """Добавление колонки в существующую таблицу; True, если колонка добавлена"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        if column in [row[1] for row in cursor.fetchall()]:
+            return False
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        return True
+
+    def _create_client_lookup(self, cursor):
+        """Нормализованные телефон и госномер клиента для индексного поиска"""
+        added_phone = self._add_column_if_missing(cursor, 'clients', 'phone_digits', 'TEXT')
+        added_plate = self._add_column_if_missing(cursor, 'clients', 'car_number_norm', 'TEXT')
+
+        if added_phone or added_plate:
+            cursor.execute('SELECT id, phone, car_number FROM clients')
+            cursor.executemany(
+                'UPDATE clients SET phone_digits = ?, car_number_norm = ? WHERE id = ?',
+                [(normalize_phone(row['phone']), normalize_plate(row['car_number']), row['id'])
+                 for row in cursor.fetchall()]
+            )
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_phone_digits ON clients(phone_digits)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_clients_car_number_norm ON clients(car_number_norm)')
+
+    def _table_exists(self, cursor, name):
+        """Проверка существования таблицы"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?", (name,))
+        return cursor.fetchone() is not None
+
+    def _create_posting_indexes(self, cursor):
+        """Защита от повторных проводок при завершении заказа
+
+        Уникальность (order_id, category) действует только для автоматических
+        проводок заказа (order_work, order_markup) - ручные операции кассы с
+        order_id могут повторяться. Начисление зарплаты по заказу одно.
+        Прежние версии проводили заказ заново при каждом завершении, поэтому
+        в старой базе могут быть повторы: тогда индексы не создаются и
+        выводится предупреждение. Данные здесь не удаляются - повторы
+        разбирает оператор (python maintenance.py verify-postings /
+        dedupe-postings).
+        """
+        cursor.execute('''
+                       SELECT COUNT(*)
+                       FROM sqlite_master
+                       WHERE type = 'index'
+                         AND name IN ('idx_cashflow_order_posting', 'idx_salary_order')
+                       ''')
+        if cursor.fetchone()[0] == 2:
+            return
+
+        cursor.execute(self._DUPLICATE_POSTINGS_SQL)
+        duplicates = cursor.fetchall()
+        if duplicates:
+            orders = len({row['order_id'] for row in duplicates})
+            print(f"⚠️ Повторные проводки по {orders} заказам: уникальные индексы проводок не созданы, "
+                  f"завершение заказов недоступно. Проверить: python maintenance.py verify-postings")
+            return
+
+        cursor.execute('''
+                       CREATE UNIQUE INDEX IF NOT EXISTS idx_cashflow_order_posting
+                           ON cash_flow (order_id, category)
+                           WHERE order_id IS NOT NULL AND category IN ('order_work', 'order_markup')
+                       ''')
+        cursor.execute('''
+                       CREATE UNIQUE INDEX IF NOT EXISTS idx_salary_order
+                           ON employee_salary (order_id) WHERE order_id IS NOT NULL
+                       ''')
+
+    def _create_employee_balances(self, cursor):
+        """Материализованные балансы зарплаты работников
+
+        Таблица employee_balances обновляется триггерами на employee_salary и
+        salary_payments, поэтому чтение баланса и проверка переплаты не
+        зависят от длины истории. При первом создании заполняется из истории.
+        """
+        is_new = not self._table_exists(cursor, 'employee_balances')
+
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS employee_balances
+                       (
+                           employee_id    INTEGER PRIMARY KEY,
+                           earned_amount  REAL NOT NULL DEFAULT 0,
+                           paid_amount    REAL NOT NULL DEFAULT 0,
+                           pending_amount REAL NOT NULL DEFAULT 0,
+                           FOREIGN KEY (employee_id) REFERENCES employees (id) ON DELETE CASCADE
+                       )
+                       ''')
+
+        # Начисления увеличивают earned и pending, выплаты - paid и уменьшают pending
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_salary_balance_insert
+                           AFTER INSERT ON employee_salary
+                       BEGIN
+                           INSERT INTO employee_balances (employee_id, earned_amount, pending_amount)
+                           VALUES (NEW.employee_id, NEW.amount, NEW.amount)
+                           ON CONFLICT(employee_id) DO UPDATE
+                               SET earned_amount  = earned_amount + NEW.amount,
+                                   pending_amount = pending_amount + NEW.amount;
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_salary_balance_delete
+                           AFTER DELETE ON employee_salary
+                       BEGIN
+                           UPDATE employee_balances
+                           SET earned_amount  = earned_amount - OLD.amount,
+                               pending_amount = pending_amount - OLD.amount
+                           WHERE employee_id = OLD.employee_id;
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_salary_balance_update
+                           AFTER UPDATE OF amount, employee_id ON employee_salary
+                       BEGIN
+                           UPDATE employee_balances
+                           SET earned_amount  = earned_amount - OLD.amount,
+                               pending_amount = pending_amount - OLD.amount
+                           WHERE employee_id = OLD.employee_id;
+                           INSERT INTO employee_balances (employee_id, earned_amount, pending_amount)
+                           VALUES (NEW.employee_id, NEW.amount, NEW.amount)
+                           ON CONFLICT(employee_id) DO UPDATE
+                               SET earned_amount  = earned_amount + NEW.amount,
+                                   pending_amount = pending_amount + NEW.amount;
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_payment_balance_insert
+                           AFTER INSERT ON salary_payments
+                       BEGIN
+                           INSERT INTO employee_balances (employee_id, paid_amount, pending_amount)
+                           VALUES (NEW.employee_id, NEW.amount, -NEW.amount)
+                           ON CONFLICT(employee_id) DO UPDATE
+                               SET paid_amount    = paid_amount + NEW.amount,
+                                   pending_amount = pending_amount - NEW.amount;
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_payment_balance_delete
+                           AFTER DELETE ON salary_payments
+                       BEGIN
+                           UPDATE employee_balances
+                           SET paid_amount    = paid_amount - OLD.amount,
+                               pending_amount = pending_amount + OLD.amount
+                           WHERE employee_id = OLD.employee_id;
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_payment_balance_update
+                           AFTER UPDATE OF amount, employee_id ON salary_payments
+                       BEGIN
+                           UPDATE employee_balances
+                           SET paid_amount    = paid_amount - OLD.amount,
+                               pending_amount = pending_amount + OLD.amount
+                           WHERE employee_id = OLD.employee_id;
+                           INSERT INTO employee_balances (employee_id, paid_amount, pending_amount)
+                           VALUES (NEW.employee_id, NEW.amount, -NEW.amount)
+                           ON CONFLICT(employee_id) DO UPDATE
+                               SET paid_amount    = paid_amount + NEW.amount,
+                                   pending_amount = pending_amount - NEW.amount;
+                       END
+                       ''')
+
+        if is_new:
+            self._fill_employee_balances(cursor)
+
+    def _create_cash_rollups(self, cursor):
+        """Дневные итоги кассы и текущий баланс
+
+        cash_daily - суммы и число операций за день по типу и категории,
+        cash_balance - одна строка с итогами доходов и расходов за все время.
+        Обе таблицы обновляются триггерами на cash_flow, поэтому статистика
+        за период и баланс не перечитывают всю историю операций. При первом
+        создании заполняются из cash_flow.
+        """
+        is_new = not self._table_exists(cursor, 'cash_daily')
+
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS cash_daily
+                       (
+                           day              TEXT    NOT NULL,
+                           transaction_type TEXT    NOT NULL,
+                           category         TEXT    NOT NULL,
+                           amount           REAL    NOT NULL DEFAULT 0,
+                           row_count        INTEGER NOT NULL DEFAULT 0,
+                           PRIMARY KEY (day, transaction_type, category)
+                       ) WITHOUT ROWID
+                       ''')
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS cash_balance
+                       (
+                           id             INTEGER PRIMARY KEY CHECK (id = 1),
+                           income_amount  REAL    NOT NULL DEFAULT 0,
+                           expense_amount REAL    NOT NULL DEFAULT 0,
+                           row_count      INTEGER NOT NULL DEFAULT 0
+                       )
+                       ''')
+        cursor.execute('INSERT OR IGNORE INTO cash_balance (id) VALUES (1)')
+
+        # Операция добавляется в итоги своего дня и в баланс, удаление - вычитается;
+        # дни без операций удаляются. Суммы копятся без округления, округляем при чтении.
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_cash_rollup_insert
+                           AFTER INSERT ON cash_flow
+                       BEGIN
+                           INSERT INTO cash_daily (day, transaction_type, category, amount, row_count)
+                           VALUES (COALESCE(date(NEW.date), ''), NEW.transaction_type, NEW.category, NEW.amount, 1)
+                           ON CONFLICT(day, transaction_type, category) DO UPDATE
+                               SET amount    = amount + NEW.amount,
+                                   row_count = row_count + 1;
+                           UPDATE cash_balance
+                           SET income_amount  = income_amount +
+                                                CASE WHEN NEW.transaction_type = 'income' THEN NEW.amount ELSE 0 END,
+                               expense_amount = expense_amount +
+                                                CASE WHEN NEW.transaction_type = 'expense' THEN NEW.amount ELSE 0 END,
+                               row_count      = row_count + 1
+                           WHERE id = 1;
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_cash_rollup_delete
+                           AFTER DELETE ON cash_flow
+                       BEGIN
+                           UPDATE cash_daily
+                           SET amount    = amount - OLD.amount,
+                               row_count = row_count - 1
+                           WHERE day = COALESCE(date(OLD.date), '')
+                             AND transaction_type = OLD.transaction_type
+                             AND category = OLD.category;
+                           DELETE FROM cash_daily
+                           WHERE day = COALESCE(date(OLD.date), '')
+                             AND transaction_type = OLD.transaction_type
+                             AND category = OLD.category
+                             AND row_count <= 0;
+                           UPDATE cash_balance
+                           SET income_amount  = income_amount -
+                                                CASE WHEN OLD.transaction_type = 'income' THEN OLD.amount ELSE 0 END,
+                               expense_amount = expense_amount -
+                                                CASE WHEN OLD.transaction_type = 'expense' THEN OLD.amount ELSE 0 END,
+                               row_count      = row_count - 1
+                           WHERE id = 1;
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_cash_rollup_update
+                           AFTER UPDATE OF date, transaction_type, category, amount ON cash_flow
+                       BEGIN
+                           UPDATE cash_daily
+                           SET amount    = amount - OLD.amount,
+                               row_count = row_count - 1
+                           WHERE day = COALESCE(date(OLD.date), '')
+                             AND transaction_type = OLD.transaction_type
+                             AND category = OLD.category;
+                           DELETE FROM cash_daily
+                           WHERE day = COALESCE(date(OLD.date), '')
+                             AND transaction_type = OLD.transaction_type
+                             AND category = OLD.category
+                             AND row_count <= 0;
+                           INSERT INTO cash_daily (day, transaction_type, category, amount, row_count)
+                           VALUES (COALESCE(date(NEW.date), ''), NEW.transaction_type, NEW.category, NEW.amount, 1)
+                           ON CONFLICT(day, transaction_type, category) DO UPDATE
+                               SET amount    = amount + NEW.amount,
+                                   row_count = row_count + 1;
+                           UPDATE cash_balance
+                           SET income_amount  = income_amount
+                                                - CASE WHEN OLD.transaction_type = 'income' THEN OLD.amount ELSE 0 END
+                                                + CASE WHEN NEW.transaction_type = 'income' THEN NEW.amount ELSE 0 END,
+                               expense_amount = expense_amount
+                                                - CASE WHEN OLD.transaction_type = 'expense' THEN OLD.amount ELSE 0 END
+                                                + CASE WHEN NEW.transaction_type = 'expense' THEN NEW.amount ELSE 0 END
+                           WHERE id = 1;
+                       END
+                       ''')
+
+        if is_new:
+            self._fill_cash_rollups(cursor)
+
+    def _create_order_sequences(self, cursor):
+        """Счетчики номеров заказ-нарядов по дням
+
+        Номер YYMMDD-NNN выдается увеличением order_sequences.last_value в
+        той же транзакции, что и вставка заказа: без сканирования work_orders
+        и без дублей при одновременных запросах. При первом создании
+        счетчики заполняются максимальными существующими номерами.
+        """
+        is_new = not self._table_exists(cursor, 'order_sequences')
+
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS order_sequences
+                       (
+                           day        TEXT PRIMARY KEY,
+                           last_value INTEGER NOT NULL
+                       ) WITHOUT ROWID
+                       ''')
+
+        if is_new:
+            cursor.execute('''
+                           INSERT INTO order_sequences (day, last_value)
+                           SELECT substr(order_number, 1, 6), MAX(CAST(substr(order_number, 8) AS INTEGER))
+                           FROM work_orders
+                           WHERE order_number GLOB '[0-9][0-9][0-9][0-9][0-9][0-9]-[0-9]*'
+                           GROUP BY substr(order_number, 1, 6)
+                           ''')
+
+    def _create_search_index(self, cursor):
+        """Полнотекстовый индекс FTS5 (триграммы) по клиентам и заказ-нарядам
+
+        Индексы внешнего содержимого (content=...) синхронизируются
+        триггерами, триграммный токенизатор находит любые подстроки от трех
+        символов. Если SQLite собран без FTS5, поиск работает через LIKE.
+        """
+        is_new = not self._table_exists(cursor, 'clients_fts')
+
+        try:
+            cursor.execute('''
+                           CREATE VIRTUAL TABLE IF NOT EXISTS clients_fts USING fts5(
+                               full_name, phone, car_model, car_number, vin,
+                               content='clients', content_rowid='id', tokenize='trigram'
+                           )
+                           ''')
+            cursor.execute('''
+                           CREATE VIRTUAL TABLE IF NOT EXISTS work_orders_fts USING fts5(
+                               order_number, description,
+                               content='work_orders', content_rowid='id', tokenize='trigram'
+                           )
+                           ''')
+        except sqlite3.OperationalError as e:
+            self.fts_enabled = False
+            print(f"⚠️ FTS5 недоступен, поиск будет через LIKE: {e}")
+            return
+
+        self.fts_enabled = True
+
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_clients_fts_insert
+                           AFTER INSERT ON clients
+                       BEGIN
+                           INSERT INTO clients_fts (rowid, full_name, phone, car_model, car_number, vin)
+                           VALUES (NEW.id, NEW.full_name, NEW.phone, NEW.car_model, NEW.car_number, NEW.vin);
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_clients_fts_delete
+                           AFTER DELETE ON clients
+                       BEGIN
+                           INSERT INTO clients_fts (clients_fts, rowid, full_name, phone, car_model, car_number, vin)
+                           VALUES ('delete', OLD.id, OLD.full_name, OLD.phone, OLD.car_model, OLD.car_number, OLD.vin);
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_clients_fts_update
+                           AFTER UPDATE OF full_name, phone, car_model, car_number, vin ON clients
+                       BEGIN
+                           INSERT INTO clients_fts (clients_fts, rowid, full_name, phone, car_model, car_number, vin)
+                           VALUES ('delete', OLD.id, OLD.full_name, OLD.phone, OLD.car_model, OLD.car_number, OLD.vin);
+                           INSERT INTO clients_fts (rowid, full_name, phone, car_model, car_number, vin)
+                           VALUES (NEW.id, NEW.full_name, NEW.phone, NEW.car_model, NEW.car_number, NEW.vin);
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_work_orders_fts_insert
+                           AFTER INSERT ON work_orders
+                       BEGIN
+                           INSERT INTO work_orders_fts (rowid, order_number, description)
+                           VALUES (NEW.id, NEW.order_number, NEW.description);
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_work_orders_fts_delete
+                           AFTER DELETE ON work_orders
+                       BEGIN
+                           INSERT INTO work_orders_fts (work_orders_fts, rowid, order_number, description)
+                           VALUES ('delete', OLD.id, OLD.order_number, OLD.description);
+                       END
+                       ''')
+        cursor.execute('''
+                       CREATE TRIGGER IF NOT EXISTS trg_work_orders_fts_update
+                           AFTER UPDATE OF order_number, description ON work_orders
+                       BEGIN
+                           INSERT INTO work_orders_fts (work_orders_fts, rowid, order_number, description)
+                           VALUES ('delete', OLD.id, OLD.order_number, OLD.description);
+                           INSERT INTO work_orders_fts (rowid, order_number, description)
+                           VALUES (NEW.id, NEW.order_number, NEW.description);
+                       END
+                       ''')
+
+        if is_new:
+            self._fill_search_index(cursor)
+
+    def _create_change_log(self, cursor):
+        """Журнал изменений change_log (outbox) для инкрементальной синхронизации
+
+        Каждая вставка, изменение и удаление строки таблиц CHANGE_LOG_TABLES
+        добавляет триггером запись (таблица, id строки, операция) в той же
+        транзакции, что и само изменение: откат изменения откатывает и запись.
+        version растет монотонно (AUTOINCREMENT не переиспользует номера
+        после очистки) и служит курсором чтения в get_changes().
+        """
+        cursor.execute('''
+                       CREATE TABLE IF NOT EXISTS change_log
+                       (
+                           version    INTEGER PRIMARY KEY AUTOINCREMENT,
+                           table_name TEXT    NOT NULL,
+                           pk         INTEGER NOT NULL,
+                           op         TEXT    NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+                           ts         TEXT    NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+                       )
+                       ''')
+
+        for table in CHANGE_LOG_TABLES:
+            for op, event, row in (('insert', 'INSERT', 'NEW'), ('update', 'UPDATE', 'NEW'),
+                                   ('delete', 'DELETE', 'OLD')):
+                cursor.execute(f'''
+                               CREATE TRIGGER IF NOT EXISTS trg_{table}_change_log_{op}
+                                   AFTER {event} ON {table}
+                               BEGIN
+                                   INSERT INTO change_log (table_name, pk, op) VALUES ('{table}', {row}.id, '{op}');
+                               END
+                               ''')
+
+    def _fill_search_index(self, cursor):
+        """Перестроение FTS-индексов по содержимому таблиц"""
+        cursor.execute("INSERT INTO clients_fts (clients_fts) VALUES ('rebuild')")
+        cursor.execute("INSERT INTO work_orders_fts (work_orders_fts) VALUES ('rebuild')")
+
+    @write_method
+    def rebuild_search_index(self):
+        """Пересборка поискового индекса; возвращает False, если FTS5 недоступен"""
+        if not self.fts_enabled:
+            return False
+        with self._write() as conn:
+            cursor = conn.cursor()
+            self._fill_search_index(cursor)
+            cursor.execute("INSERT INTO clients_fts (clients_fts) VALUES ('optimize')")
+            cursor.execute("INSERT INTO work_orders_fts (work_orders_fts) VALUES ('optimize')")
+            return True
+
+    def _fts_query(self, search_term):
+        """Строка запроса FTS5 для поискового запроса пользователя
+
+        Каждое слово ищется как подстрока (фраза в кавычках), слова
+        объединяются через AND. Триграммам нужно минимум три символа, поэтому
+        для более коротких слов возвращается None и используется LIKE.
+        """
+        if not self.fts_enabled:
+            return None
+        words = search_term.split()
+        if not words or any(len(word) < 3 for word in words):
+            return None
+        return ' '.join('"' + word.replace('"', '""') + '"' for word in words)
+
+    # ========== СОЕДИНЕНИЯ ==========
+
+    @contextmanager
+    def _read(self):
+        """Соединение для чтения из пула
+
+        Если текущий поток уже ведет транзакцию записи, отдаем соединение
+        записи, чтобы чтение видело еще не зафиксированные изменения.
+        """
+        if self._write_owner == threading.get_ident() or self._read_pool is None:
+            with self._write_lock:
+                yield self.conn
+            return
+
+        with self._read_pool.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def _write(self):
+        """Транзакция на единственном соединении записи
+
+        Вложенные вызовы выполняются в рамках внешней транзакции:
+        commit/rollback делает только самый внешний уровень.
+        """
+        with self._write_lock:
+            self._write_depth += 1
+            self._write_owner = threading.get_ident()
+            try:
+                yield self.conn
+            except BaseException:
+                if self._write_depth == 1:
+                    self.conn.rollback()
+                    self._pending_changes = []
+                raise
+            else:
+                if self._write_depth == 1:
+                    self.conn.commit()
+                    self._invalidate_caches()
+                    self._publish_changes()
+                    self._maybe_checkpoint()
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._write_owner = None
+
+    def _emit(self, entity, op, entity_id, **data):
+        """Событие об изменении; рассылается подписчикам events после фиксации транзакции"""
+        self._pending_changes.append(dict(entity=entity, op=op, id=entity_id, **data))
+
+    def _publish_changes(self):
+        if self._pending_changes:
+            changes, self._pending_changes = self._pending_changes, []
+            self.events.publish(changes)
+
+    def _call_in_savepoint(self, conn, name, func, *args, **kwargs):
+        """Вызов func внутри транзакции в точке сохранения name: (результат, исключение)
+
+        Если func завершилась исключением, откатываются только ее изменения
+        и ее события, транзакция продолжается.
+        """
+        conn.execute(f'SAVEPOINT {name}')
+        changes_mark = len(self._pending_changes)
+        try:
+            return func(*args, **kwargs), None
+        except Exception as e:
+            conn.execute(f'ROLLBACK TO {name}')
+            del self._pending_changes[changes_mark:]
+            return None, e
+        finally:
+            conn.execute(f'RELEASE {name}')
+
+    def _run_batch(self, operations, handlers):
+        """Пакет операций [{'id': ..., 'op': ..., ...}] одной транзакцией
+
+        handlers - {имя операции: функция(id, операция)}. Каждая операция
+        выполняется в своей точке сохранения: ошибка (ValueError, запись не
+        найдена) отменяет только ее. Результаты - в порядке операций:
+        {'index', 'id', 'op', 'success', 'result' или 'error'}.
+        """
+        results = []
+        with self._write() as conn:
+            if not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')
+            for index, operation in enumerate(operations):
+                result, error = self._call_in_savepoint(conn, 'batch_item', self._batch_operation,
+                                                        handlers, operation)
+                item = {'index': index,
+                        'id': operation.get('id') if isinstance(operation, dict) else None,
+                        'op': operation.get('op') if isinstance(operation, dict) else None,
+                        'success': error is None}
+                if error is None:
+                    item['result'] = result
+                else:
+                    item['error'] = str(error)
+                results.append(item)
+        return results
+
+    @staticmethod
+    def _batch_operation(handlers, operation):
+        if not isinstance(operation, dict):
+            raise ValueError('Операция должна быть объектом')
+        handler = handlers.get(operation.get('op'))
+        if handler is None:
+            raise ValueError(f"Неизвестная операция: {operation.get('op')}")
+        item_id = operation.get('id')
+        if not isinstance(item_id, int) or isinstance(item_id, bool):
+            raise ValueError('Не указан id')
+        return handler(item_id, operation)
+
+    @staticmethod
+    def _batch_fields(operation, allowed):
+        """Поля операции update: только из allowed"""
+        fields = operation.get('fields')
+        if not isinstance(fields, dict) or not fields:
+            raise ValueError('Не указаны поля для изменения')
+        unknown = sorted(set(fields) - set(allowed))
+        if unknown:
+            raise ValueError(f"Эти поля нельзя изменить: {', '.join(unknown)}")
+        return dict(fields)
+
+    def _keyset_select(self, cursor, sql, conditions, params, order, limit=None, after=None, stream=False):
+        """Выборка с порядком order и keyset-пагинацией
+
+        sql - запрос без WHERE/ORDER BY, conditions - условия через AND,
+        after - значения ключей последней строки предыдущей страницы.
+        stream=True - вернуть курсор с выполненным запросом вместо всех строк.
+        """
+        conditions, params = list(conditions), list(params)
+        if after is not None:
+            if len(after) != len(order):
+                raise ValueError('Некорректный курсор страницы')
+            condition, values = keyset_condition(order, after)
+            conditions.append(condition)
+            params.extend(values)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ' + ', '.join(f'{expr} {direction}' for expr, _, direction in order)
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        cursor.execute(sql, params)
+        return cursor if stream else cursor.fetchall()
+
+    def _iter_rows(self, query, batch_size=1000, **filters):
+        """Потоковое чтение: строки query(cursor, stream=True, **filters) пачками fetchmany
+
+        Соединение чтения занято, пока генератор не дочитан или не закрыт;
+        выборка идет по одному снимку БД, в памяти - не больше batch_size строк.
+        """
+        with self._read() as conn:
+            cursor = query(conn.cursor(), stream=True, **filters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+
+    def _invalidate_caches(self):
+        """Сброс кэшей после фиксации изменений"""
+        with self._stats_lock:
+            self._data_version += 1
+            self._stats_cache = None
+
+    # ========== КЛИЕНТЫ ==========
+
+    @write_method
+    def add_client(self, full_name, phone, car_model='', car_number='', car_year=None, vin='', notes=''):
+        """Добавление нового клиента"""
+        try:
+            if car_year:
+                try:
+                    car_year = int(car_year)
+                except:
+                    car_year = None
+
+            with self._write() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                               INSERT INTO clients (full_name, phone, car_model, car_number, car_year, vin, notes,
+                                                    phone_digits, car_number_norm)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                               ''', (full_name, phone, car_model, car_number, car_year, vin, notes,
+                                     normalize_phone(phone), normalize_plate(car_number)))
+                self._emit('client', 'created', cursor.lastrowid)
+                return cursor.lastrowid
+
+        except sqlite3.IntegrityError as e:
+            if 'UNIQUE constraint failed' in str(e):
+                raise ValueError(f"Клиент с телефоном {phone} уже существует")
+            raise
+
+    @write_method
+    def import_clients(self, rows):
+        """Загрузка пачки клиентов (строки clean_client_row) одной транзакцией
+
+        Клиент с тем же телефоном (сравниваются нормализованные номера, в том
+        числе внутри пачки) обновляется: ФИО заменяется, остальные поля -
+        только непустыми значениями. Возвращает {'inserted': n, 'updated': n}.
+        """
+        if not rows:
+            return {'inserted': 0, 'updated': 0}
+
+        with self._write() as conn:
+            cursor = conn.cursor()
+            # Телефон существующего клиента в его записи - ключ ON CONFLICT(phone)
+            known = {}
+            digits = list({row['phone_digits'] for row in rows})
+            for start in range(0, len(digits), 500):
+                part = digits[start:start + 500]
+                cursor.execute(f'''
+                               SELECT phone_digits, phone
+                               FROM clients
+                               WHERE phone_digits IN ({', '.join('?' * len(part))})
+                               ORDER BY id DESC
+                               ''', part)
+                known.update((row['phone_digits'], row['phone']) for row in cursor.fetchall())
+
+            inserted = 0
+            params = []
+            for row in rows:
+                phone = known.get(row['phone_digits'])
+                if phone is None:
+                    phone = known[row['phone_digits']] = row['phone']
+                    inserted += 1
+                params.append((row['full_name'], phone, row['car_model'], row['car_number'], row['car_year'],
+                               row['vin'], row['notes'], row['phone_digits'], row['car_number_norm']))
+
+            cursor.executemany('''
+                               INSERT INTO clients (full_name, phone, car_model, car_number, car_year, vin, notes,
+                                                    phone_digits, car_number_norm)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                               ON CONFLICT(phone) DO UPDATE
+                                   SET full_name       = excluded.full_name,
+                                       car_model       = COALESCE(NULLIF(excluded.car_model, ''), car_model),
+                                       car_number      = COALESCE(NULLIF(excluded.car_number, ''), car_number),
+                                       car_number_norm = COALESCE(NULLIF(excluded.car_number_norm, ''),
+                                                                  car_number_norm),
+                                       car_year        = COALESCE(excluded.car_year, car_year),
+                                       vin             = COALESCE(NULLIF(excluded.vin, ''), vin),
+                                       notes           = COALESCE(NULLIF(excluded.notes, ''), notes)
+                               ''', params)
+            result = {'inserted': inserted, 'updated': len(rows) - inserted}
+            self._emit('client', 'updated', None, **result)
+            return result
+
+    _CLIENTS_ORDER = [('c.created_at', 'created_at', 'DESC'), ('c.id', 'id', 'DESC')]
+
+    def get_clients(self, search_term=None):
+        """Получение всех клиентов с возможностью поиска
+
+        Телефон и госномер ищутся по нормализованным индексам, остальное -
+        по FTS-индексу с ранжированием (bm25), для коротких запросов или без
+        FTS5 - через LIKE.
+        """
+        with self._read() as conn:
+            return self._query_clients(conn.cursor(), search_term)[0]
+
+    def get_clients_page(self, search_term=None, limit=50, after=None):
+        """Страница клиентов: {'items': [...], 'next_cursor': курсор или None}
+
+        after - курсор из предыдущей страницы.
+        """
+        with self._read() as conn:
+            rows, order = self._query_clients(conn.cursor(), search_term, limit + 1, decode_cursor(after))
+        return make_page(rows, order, limit)
+
+    def _query_clients(self, cursor, search_term=None, limit=None, after=None):
+        """Выборка клиентов для get_clients/get_clients_page: (строки, порядок)"""
+        client_ids = self._find_client_ids(cursor, search_term) if search_term else None
+        fts_query = self._fts_query(search_term) if search_term else None
+        if client_ids:
+            order = self._CLIENTS_ORDER
+            sql = 'SELECT c.* FROM clients c'
+            conditions = [f"c.id IN ({', '.join('?' * len(client_ids))})"]
+            params = client_ids
+        elif fts_query:
+            order = [('clients_fts.rank', 'search_rank', 'ASC')] + self._CLIENTS_ORDER
+            sql = '''
+                  SELECT c.*, clients_fts.rank as search_rank
+                  FROM clients_fts
+                           JOIN clients c ON c.id = clients_fts.rowid
+                  '''
+            conditions = ['clients_fts MATCH ?']
+            params = [fts_query]
+        elif search_term:
+            search_pattern = f'%{search_term}%'
+            order = self._CLIENTS_ORDER
+            sql = 'SELECT c.* FROM clients c'
+            conditions = ['''(c.full_name LIKE ?
+                              OR c.phone LIKE ?
+                              OR c.car_model LIKE ?
+                              OR c.car_number LIKE ?)''']
+            params = [search_pattern] * 4
+        else:
+            order = self._CLIENTS_ORDER
+            sql = 'SELECT c.* FROM clients c'
+            conditions, params = [], []
+        return self._keyset_select(cursor, sql, conditions, params, order, limit, after), order
+
+    def _find_client_ids(self, cursor, search_term):
+        """ID клиентов по телефону или госномеру через нормализованные индексы
+
+        Возвращает None, если запрос не похож ни на телефон, ни на госномер.
+        Совпадение по префиксу: '916123' найдет +7 (916) 123-45-67.
+        """
+        if looks_like_phone(search_term):
+            column, value = 'phone_digits', normalize_phone(search_term)
+        elif looks_like_plate(search_term):
+            column, value = 'car_number_norm', normalize_plate(search_term)
+        else:
+            return None
+
+        cursor.execute(f'SELECT id FROM clients WHERE {column} >= ? AND {column} < ?', prefix_range(value))
+        return [row[0] for row in cursor.fetchall()]
+
+    def find_clients_by_phone(self, phone, prefix=False):
+        """Поиск клиентов по телефону в любом формате (точно или по префиксу)"""
+        digits = normalize_phone(phone)
+        if not digits:
+            return []
+        with self._read() as conn:
+            cursor = conn.cursor()
+            if prefix:
+                cursor.execute('SELECT * FROM clients WHERE phone_digits >= ? AND phone_digits < ?',
+                               prefix_range(digits))
+            else:
+                cursor.execute('SELECT * FROM clients WHERE phone_digits = ?', (digits,))
+            return cursor.fetchall()
+
+    def find_clients_by_plate(self, car_number, prefix=False):
+        """Поиск клиентов по госномеру латиницей или кириллицей (точно или по префиксу)"""
+        plate = normalize_plate(car_number)
+        if not plate:
+            return []
+        with self._read() as conn:
+            cursor = conn.cursor()
+            if prefix:
+                cursor.execute('SELECT * FROM clients WHERE car_number_norm >= ? AND car_number_norm < ?',
+                               prefix_range(plate))
+            else:
+                cursor.execute('SELECT * FROM clients WHERE car_number_norm = ?', (plate,))
+            return cursor.fetchall()
+
+    def get_client(self, client_id):
+        """Получение клиента по ID"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM clients WHERE id = ?', (client_id,))
+            return cursor.fetchone()
+
+    @write_method
+    def update_client(self, client_id, **kwargs):
+        """Обновление данных клиента"""
+        if not kwargs:
+            return False
+
+        # Нормализованные поля пересчитываются вместе с исходными
+        kwargs.pop('phone_digits', None)
+        kwargs.pop('car_number_norm', None)
+        if 'phone' in kwargs:
+            kwargs['phone_digits'] = normalize_phone(kwargs['phone'])
+        if 'car_number' in kwargs:
+            kwargs['car_number_norm'] = normalize_plate(kwargs['car_number'])
+
+        set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
+        values = list(kwargs.values())
+        values.append(client_id)
+
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'UPDATE clients SET {set_clause} WHERE id = ?', values)
+            if cursor.rowcount == 0:
+                return False
+            self._emit('client', 'updated', client_id)
+            return True
+
+    @write_method
+    def delete_client(self, client_id):
+        """Удаление клиента"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM clients WHERE id = ?', (client_id,))
+            if cursor.rowcount == 0:
+                return False
+            self._emit('client', 'deleted', client_id)
+            return True
+
+    # ========== РАБОТНИКИ ==========
+
+    @write_method
+    def add_employee(self, full_name, position, phone='', commission_rate=15.0, hire_date=None, is_active=True,
+                     notes=''):
+        """Добавление нового работника"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           INSERT INTO employees (full_name, position, phone, commission_rate, hire_date, is_active,
+                                                  notes)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)
+                           ''', (full_name, position, phone, commission_rate, hire_date, is_active, notes))
+            return cursor.lastrowid
+
+    def get_employees(self):
+        """Получение всех работников"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM employees ORDER BY full_name')
+            return cursor.fetchall()
+
+    def get_active_employees(self):
+        """Получение активных работников"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM employees WHERE is_active = TRUE ORDER BY full_name')
+            return cursor.fetchall()
+
+    def get_employee(self, employee_id):
+        """Получение работника по ID"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM employees WHERE id = ?', (employee_id,))
+            return cursor.fetchone()
+
+    # Суммы начислений и выплат, пересчитанные по всей истории
+    _SALARY_TOTALS_SQL = '''
+                         SELECT e.id                                               as employee_id,
+                                ROUND(COALESCE(s.earned_amount, 0), 2)             as earned_amount,
+                                ROUND(COALESCE(p.paid_amount, 0), 2)               as paid_amount,
+                                ROUND(COALESCE(s.earned_amount, 0) - COALESCE(p.paid_amount, 0), 2)
+                                                                                   as pending_amount
+                         FROM employees e
+                                  LEFT JOIN (SELECT employee_id, SUM(amount) as earned_amount
+                                             FROM employee_salary
+                                             GROUP BY employee_id) s ON s.employee_id = e.id
+                                  LEFT JOIN (SELECT employee_id, SUM(amount) as paid_amount
+                                             FROM salary_payments
+                                             GROUP BY employee_id) p ON p.employee_id = e.id
+                         '''
+
+    def _fill_employee_balances(self, cursor):
+        """Заполнение employee_balances из полной истории начислений и выплат"""
+        cursor.execute('DELETE FROM employee_balances')
+        cursor.execute(f'''
+                       INSERT INTO employee_balances (employee_id, earned_amount, paid_amount, pending_amount)
+                       {self._SALARY_TOTALS_SQL}
+                       ''')
+        return cursor.rowcount
+
+    @write_method
+    def rebuild_employee_balances(self):
+        """Пересборка балансов зарплаты с нуля; возвращает число работников"""
+        with self._write() as conn:
+            return self._fill_employee_balances(conn.cursor())
+
+    def verify_employee_balances(self):
+        """Сверка балансов с историей
+
+        Возвращает список расхождений: словари с employee_id и парами
+        (ожидаемое, фактическое) значений. Пустой список - балансы верны.
+        """
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                           SELECT t.employee_id,
+                                  t.earned_amount,
+                                  t.paid_amount,
+                                  t.pending_amount,
+                                  COALESCE(b.earned_amount, 0)  as actual_earned,
+                                  COALESCE(b.paid_amount, 0)    as actual_paid,
+                                  COALESCE(b.pending_amount, 0) as actual_pending
+                           FROM ({self._SALARY_TOTALS_SQL}) t
+                                    LEFT JOIN employee_balances b ON b.employee_id = t.employee_id
+                           WHERE ABS(t.earned_amount - COALESCE(b.earned_amount, 0)) > 0.005
+                              OR ABS(t.paid_amount - COALESCE(b.paid_amount, 0)) > 0.005
+                              OR ABS(t.pending_amount - COALESCE(b.pending_amount, 0)) > 0.005
+                           ''')
+            return [{
+                'employee_id': row['employee_id'],
+                'earned_amount': (row['earned_amount'], row['actual_earned']),
+                'paid_amount': (row['paid_amount'], row['actual_paid']),
+                'pending_amount': (row['pending_amount'], row['actual_pending'])
+            } for row in cursor.fetchall()]
+
+    def _query_employees_with_salary(self, cursor, employee_id=None):
+        """Работники с начисленной, выплаченной и ожидающей выплаты зарплатой
+
+        Суммы берутся из employee_balances, поэтому запрос один и его
+        стоимость не зависит ни от числа работников, ни от длины истории.
+        Триггеры копят суммы без округления, округляем при чтении.
+        """
+        query = '''
+                SELECT e.*,
+                       ROUND(COALESCE(b.earned_amount, 0), 2)  as earned_amount,
+                       ROUND(COALESCE(b.paid_amount, 0), 2)    as paid_amount,
+                       ROUND(COALESCE(b.pending_amount, 0), 2) as pending_amount
+                FROM employees e
+                         LEFT JOIN employee_balances b ON b.employee_id = e.id
+                '''
+        if employee_id is not None:
+            cursor.execute(query + ' WHERE e.id = ?', (employee_id,))
+        else:
+            cursor.execute(query + ' ORDER BY e.full_name')
+        return [dict(row) for row in cursor.fetchall()]
+
+    def get_employee_with_salary(self, employee_id):
+        """Получение работника с информацией о зарплате"""
+        with self._read() as conn:
+            employees = self._query_employees_with_salary(conn.cursor(), employee_id)
+            return employees[0] if employees else None
+
+    def get_employees_with_salary(self):
+        """Получение всех работников с информацией о зарплате"""
+        with self._read() as conn:
+            return self._query_employees_with_salary(conn.cursor())
+
+    @write_method
+    def update_employee(self, employee_id, **kwargs):
+        """Обновление данных работника"""
+        if not kwargs:
+            return False
+
+        # Добавляем updated_at
+        kwargs['updated_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
+        values = list(kwargs.values())
+        values.append(employee_id)
+
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'UPDATE employees SET {set_clause} WHERE id = ?', values)
+            return cursor.rowcount > 0
+
+    @write_method
+    def update_employee_status(self, employee_id, is_active):
+        """Обновление статуса работника"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           UPDATE employees
+                           SET is_active  = ?,
+                               updated_at = CURRENT_TIMESTAMP
+                           WHERE id = ?
+                           ''', (is_active, employee_id))
+            return cursor.rowcount > 0
+
+    @write_method
+    def add_employee_salary(self, employee_id, order_id, amount, commission_rate, works_total):
+        """Добавление начисления зарплаты"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           INSERT INTO employee_salary (employee_id, order_id, amount, commission_rate, works_total)
+                           VALUES (?, ?, ?, ?, ?)
+                           ''', (employee_id, order_id, amount, commission_rate, works_total))
+            return cursor.lastrowid
+
+    @write_method
+    def add_salary_payment(self, employee_id, amount, description=''):
+        """Добавление выплаты зарплаты"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           INSERT INTO salary_payments (employee_id, amount, description)
+                           VALUES (?, ?, ?)
+                           ''', (employee_id, amount, description))
+            return cursor.lastrowid
+
+    @write_method
+    def pay_employee_salary(self, employee_id, amount, description=None):
+        """Выплата зарплаты: проверка задолженности, выплата и расход в кассе одной транзакцией
+
+        Задолженность читается из employee_balances (O(1)). Возвращает
+        словарь с суммой и остатком, None если работник не найден;
+        ValueError, если сумма превышает задолженность.
+        """
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT e.full_name, ROUND(COALESCE(b.pending_amount, 0), 2) as pending_amount
+                           FROM employees e
+                                    LEFT JOIN employee_balances b ON b.employee_id = e.id
+                           WHERE e.id = ?
+                           ''', (employee_id,))
+            employee = cursor.fetchone()
+            if not employee:
+                return None
+
+            pending = employee['pending_amount']
+            if amount > pending:
+                raise ValueError(f'Сумма превышает задолженность ({pending:.2f} ₽)')
+
+            payment_id = self.add_salary_payment(
+                employee_id=employee_id,
+                amount=amount,
+                description=description or f'Выплата зарплаты {employee["full_name"]}'
+            )
+
+            # Операция в кассе как расход
+            self.add_cash_flow(
+                transaction_type='expense',
+                category='salary',
+                amount=amount,
+                description=f'Выплата зарплаты работнику {employee["full_name"]}'
+            )
+
+            return {
+                'payment_id': payment_id,
+                'amount': amount,
+                'pending': round(pending - amount, 2)
+            }
+
+    _PAYROLL_ORDER = [('date', 'date', 'ASC'), ('entry_type', 'entry_type', 'ASC'), ('id', 'id', 'ASC')]
+
+    # Начисления (по завершенным заказам) и выплаты зарплаты одной лентой
+    _PAYROLL_SELECT = '''
+                      SELECT *
+                      FROM (SELECT 'accrual'          as entry_type,
+                                   s.id,
+                                   s.created_at       as date,
+                                   s.employee_id,
+                                   e.full_name        as employee_name,
+                                   e.position,
+                                   wo.order_number,
+                                   s.works_total,
+                                   s.commission_rate,
+                                   s.amount,
+                                   NULL               as description
+                            FROM employee_salary s
+                                     JOIN employees e ON e.id = s.employee_id
+                                     LEFT JOIN work_orders wo ON wo.id = s.order_id
+                            UNION ALL
+                            SELECT 'payment',
+                                   p.id,
+                                   p.payment_date,
+                                   p.employee_id,
+                                   e.full_name,
+                                   e.position,
+                                   NULL,
+                                   NULL,
+                                   NULL,
+                                   p.amount,
+                                   p.description
+                            FROM salary_payments p
+                                     JOIN employees e ON e.id = p.employee_id)
+                      '''
+
+    def iter_payroll(self, start_date=None, end_date=None, employee_id=None, batch_size=1000):
+        """Потоковое чтение начислений и выплат зарплаты за период для выгрузки"""
+        return self._iter_rows(self._query_payroll, batch_size, start_date=start_date, end_date=end_date,
+                               employee_id=employee_id)
+
+    def _query_payroll(self, cursor, start_date=None, end_date=None, employee_id=None, limit=None, after=None,
+                       stream=False):
+        """Выборка начислений и выплат зарплаты по дате"""
+        conditions, params = [], []
+        if start_date:
+            conditions.append('date >= ?')
+            params.append(start_date[:10])
+        if end_date:
+            conditions.append('date < ?')
+            params.append(day_after(end_date))
+        if employee_id is not None:
+            conditions.append('employee_id = ?')
+            params.append(employee_id)
+        return self._keyset_select(cursor, self._PAYROLL_SELECT, conditions, params, self._PAYROLL_ORDER,
+                                   limit, after, stream)
+
+    # ========== ЗАКАЗ-НАРЯДЫ ==========
+
+    @write_method
+    def add_work_order(self, client_id, description, order_number=None, total_amount=0, employee_id=None):
+        """Добавление нового заказ-наряда
+
+        Без order_number номер выдается из order_sequences в той же транзакции.
+        """
+        with self._write() as conn:
+            cursor = conn.cursor()
+            if not order_number:
+                order_number = self._next_order_number(cursor)
+            else:
+                self._sync_order_sequence(cursor, order_number)
+
+            # Сразу ставим статус "в работе" вместо "новый"
+            cursor.execute('''
+                           INSERT INTO work_orders (client_id, employee_id, order_number, description,
+                                                    total_amount, status)
+                           VALUES (?, ?, ?, ?, ?, ?)
+                           ''', (client_id, employee_id, order_number, description, total_amount, 'in_progress'))
+            self._emit('order', 'created', cursor.lastrowid, status='in_progress')
+            return cursor.lastrowid
+
+    def _next_order_number(self, cursor, day=None):
+        """Следующий номер YYMMDD-NNN: атомарное увеличение счетчика дня"""
+        day = day or datetime.now().strftime('%y%m%d')
+        cursor.execute('''
+                       INSERT INTO order_sequences (day, last_value)
+                       VALUES (?, 1)
+                       ON CONFLICT(day) DO UPDATE SET last_value = last_value + 1
+                       RETURNING last_value
+                       ''', (day,))
+        return f"{day}-{cursor.fetchone()[0]:03d}"
+
+    def _sync_order_sequence(self, cursor, order_number):
+        """Сдвиг счетчика дня, если номер YYMMDD-NNN задан вручную"""
+        match = ORDER_NUMBER_RE.match(order_number)
+        if match:
+            cursor.execute('''
+                           INSERT INTO order_sequences (day, last_value)
+                           VALUES (?, ?)
+                           ON CONFLICT(day) DO UPDATE SET last_value = MAX(last_value, excluded.last_value)
+                           ''', (match.group(1), int(match.group(2))))
+
+    @write_method
+    def reserve_order_number(self, day=None):
+        """Резервирование номера заказа (O(1))
+
+        Резерв фиксируется сразу: если номер не будет использован, в
+        нумерации останется пропуск. Для номера без пропусков создавайте
+        заказ без order_number - номер выдается внутри транзакции создания.
+        """
+        with self._write() as conn:
+            return self._next_order_number(conn.cursor(), day)
+
+    def peek_order_number(self, day=None):
+        """Следующий номер заказа без резервирования (для предпросмотра)"""
+        day = day or datetime.now().strftime('%y%m%d')
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT last_value FROM order_sequences WHERE day = ?', (day,))
+            result = cursor.fetchone()
+            return f"{day}-{(result[0] if result else 0) + 1:03d}"
+
+    def get_last_order_number(self, date_prefix):
+        """Получение последнего выданного номера заказа за день YYMMDD"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT last_value FROM order_sequences WHERE day = ?', (date_prefix,))
+            result = cursor.fetchone()
+            return f"{date_prefix}-{result[0]:03d}" if result else None
+
+    @write_method
+    def update_work_order(self, order_id, **kwargs):
+        """Обновление заказ-наряда"""
+        if not kwargs:
+            return False
+
+        set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
+        values = list(kwargs.values())
+        values.append(order_id)
+
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'UPDATE work_orders SET {set_clause} WHERE id = ?', values)
+            if cursor.rowcount == 0:
+                return False
+            self._emit('order', 'updated', order_id)
+            return True
+
+    @write_method
+    def add_order_work(self, order_id, work_name, quantity=1, price_per_unit=0):
+        """Добавление работы в заказ-наряд"""
+        total_price = round(quantity * price_per_unit, 2)
+
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           INSERT INTO order_works (order_id, work_name, quantity, price_per_unit, total_price)
+                           VALUES (?, ?, ?, ?, ?)
+                           ''', (order_id, work_name, quantity, price_per_unit, total_price))
+            return cursor.lastrowid
+
+    @write_method
+    def add_order_expense(self, order_id, expense_name, expense_type='material', quantity=1, cost_per_unit=0, markup=0):
+        """Добавление расхода в заказ-наряд с наценкой"""
+        item_cost = quantity * cost_per_unit
+        total_cost = round(item_cost * (1 + markup / 100), 2)  # Цена с наценкой для клиента
+
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           INSERT INTO order_expenses (order_id, expense_name, expense_type, quantity,
+                                                       cost_per_unit, markup, total_cost)
+                           VALUES (?, ?, ?, ?, ?, ?, ?)
+                           ''', (order_id, expense_name, expense_type, quantity, cost_per_unit, markup, total_cost))
+            return cursor.lastrowid
+
+    @staticmethod
+    def calculate_order_totals(works=(), expenses=()):
+        """Расчет сумм заказ-наряда
+
+        works - список словарей {'name', 'quantity', 'price'},
+        expenses - список словарей {'name', 'type', 'quantity', 'cost', 'markup'}
+        (тот же формат, что приходит от API).
+        """
+        works_total = 0
+        expenses_price = 0
+        markup_total = 0
+
+        # Работы
+        for work in works:
+            works_total += work.get('quantity', 1) * work.get('price', 0)
+
+        # Запчасти и расходники с наценкой
+        for expense in expenses:
+            quantity = expense.get('quantity', 1)
+            cost = expense.get('cost', 0)
+            markup = expense.get('markup', 0)
+
+            if cost > 0:
+                item_cost = quantity * cost
+                item_price = item_cost * (1 + markup / 100)
+                expenses_price += item_price
+                markup_total += item_price - item_cost
+
+        # Округляем
+        works_total = round(works_total, 2)
+        expenses_price = round(expenses_price, 2)
+        markup_total = round(markup_total, 2)
+
+        return {
+            'works_total': works_total,
+            'expenses_price': expenses_price,
+            'markup_total': markup_total,
+            'total_amount': works_total + expenses_price
+        }
+
+    def _insert_order_lines(self, cursor, order_id, works, expenses):
+        """Пакетная вставка работ и запчастей заказ-наряда (внутри транзакции записи)"""
+        work_rows = []
+        for work in works:
+            quantity = work.get('quantity', 1)
+            price = work.get('price', 0)
+            work_rows.append((order_id, work['name'], quantity, price, round(quantity * price, 2)))
+
+        expense_rows = []
+        for expense in expenses:
+            quantity = expense.get('quantity', 1)
+            cost = expense.get('cost', 0)
+            markup = expense.get('markup', 0)
+            total_cost = round(quantity * cost * (1 + markup / 100), 2)  # Цена с наценкой для клиента
+            expense_rows.append((order_id, expense['name'], expense.get('type', 'material'), quantity,
+                                 cost, markup, total_cost))
+
+        if work_rows:
+            cursor.executemany('''
+                               INSERT INTO order_works (order_id, work_name, quantity, price_per_unit, total_price)
+                               VALUES (?, ?, ?, ?, ?)
+                               ''', work_rows)
+
+        if expense_rows:
+            cursor.executemany('''
+                               INSERT INTO order_expenses (order_id, expense_name, expense_type, quantity,
+                                                           cost_per_unit, markup, total_cost)
+                               VALUES (?, ?, ?, ?, ?, ?, ?)
+                               ''', expense_rows)
+
+    @write_method
+    def create_work_order_with_lines(self, client_id, description, works=(), expenses=(), order_number=None,
+                                     employee_id=None):
+        """Создание заказ-наряда вместе с работами и запчастями одной транзакцией
+
+        Возвращает полный заказ (см. get_work_order_full) и рассчитанные суммы.
+        """
+        totals = self.calculate_order_totals(works, expenses)
+
+        with self._write() as conn:
+            order_id = self.add_work_order(
+                client_id=client_id,
+                description=description,
+                order_number=order_number,
+                total_amount=totals['total_amount'],
+                employee_id=employee_id
+            )
+            self._insert_order_lines(conn.cursor(), order_id, works, expenses)
+
+            result = self.get_work_order_full(order_id)
+            result.update(totals)
+            return result
+
+    @write_method
+    def update_work_order_with_lines(self, order_id, client_id, description, works=(), expenses=(),
+                                     employee_id=None):
+        """Замена шапки, работ и запчастей заказ-наряда одной транзакцией
+
+        Завершенный заказ не изменяется. Возвращает полный заказ и суммы
+        или None, если незавершенный заказ не найден.
+        """
+        totals = self.calculate_order_totals(works, expenses)
+
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           UPDATE work_orders
+                           SET client_id    = ?,
+                               description  = ?,
+                               total_amount = ?,
+                               employee_id  = ?
+                           WHERE id = ?
+                             AND status != 'completed'
+                           ''', (client_id, description, totals['total_amount'], employee_id, order_id))
+            if cursor.rowcount == 0:
+                return None
+
+            cursor.execute('DELETE FROM order_works WHERE order_id = ?', (order_id,))
+            cursor.execute('DELETE FROM order_expenses WHERE order_id = ?', (order_id,))
+            self._insert_order_lines(cursor, order_id, works, expenses)
+            self._emit('order', 'updated', order_id)
+
+            result = self.get_work_order_full(order_id)
+            result.update(totals)
+            return result
+
+    def get_work_order_full(self, order_id):
+        """Заказ-наряд вместе с работами и запчастями в виде словарей"""
+        with self._read():
+            order = self.get_work_order(order_id)
+            if not order:
+                return None
+            return {
+                'order': dict(order),
+                'works': [dict(w) for w in self.get_order_works(order_id)],
+                'expenses': [dict(e) for e in self.get_order_expenses(order_id)]
+            }
+
+    _WORK_ORDERS_ORDER = [('wo.created_at', 'created_at', 'DESC'), ('wo.id', 'id', 'DESC')]
+
+    _WORK_ORDERS_SELECT = '''
+                          SELECT wo.*,
+                                 c.full_name,
+                                 c.phone,
+                                 c.car_model,
+                                 c.car_number,
+                                 e.full_name as employee_name
+                          FROM work_orders wo
+                                   JOIN clients c ON wo.client_id = c.id
+                                   LEFT JOIN employees e ON wo.employee_id = e.id
+                          '''
+
+    def get_work_orders(self, search_term=None, client_id=None):
+        """Получение всех заказ-нарядов
+
+        client_id - заказы одного клиента (история клиента). Поиск: телефон
+        и госномер - по нормализованным индексам клиентов, иначе по номеру и
+        описанию заказа и данным клиента через FTS-индексы с ранжированием;
+        для коротких запросов - через LIKE.
+        """
+        with self._read() as conn:
+            return self._query_work_orders(conn.cursor(), search_term, client_id)[0]
+
+    def get_work_orders_page(self, search_term=None, client_id=None, limit=50, after=None):
+        """Страница заказ-нарядов: {'items': [...], 'next_cursor': курсор или None}"""
+        with self._read() as conn:
+            rows, order = self._query_work_orders(conn.cursor(), search_term, client_id,
+                                                  limit + 1, decode_cursor(after))
+        return make_page(rows, order, limit)
+
+    def iter_work_orders(self, search_term=None, client_id=None, start_date=None, end_date=None, batch_size=1000):
+        """Потоковое чтение заказ-нарядов для выгрузки (фильтры get_work_orders и период создания)"""
+        return self._iter_rows(lambda cursor, **filters: self._query_work_orders(cursor, **filters)[0], batch_size,
+                               search_term=search_term, client_id=client_id,
+                               start_date=start_date, end_date=end_date)
+
+    def _query_work_orders(self, cursor, search_term=None, client_id=None, limit=None, after=None,
+                           start_date=None, end_date=None, stream=False):
+        """Выборка заказ-нарядов для get_work_orders/get_work_orders_page/iter_work_orders: (строки, порядок)"""
+        client_ids = self._find_client_ids(cursor, search_term) if search_term else None
+        fts_query = self._fts_query(search_term) if search_term else None
+        if client_id is not None or client_ids:
+            client_ids = [client_id] if client_id is not None else client_ids
+            order = self._WORK_ORDERS_ORDER
+            sql = self._WORK_ORDERS_SELECT
+            conditions = [f"wo.client_id IN ({', '.join('?' * len(client_ids))})"]
+            params = client_ids
+        elif fts_query:
+            order = [('m.rank', 'search_rank', 'ASC')] + self._WORK_ORDERS_ORDER
+            sql = '''
+                  WITH matched AS (SELECT rowid as id, rank
+                                   FROM work_orders_fts
+                                   WHERE work_orders_fts MATCH ?
+                                   UNION ALL
+                                   SELECT o.id, clients_fts.rank
+                                   FROM clients_fts
+                                            JOIN work_orders o ON o.client_id = clients_fts.rowid
+                                   WHERE clients_fts MATCH ?)
+                  SELECT wo.*,
+                         c.full_name,
+                         c.phone,
+                         c.car_model,
+                         c.car_number,
+                         e.full_name as employee_name,
+                         m.rank as search_rank
+                  FROM (SELECT id, MIN(rank) as rank FROM matched GROUP BY id) m
+                           JOIN work_orders wo ON wo.id = m.id
+                           JOIN clients c ON wo.client_id = c.id
+                           LEFT JOIN employees e ON wo.employee_id = e.id
+                  '''
+            conditions = []
+            params = [fts_query, fts_query]
+        elif search_term:
+            search_pattern = f'%{search_term}%'
+            order = self._WORK_ORDERS_ORDER
+            sql = self._WORK_ORDERS_SELECT
+            conditions = ['''(wo.order_number LIKE ?
+                              OR c.full_name LIKE ?
+                              OR c.phone LIKE ?)''']
+            params = [search_pattern] * 3
+        else:
+            order = self._WORK_ORDERS_ORDER
+            sql = self._WORK_ORDERS_SELECT
+            conditions, params = [], []
+        conditions, params = list(conditions), list(params)
+        if start_date:
+            conditions.append('wo.created_at >= ?')
+            params.append(start_date[:10])
+        if end_date:
+            conditions.append('wo.created_at < ?')
+            params.append(day_after(end_date))
+        return self._keyset_select(cursor, sql, conditions, params, order, limit, after, stream), order
+
+    def get_work_order_list_item(self, order_id):
+        """Заказ-наряд с полями строки списка (клиент, исполнитель), как в get_work_orders_page"""
+        with self._read() as conn:
+            rows = self._keyset_select(conn.cursor(), self._WORK_ORDERS_SELECT, ['wo.id = ?'], [order_id],
+                                       self._WORK_ORDERS_ORDER, limit=1)
+            return rows[0] if rows else None
+
+    def get_work_order(self, order_id):
+        """Получение заказ-наряда по ID"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT wo.*,
+                                  c.full_name,
+                                  c.phone,
+                                  c.car_model,
+                                  c.car_number,
+                                  c.car_year,
+                                  c.vin,
+                                  e.full_name as employee_name,
+                                  e.commission_rate
+                           FROM work_orders wo
+                                    JOIN clients c ON wo.client_id = c.id
+                                    LEFT JOIN employees e ON wo.employee_id = e.id
+                           WHERE wo.id = ?
+                           ''', (order_id,))
+            return cursor.fetchone()
+
+    def get_order_works(self, order_id):
+        """Получение работ заказ-наряда"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM order_works WHERE order_id = ? ORDER BY id', (order_id,))
+            return cursor.fetchall()
+
+    def get_order_expenses(self, order_id):
+        """Получение расходов заказ-наряда"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM order_expenses WHERE order_id = ? ORDER BY id', (order_id,))
+            return cursor.fetchall()
+
+    @write_method
+    def delete_order_works(self, order_id):
+        """Удаление всех работ заказ-наряда"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM order_works WHERE order_id = ?', (order_id,))
+            return cursor.rowcount > 0
+
+    @write_method
+    def delete_order_expenses(self, order_id):
+        """Удаление всех расходов заказ-наряда"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM order_expenses WHERE order_id = ?', (order_id,))
+            return cursor.rowcount > 0
+
+    @write_method
+    def update_work_order_status(self, order_id, status):
+        """Обновление статуса заказ-наряда"""
+        try:
+            with self._write() as conn:
+                cursor = conn.cursor()
+                if status == 'completed':
+                    cursor.execute('''
+                                   UPDATE work_orders
+                                   SET status       = ?,
+                                       completed_at = CURRENT_TIMESTAMP
+                                   WHERE id = ?
+                                   ''', (status, order_id))
+                else:
+                    cursor.execute('''
+                                   UPDATE work_orders
+                                   SET status       = ?,
+                                       completed_at = NULL
+                                   WHERE id = ?
+                                   ''', (status, order_id))
+                if cursor.rowcount == 0:
+                    return False
+                self._emit('order', 'updated', order_id, status=status)
+                return True
+        except Exception as e:
+            print(f"Ошибка при обновлении статуса заказа {order_id}: {e}")
+            return False
+
+    @write_method
+    def complete_work_order(self, order_id):
+        """Завершение заказ-наряда одной транзакцией
+
+        Смена статуса, расчет сумм, проводки в кассу (работы и наценка) и
+        начисление зарплаты работнику фиксируются вместе. Проводок по заказу
+        не больше одной на категорию и одного начисления (уникальные индексы
+        по (order_id, category) в кассе и по order_id в начислениях): при
+        повторном вызове они приводятся к текущим суммам - заказ могли
+        вернуть в работу и изменить строки. Возвращаются записанные суммы;
+        already_completed - заказ уже был завершен и ничего не изменилось.
+
+        Возвращает словарь с суммами или None, если заказ не найден.
+        ValueError - уникальные индексы проводок не созданы из-за повторов
+        в старой базе (см. _create_posting_indexes).
+        """
+        try:
+            return self._complete_work_order(order_id)
+        except sqlite3.OperationalError as e:
+            if 'ON CONFLICT clause does not match' in str(e):
+                raise ValueError("В базе есть повторные проводки по заказам, завершение недоступно: "
+                                 "python maintenance.py verify-postings")
+            raise
+
+    def _complete_work_order(self, order_id):
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           SELECT wo.order_number, wo.employee_id, e.commission_rate
+                           FROM work_orders wo
+                                    LEFT JOIN employees e ON wo.employee_id = e.id
+                           WHERE wo.id = ?
+                           ''', (order_id,))
+            order = cursor.fetchone()
+            if not order:
+                return None
+
+            # Суммы по работам и наценке на запчасти
+            cursor.execute('''
+                           SELECT (SELECT COALESCE(SUM(quantity * price_per_unit), 0)
+                                   FROM order_works
+                                   WHERE order_id = ?),
+                                  (SELECT COALESCE(SUM(quantity * cost_per_unit * COALESCE(markup, 0) / 100.0), 0)
+                                   FROM order_expenses
+                                   WHERE order_id = ?
+                                     AND cost_per_unit > 0)
+                           ''', (order_id, order_id))
+            works_total, markup_total = cursor.fetchone()
+            works_total = round(works_total, 2)
+            markup_total = round(markup_total, 2)
+
+            cursor.execute('''
+                           SELECT id, category
+                           FROM cash_flow
+                           WHERE order_id = ?
+                             AND category IN ('order_work', 'order_markup')
+                           ''', (order_id,))
+            existing = {row['category']: row['id'] for row in cursor.fetchall()}
+
+            postings = [('order_work', works_total, f'Доход от работ по заказу {order["order_number"]}'),
+                        ('order_markup', markup_total, f'Наценка на запчасти по заказу {order["order_number"]}')]
+            # По одной вставке на проводку (их не больше двух), чтобы получить id для событий;
+            # RETURNING возвращает строку, только если проводка добавлена или ее сумма изменилась
+            changed = False
+            for category, amount, description in postings:
+                if amount <= 0 and category not in existing:
+                    continue
+                cursor.execute('''
+                               INSERT INTO cash_flow (transaction_type, category, amount, description, order_id)
+                               VALUES ('income', ?, ?, ?, ?)
+                               ON CONFLICT (order_id, category)
+                                   WHERE order_id IS NOT NULL AND category IN ('order_work', 'order_markup')
+                                   DO UPDATE SET amount = excluded.amount
+                                   WHERE amount != excluded.amount
+                               RETURNING id
+                               ''', (category, amount, description, order_id))
+                row = cursor.fetchone()
+                if row:
+                    changed = True
+                    self._emit('cash', 'updated' if category in existing else 'created', row[0],
+                               transaction_type='income', category=category, amount=amount, order_id=order_id)
+
+            salary_amount = 0
+            commission_rate = order['commission_rate'] or 0
+            if order['employee_id'] and commission_rate > 0:
+                salary_amount = round(works_total * commission_rate / 100, 2)
+            cursor.execute('SELECT 1 FROM employee_salary WHERE order_id = ?', (order_id,))
+            has_salary = cursor.fetchone() is not None
+            if order['employee_id'] and (salary_amount > 0 or has_salary):
+                cursor.execute('''
+                               INSERT INTO employee_salary (employee_id, order_id, amount, commission_rate, works_total)
+                               VALUES (?, ?, ?, ?, ?)
+                               ON CONFLICT (order_id) WHERE order_id IS NOT NULL
+                                   DO UPDATE SET employee_id     = excluded.employee_id,
+                                                 amount          = excluded.amount,
+                                                 commission_rate = excluded.commission_rate,
+                                                 works_total     = excluded.works_total
+                                   WHERE amount != excluded.amount
+                                      OR employee_id != excluded.employee_id
+                               ''', (order['employee_id'], order_id, salary_amount, commission_rate, works_total))
+                changed = changed or cursor.rowcount > 0
+            elif has_salary:
+                # Работника с заказа сняли - начисление обнуляется
+                cursor.execute('''
+                               UPDATE employee_salary
+                               SET amount      = 0,
+                                   works_total = ?
+                               WHERE order_id = ?
+                                 AND amount != 0
+                               ''', (works_total, order_id))
+                changed = changed or cursor.rowcount > 0
+
+            cursor.execute('''
+                           UPDATE work_orders
+                           SET status       = 'completed',
+                               completed_at = CURRENT_TIMESTAMP
+                           WHERE id = ?
+                             AND status != 'completed'
+                           ''', (order_id,))
+            already_completed = not changed and cursor.rowcount == 0
+            if not already_completed:
+                self._emit('order', 'updated', order_id, status='completed')
+
+            return {
+                'order_number': order['order_number'],
+                'works_total': works_total,
+                'markup_total': markup_total,
+                'total_income': works_total + markup_total,
+                'salary_amount': salary_amount,
+                'already_completed': already_completed
+            }
+
+    @write_method
+    def delete_work_order(self, order_id):
+        """Удаление заказ-наряда"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM work_orders WHERE id = ?', (order_id,))
+            if cursor.rowcount == 0:
+                return False
+            self._emit('order', 'deleted', order_id)
+            return True
+
+    @write_method
+    def batch_work_orders(self, operations):
+        """Пакет операций с заказ-нарядами одной транзакцией (см. _run_batch)
+
+        Операции: {'id', 'op': 'status', 'status'}, {'id', 'op': 'complete'},
+        {'id', 'op': 'delete'}, {'id', 'op': 'update', 'fields': {...}}
+        (поля WORK_ORDER_BATCH_FIELDS, только для незавершенных заказов).
+        Статус 'completed' выполняется как 'complete' - с проводками в кассу
+        и начислением зарплаты.
+        """
+        return self._run_batch(operations, {
+            'status': self._batch_order_status,
+            'complete': self._batch_order_complete,
+            'delete': self._batch_order_delete,
+            'update': self._batch_order_update,
+        })
+
+    def _batch_order_status(self, order_id, operation):
+        status = operation.get('status')
+        if status not in WORK_ORDER_STATUSES:
+            raise ValueError(f'Неверный статус: {status}')
+        if status == 'completed':
+            # Простая смена статуса оставила бы заказ без проводок
+            return self._batch_order_complete(order_id, operation)
+        if not self.update_work_order_status(order_id, status):
+            raise ValueError('Заказ-наряд не найден')
+
+    def _batch_order_complete(self, order_id, operation):
+        result = self.complete_work_order(order_id)
+        if result is None:
+            raise ValueError('Заказ-наряд не найден')
+        return result
+
+    def _batch_order_delete(self, order_id, operation):
+        if not self.delete_work_order(order_id):
+            raise ValueError('Заказ-наряд не найден')
+
+    def _batch_order_update(self, order_id, operation):
+        fields = self._batch_fields(operation, WORK_ORDER_BATCH_FIELDS)
+        order = self.get_work_order(order_id)
+        if not order:
+            raise ValueError('Заказ-наряд не найден')
+        if order['status'] == 'completed':
+            raise ValueError('Невозможно редактировать завершенный заказ')
+        self.update_work_order(order_id, **fields)
+
+    # ========== ЗАДАЧИ ==========
+
+    @write_method
+    def add_task(self, title, description='', priority='medium', assigned_to='', due_date=None):
+        """Добавление новой задачи"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           INSERT INTO tasks (title, description, priority, assigned_to, due_date)
+                           VALUES (?, ?, ?, ?, ?)
+                           ''', (title, description, priority, assigned_to, due_date))
+            self._emit('task', 'created', cursor.lastrowid, status='pending')
+            return cursor.lastrowid
+
+    # Порядок задач: приоритет, срок (задачи без срока - первыми), новые выше
+    _TASKS_ORDER = [('priority_rank', 'priority_rank', 'ASC'),
+                    ('due_key', 'due_key', 'ASC'),
+                    ('created_at', 'created_at', 'DESC'),
+                    ('id', 'id', 'DESC')]
+
+    _TASKS_SELECT = '''
+                    SELECT *
+                    FROM (SELECT *,
+                                 CASE priority
+                                     WHEN 'high' THEN 1
+                                     WHEN 'medium' THEN 2
+                                     WHEN 'low' THEN 3
+                                     ELSE 4
+                                     END                 as priority_rank,
+                                 COALESCE(due_date, '') as due_key
+                          FROM tasks)
+                    '''
+
+    def get_tasks(self, status=None):
+        """Получение задач"""
+        with self._read() as conn:
+            return self._query_tasks(conn.cursor(), status)
+
+    def get_tasks_page(self, status=None, limit=50, after=None):
+        """Страница задач: {'items': [...], 'next_cursor': курсор или None}"""
+        with self._read() as conn:
+            rows = self._query_tasks(conn.cursor(), status, limit + 1, decode_cursor(after))
+        return make_page(rows, self._TASKS_ORDER, limit)
+
+    def _query_tasks(self, cursor, status=None, limit=None, after=None):
+        """Выборка задач для get_tasks/get_tasks_page"""
+        conditions, params = (['status = ?'], [status]) if status else ([], [])
+        return self._keyset_select(cursor, self._TASKS_SELECT, conditions, params,
+                                   self._TASKS_ORDER, limit, after)
+
+    def get_task(self, task_id):
+        """Получение задачи по ID"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM tasks WHERE id = ?', (task_id,))
+            return cursor.fetchone()
+
+    @write_method
+    def update_task(self, task_id, **kwargs):
+        """Обновление задачи"""
+        if not kwargs:
+            return False
+
+        set_clause = ', '.join([f"{key} = ?" for key in kwargs.keys()])
+        values = list(kwargs.values())
+        values.append(task_id)
+
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'UPDATE tasks SET {set_clause} WHERE id = ?', values)
+            if cursor.rowcount == 0:
+                return False
+            self._emit('task', 'updated', task_id, status=kwargs.get('status'))
+            return True
+
+    @write_method
+    def delete_task(self, task_id):
+        """Удаление задачи"""
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+            if cursor.rowcount == 0:
+                return False
+            self._emit('task', 'deleted', task_id)
+            return True
+
+    @write_method
+    def batch_tasks(self, operations):
+        """Пакет операций с задачами одной транзакцией (см. _run_batch)
+
+        Операции: {'id', 'op': 'status', 'status'}, {'id', 'op': 'delete'},
+        {'id', 'op': 'update', 'fields': {...}} (поля TASK_BATCH_FIELDS).
+        """
+        return self._run_batch(operations, {
+            'status': self._batch_task_status,
+            'delete': self._batch_task_delete,
+            'update': self._batch_task_update,
+        })
+
+    def _batch_task_status(self, task_id, operation):
+        self._batch_task_update(task_id, {'fields': {'status': operation.get('status')}})
+
+    def _batch_task_update(self, task_id, operation):
+        fields = self._batch_fields(operation, TASK_BATCH_FIELDS)
+        if 'status' in fields and fields['status'] not in TASK_STATUSES:
+            raise ValueError(f"Неверный статус: {fields['status']}")
+        if fields.get('status') == 'completed' and 'completed_at' not in fields:
+            fields['completed_at'] = datetime.now().isoformat()
+        if not self.update_task(task_id, **fields):
+            raise ValueError('Задача не найдена')
+
+    def _batch_task_delete(self, task_id, operation):
+        if not self.delete_task(task_id):
+            raise ValueError('Задача не найдена')
+
+    # ========== КАССА ==========
+
+    @write_method
+    def add_cash_flow(self, transaction_type, category, amount, description='', order_id=None):
+        """Добавление операции в кассу"""
+        try:
+            with self._write() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                               INSERT INTO cash_flow (transaction_type, category, amount, description, order_id)
+                               VALUES (?, ?, ?, ?, ?)
+                               ''', (transaction_type, category, amount, description, order_id))
+                self._emit('cash', 'created', cursor.lastrowid, transaction_type=transaction_type,
+                           category=category, amount=amount, order_id=order_id)
+                return cursor.lastrowid
+
+        except sqlite3.IntegrityError as e:
+            # Проводки order_work/order_markup по заказу уникальны (idx_cashflow_order_posting)
+            if 'UNIQUE constraint failed' in str(e):
+                raise ValueError(f"Проводка {category} по заказу {order_id} уже существует")
+            raise
+
+    _CASH_FLOW_ORDER = [('date', 'date', 'DESC'), ('id', 'id', 'DESC')]
+
+    def get_cash_flow_item(self, flow_id):
+        """Операция кассы по ID"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM cash_flow WHERE id = ?', (flow_id,))
+            return cursor.fetchone()
+
+    def get_cash_flow(self, start_date=None, end_date=None, transaction_type=None, category=None):
+        """Получение операций кассы за период"""
+        with self._read() as conn:
+            return self._query_cash_flow(conn.cursor(), start_date, end_date, transaction_type, category)
+
+    def get_cash_flow_page(self, start_date=None, end_date=None, transaction_type=None, category=None,
+                           limit=50, after=None):
+        """Страница операций кассы: {'items': [...], 'next_cursor': курсор или None}"""
+        with self._read() as conn:
+            rows = self._query_cash_flow(conn.cursor(), start_date, end_date, transaction_type, category,
+                                         limit + 1, decode_cursor(after))
+        return make_page(rows, self._CASH_FLOW_ORDER, limit)
+
+    def iter_cash_flow(self, start_date=None, end_date=None, transaction_type=None, category=None, batch_size=1000):
+        """Потоковое чтение операций кассы для выгрузки (фильтры get_cash_flow)"""
+        return self._iter_rows(self._query_cash_flow, batch_size, start_date=start_date, end_date=end_date,
+                               transaction_type=transaction_type, category=category)
+
+    def _query_cash_flow(self, cursor, start_date=None, end_date=None, transaction_type=None, category=None,
+                         limit=None, after=None, stream=False):
+        """Выборка операций кассы для get_cash_flow/get_cash_flow_page/iter_cash_flow"""
+        conditions = []
+        params = []
+
+        if start_date:
+            conditions.append('date >= ?')
+            params.append(start_date[:10])
+
+        if end_date:
+            conditions.append('date < ?')
+            params.append(day_after(end_date))
+
+        if transaction_type:
+            conditions.append('transaction_type = ?')
+            params.append(transaction_type)
+
+        if category:
+            conditions.append('category = ?')
+            params.append(category)
+
+        return self._keyset_select(cursor, 'SELECT * FROM cash_flow', conditions, params,
+                                   self._CASH_FLOW_ORDER, limit, after, stream)
+
+    def get_financial_stats(self, period='month'):
+        """Получение финансовой статистики
+
+        Суммы берутся из дневных итогов cash_daily, а не из операций.
+        """
+        with self._read() as conn:
+            return self._query_financial_stats(conn.cursor(), period)
+
+    def _query_financial_stats(self, cursor, period='month'):
+        """Статистика за период одним запросом: суммы по (тип, категория)
+
+        Итоги по доходам и расходам считаются из тех же строк в Python.
+        """
+        start_date_str, end_date_str = period_bounds(period)
+
+        stats = {
+            'period': period,
+            'start_date': start_date_str,
+            'end_date': end_date_str,
+            'total_income': 0.0,
+            'total_expenses': 0.0,
+            'net_profit': 0.0,
+            'income_by_category': [],
+            'expenses_by_category': []
+        }
+
+        try:
+            # Полуинтервал [start, end + 1 день) по дням
+            cursor.execute('''
+                           SELECT transaction_type, category, SUM(amount) as amount
+                           FROM cash_daily
+                           WHERE day >= ?
+                             AND day < ?
+                           GROUP BY transaction_type, category
+                           ORDER BY amount DESC
+                           ''', (start_date_str, day_after(end_date_str)))
+
+            total_income = total_expenses = 0.0
+            for row in cursor.fetchall():
+                amount = float(row['amount'] or 0)
+                item = {'category': row['category'], 'amount': round(amount, 2)}
+                if row['transaction_type'] == 'income':
+                    stats['income_by_category'].append(item)
+                    total_income += amount
+                # Расходы без изъятий, не являющихся расходом (cash_out_no_expense)
+                elif row['transaction_type'] == 'expense' and row['category'] != 'cash_out_no_expense':
+                    stats['expenses_by_category'].append(item)
+                    total_expenses += amount
+
+            # Итоги - из неокругленных сумм, как при суммировании операций
+            stats['total_income'] = round(total_income, 2)
+            stats['total_expenses'] = round(total_expenses, 2)
+
+            # Чистая прибыль
+            stats['net_profit'] = round(stats['total_income'] - stats['total_expenses'], 2)
+
+        except Exception as e:
+            print(f"Ошибка при получении статистики: {e}")
+
+        return stats
+
+    def get_cash_overview(self, period='month', transaction_type=None, category=None, limit=50, after=None):
+        """Данные страницы кассы за одно обращение к БД
+
+        Страница операций за период (единственный запрос к cash_flow),
+        статистика из cash_daily и баланс из cash_balance на одном соединении.
+        """
+        start_date, end_date = period_bounds(period)
+        with self._read() as conn:
+            cursor = conn.cursor()
+            rows = self._query_cash_flow(cursor, start_date, end_date, transaction_type, category,
+                                         limit + 1, decode_cursor(after))
+            financial_stats = self._query_financial_stats(cursor, period)
+            cursor.execute('SELECT ROUND(income_amount - expense_amount, 2) FROM cash_balance WHERE id = 1')
+            result = cursor.fetchone()
+
+        return {
+            'page': make_page(rows, self._CASH_FLOW_ORDER, limit),
+            'financial_stats': financial_stats,
+            'total_balance': result[0] if result else 0.0
+        }
+
+    def get_total_balance(self):
+        """Получение общего баланса (из снимка cash_balance)"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT ROUND(income_amount - expense_amount, 2) FROM cash_balance WHERE id = 1')
+            result = cursor.fetchone()
+            return result[0] if result else 0.0
+
+    # ========== ИТОГИ КАССЫ ==========
+
+    _CASH_DAILY_SQL = '''
+                      SELECT COALESCE(date(date), '') as day,
+                             transaction_type,
+                             category,
+                             SUM(amount)               as amount,
+                             COUNT(*)                  as row_count
+                      FROM cash_flow
+                      GROUP BY 1, 2, 3
+                      '''
+
+    _CASH_BALANCE_SQL = '''
+                        SELECT COALESCE(SUM(CASE WHEN transaction_type = 'income' THEN amount END), 0)  as income_amount,
+                               COALESCE(SUM(CASE WHEN transaction_type = 'expense' THEN amount END), 0) as expense_amount,
+                               COUNT(*)                                                                as row_count
+                        FROM cash_flow
+                        '''
+
+    def _fill_cash_rollups(self, cursor):
+        """Заполнение cash_daily и cash_balance из всех операций кассы"""
+        cursor.execute('DELETE FROM cash_daily')
+        cursor.execute(f'''
+                       INSERT INTO cash_daily (day, transaction_type, category, amount, row_count)
+                       {self._CASH_DAILY_SQL}
+                       ''')
+        days = cursor.rowcount
+        cursor.execute(f'''
+                       INSERT OR REPLACE INTO cash_balance (id, income_amount, expense_amount, row_count)
+                       SELECT 1, income_amount, expense_amount, row_count
+                       FROM ({self._CASH_BALANCE_SQL})
+                       ''')
+        return days
+
+    @write_method
+    def rebuild_cash_rollups(self):
+        """Пересборка итогов кассы с нуля; возвращает число строк cash_daily"""
+        with self._write() as conn:
+            return self._fill_cash_rollups(conn.cursor())
+
+    # Повторные автоматические проводки и начисления по одному заказу
+    _DUPLICATE_POSTINGS_SQL = '''
+                              SELECT 'cash_flow' AS source, order_id, category,
+                                     GROUP_CONCAT(id) AS ids, GROUP_CONCAT(amount) AS amounts
+                              FROM cash_flow
+                              WHERE order_id IS NOT NULL
+                                AND category IN ('order_work', 'order_markup')
+                              GROUP BY order_id, category
+                              HAVING COUNT(*) > 1
+                              UNION ALL
+                              SELECT 'employee_salary', order_id, 'salary',
+                                     GROUP_CONCAT(id), GROUP_CONCAT(amount)
+                              FROM employee_salary
+                              WHERE order_id IS NOT NULL
+                              GROUP BY order_id
+                              HAVING COUNT(*) > 1
+                              ORDER BY order_id
+                              '''
+
+    def find_duplicate_postings(self):
+        """Повторные проводки order_work/order_markup и начисления зарплаты по заказам
+
+        Возвращает список словарей source (таблица), order_id, category,
+        ids и amounts (через запятую). Пустой список - повторов нет.
+        """
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._DUPLICATE_POSTINGS_SQL)
+            return [dict(row) for row in cursor.fetchall()]
+
+    @write_method
+    def remove_duplicate_postings(self):
+        """Удаление повторных проводок и начислений по заказам и создание уникальных индексов
+
+        По каждому заказу и категории остается последняя запись - она
+        соответствует последнему завершению заказа. Итоги кассы и балансы
+        зарплаты пересчитываются триггерами на удаление. Возвращает число
+        удаленных строк.
+        """
+        with self._write() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                           DELETE FROM cash_flow
+                           WHERE order_id IS NOT NULL
+                             AND category IN ('order_work', 'order_markup')
+                             AND id NOT IN (SELECT MAX(id)
+                                            FROM cash_flow
+                                            WHERE order_id IS NOT NULL
+                                              AND category IN ('order_work', 'order_markup')
+                                            GROUP BY order_id, category)
+                           ''')
+            removed = cursor.rowcount
+            cursor.execute('''
+                           DELETE FROM employee_salary
+                           WHERE order_id IS NOT NULL
+                             AND id NOT IN (SELECT MAX(id)
+                                            FROM employee_salary
+                                            WHERE order_id IS NOT NULL
+                                            GROUP BY order_id)
+                           ''')
+            removed += cursor.rowcount
+            self._create_posting_indexes(cursor)
+            return removed
+
+    def verify_cash_rollups(self):
+        """Сверка итогов кассы с операциями
+
+        Возвращает список расхождений: словари с ключом итога и парами
+        (ожидаемое, фактическое) суммы и числа операций. Пустой список -
+        итоги верны.
+        """
+        with self._read() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._CASH_DAILY_SQL)
+            expected = {tuple(row[:3]): (row['amount'], row['row_count']) for row in cursor.fetchall()}
+            cursor.execute('SELECT day, transaction_type, category, amount, row_count FROM cash_daily')
+            actual = {tuple(row[:3]): (row['amount'], row['row_count']) for row in cursor.fetchall()}
+            cursor.execute(self._CASH_BALANCE_SQL)
+            expected_balance = tuple(cursor.fetchone())
+            cursor.execute('SELECT income_amount, expense_amount, row_count FROM cash_balance WHERE id = 1')
+            row = cursor.fetchone()
+            actual_balance = tuple(row) if row else (0, 0, 0)
+
+        mismatches = []
+        for key in sorted(set(expected) | set(actual)):
+            exp_amount, exp_count = expected.get(key, (0, 0))
+            act_amount, act_count = actual.get(key, (0, 0))
+            if abs(exp_amount - act_amount) > 0.005 or exp_count != act_count:
+                mismatches.append({
+                    'key': key,
+                    'amount': (exp_amount, act_amount),
+                    'row_count': (exp_count, act_count)
+                })
+        if (any(abs(e - a) > 0.005 for e, a in zip(expected_balance[:2], actual_balance[:2]))
+                or expected_balance[2] != actual_balance[2]):
+            mismatches.append({
+                'key': ('balance',),
+                'amount': (expected_balance[0] - expected_balance[1], actual_balance[0] - actual_balance[1]),
+                'row_count': (expected_balance[2], actual_balance[2])
+            })
+        return mismatches
+
+    # ========== СТАТИСТИКА ==========
+
+    def get_stats(self):
+        """Получение общей статистики
+
+        Результат кэшируется на stats_cache_ttl секунд; любая фиксированная
+        запись через _write сбрасывает кэш. stats_cache_ttl=0 отключает кэш.
+        """
+        with self._stats_lock:
+            version = self._data_version
+            cached = self._stats_cache
+            if cached and cached[0] == version and cached[1] > time.monotonic():
+                self.stats_cache_hits += 1
+                return dict(cached[2])
+            self.stats_cache_misses += 1
+
+        stats = self._query_stats()
+
+        with self._stats_lock:
+            # Пока считали, могла пройти запись - такой результат не кэшируем
+            if self.stats_cache_ttl and self._data_version == version:
+                self._stats_cache = (version, time.monotonic() + self.stats_cache_ttl, stats)
+        return dict(stats)
+
+    def _query_stats(self):
+        """Статистика для главной страницы: по одному запросу на таблицу"""
+        with self._read() as conn:
+            cursor = conn.cursor()
+
+            stats = {}
+
+            # Клиенты
+            cursor.execute('SELECT COUNT(*) FROM clients')
+            stats['total_clients'] = cursor.fetchone()[0]
+
+            # Работники
+            cursor.execute('SELECT COUNT(*) FROM employees WHERE is_active = TRUE')
+            stats['total_employees'] = cursor.fetchone()[0]
+
+            # Заказ-наряды и общая выручка
+            cursor.execute('''
+                           SELECT COUNT(*)                                  as total_orders,
+                                  COALESCE(SUM(status = 'new'), 0)         as new_orders,
+                                  COALESCE(SUM(status = 'in_progress'), 0) as in_progress_orders,
+                                  COALESCE(SUM(status = 'completed'), 0)   as completed_orders,
+                                  COALESCE(SUM(CASE WHEN status = 'completed' THEN total_amount END),
+                                           0)                               as total_revenue
+                           FROM work_orders
+                           ''')
+            stats.update(dict(cursor.fetchone()))
+
+            # Задачи
+            cursor.execute('''
+                           SELECT COALESCE(SUM(status = 'pending'), 0)     as pending_tasks,
+                                  COALESCE(SUM(status = 'in_progress'), 0) as in_progress_tasks,
+                                  COALESCE(SUM(status = 'completed'), 0)   as completed_tasks
+                           FROM tasks
+                           ''')
+            stats.update(dict(cursor.fetchone()))
+
+            # Баланс
+            cursor.execute('SELECT ROUND(income_amount - expense_amount, 2) FROM cash_balance WHERE id = 1')
+            result = cursor.fetchone()
+            stats['total_balance'] = result[0] if result else 0.0
+
+        return stats
+
+    def get_cache_stats(self):
+        """Счетчики кэша статистики для мониторинга"""
+        with self._stats_lock:
+            requests = self.stats_cache_hits + self.stats_cache_misses
+            return {
+                'ttl': self.stats_cache_ttl,
+                'hits': self.stats_cache_hits,
+                'misses': self.stats_cache_misses,
+                'hit_ratio': round(self.stats_cache_hits / requests, 4) if requests else 0.0,
+                'cached': self._stats_cache is not None
+            }
+
+    # ========== ЖУРНАЛ ИЗМЕНЕНИЙ ==========
+
+    def get_change_log_head(self):
+        """Последняя выданная версия журнала изменений (0, если изменений не было)"""
+        with self._read() as conn:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+            return row[0] if row else 0
+
+    def get_changes(self, after=0, limit=500, tables=None):
+        """Изменения с версией больше after, по возрастанию версии
+
+        Возвращает {'changes': [{version, table, pk, op, ts}], 'cursor': версия
+        последнего изменения (передается как after в следующий вызов),
+        'has_more': есть ли еще изменения, 'expired': часть изменений после
+        after уже удалена из журнала - потребитель должен перечитать данные
+        целиком и продолжить с cursor}.
+        """
+        after = max(0, int(after))
+        tables = list(tables or ())
+        unknown = sorted(set(tables) - set(CHANGE_LOG_TABLES))
+        if unknown:
+            raise ValueError(f"Таблицы нет в журнале изменений: {', '.join(unknown)}")
+
+        conditions, params = ['version > ?'], [after]
+        if tables:
+            conditions.append(f"table_name IN ({', '.join('?' * len(tables))})")
+            params.extend(tables)
+        params.append(limit + 1)
+
+        with self._read() as conn:
+            cursor = conn.cursor()
+            # Версии до head зафиксированы раньше выборки и попадут в нее
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+            row = cursor.fetchone()
+            head = row[0] if row else 0
+            cursor.execute("SELECT MIN(version) FROM change_log")
+            first = cursor.fetchone()[0] or head + 1
+            cursor.execute(f'''
+                           SELECT version, table_name, pk, op, ts
+                           FROM change_log
+                           WHERE {' AND '.join(conditions)}
+                           ORDER BY version
+                           LIMIT ?
+                           ''', params)
+            rows = cursor.fetchall()
+
+        has_more = len(rows) > limit
+        changes = [{'version': row['version'], 'table': row['table_name'], 'pk': row['pk'],
+                    'op': row['op'], 'ts': row['ts']} for row in rows[:limit]]
+        if has_more:
+            position = changes[-1]['version']
+        else:
+            # Изменения других таблиц (при фильтре по tables) не перечитываются повторно
+            position = max([after, head] + [change['version'] for change in changes])
+        return {
+            'changes': changes,
+            'cursor': position,
+            'has_more': has_more,
+            'expired': after < first - 1
+        }
+
+    @write_method
+    def prune_change_log(self, keep_days=30):
+        """Удаление записей журнала изменений старше keep_days дней; возвращает число удаленных
+
+        Версии растут вместе со временем, поэтому удаляется префикс журнала
+        до первой записи не старше границы - без индекса по ts.
+        """
+        with self._write() as conn:
+            cursor = conn.execute('''
+                                  DELETE FROM change_log
+                                  WHERE version < COALESCE(
+                                          (SELECT version FROM change_log
+                                           WHERE ts >= strftime('%Y-%m-%d %H:%M:%f', 'now', ?)
+                                           ORDER BY version LIMIT 1),
+                                          (SELECT MAX(version) + 1 FROM change_log))
+                                  ''', (f'-{int(keep_days)} days',))
+            return cursor.rowcount
+
+    def get_query_stats(self, limit=50, order_by='total_ms'):
+        """Статистика SQL-запросов и последние медленные запросы (None без журнала)"""
+        if self.query_log is None:
+            return None
+        return self.query_log.snapshot(limit, order_by)
+
+    def get_write_batch_stats(self):
+        """Счетчики групповой фиксации (None, если она выключена)"""
+        if self._write_batcher is None:
+            return None
+        return self._write_batcher.get_stats()
+
+    def close(self):
+        """Закрытие соединений"""
+        if getattr(self, '_write_batcher', None) is not None:
+            self._write_batcher.close()
+        if self._read_pool is not None:
+            self._read_pool.close()
+        if hasattr(self, 'conn'):
+            self.conn.close()
+
+
+# Имена методов записи (помечены @write_method)
+WRITE_METHODS = tuple(name for name, value in vars(Database).items() if getattr(value, 'is_write_method', False))
@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+"""Настройки gunicorn; файл подхватывается автоматически при запуске из каталога проекта
+
+    AUTOSERVICE_METRICS_DIR=/tmp/autoservice-metrics gunicorn -w 4 app:app
+
+Потоки /api/events (SSE) держат поток обработки запросов на все время
+подключения страницы, поэтому воркеры многопоточные (gthread). Параметры
+командной строки (-k, --threads) имеют приоритет над этим файлом.
+"""
+import os
+
+from metrics import clear_directory
+
+worker_class = 'gthread'
+threads = 8
+
+
+def on_starting(server):
+    """Мастер-процесс перед запуском воркеров: файлы метрик прошлого запуска не суммируются в /metrics"""
+    clear_directory(os.environ.get('AUTOSERVICE_METRICS_DIR'))
+
+
+def post_fork(server, worker):
+    """Воркер до загрузки app: потокам событий - не больше половины потоков воркера
+
+    Остальные потоки остаются для обычных запросов. Явно заданный
+    AUTOSERVICE_SSE_MAX_STREAMS не меняется.
+    """
+    os.environ.setdefault('AUTOSERVICE_SSE_MAX_STREAMS', str(max(1, worker.cfg.threads // 2)))
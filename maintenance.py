@@ -0,0 +1,183 @@
+# maintenance.py
+import argparse
+import re
+import sys
+
+from database import Database
+
+
+def rebuild_balances(db):
+    """Пересборка балансов зарплаты"""
+    count = db.rebuild_employee_balances()
+    print(f"✅ Балансы пересчитаны для {count} работников")
+    return True
+
+
+def verify_balances(db):
+    """Сверка балансов зарплаты с историей начислений и выплат"""
+    mismatches = db.verify_employee_balances()
+    if not mismatches:
+        print("✅ Балансы зарплаты совпадают с историей")
+        return True
+
+    print(f"❌ Расхождения в балансах: {len(mismatches)}")
+    for item in mismatches:
+        print(f"  работник {item['employee_id']}: "
+              f"начислено {item['earned_amount'][0]:.2f} / {item['earned_amount'][1]:.2f}, "
+              f"выплачено {item['paid_amount'][0]:.2f} / {item['paid_amount'][1]:.2f}, "
+              f"к выплате {item['pending_amount'][0]:.2f} / {item['pending_amount'][1]:.2f} "
+              f"(ожидается / в таблице)")
+    print("   Исправить: python maintenance.py rebuild-balances")
+    return False
+
+
+def rebuild_search(db):
+    """Пересборка полнотекстового индекса клиентов и заказ-нарядов"""
+    if not db.rebuild_search_index():
+        print("❌ SQLite собран без FTS5, поиск работает через LIKE")
+        return False
+    print("✅ Поисковый индекс пересобран")
+    return True
+
+
+# Выборки по периоду, которые должны идти по индексу, а не полным сканированием
+PLAN_CHECKS = [
+    ('get_cash_flow', lambda db: db.get_cash_flow('2024-01-01', '2024-01-31')),
+    ('get_cash_flow (тип)', lambda db: db.get_cash_flow('2024-01-01', '2024-01-31', 'income')),
+    ('get_cash_flow (категория)', lambda db: db.get_cash_flow('2024-01-01', '2024-01-31', None, 'rent')),
+    ('get_cash_flow_page', lambda db: db.get_cash_flow_page('2024-01-01', '2024-01-31', limit=50)),
+    ('get_financial_stats', lambda db: db.get_financial_stats('month')),
+]
+
+# Полное сканирование любой таблицы, в том числе по всему (и покрывающему)
+# индексу: get_financial_stats может перейти на другие таблицы. Строка
+# константы и материализованные подзапросы таблицами не являются.
+FULL_SCAN = re.compile(r'^SCAN (?!CONSTANT ROW\b|\()\w+')
+
+
+def capture_statements(db, call):
+    """SELECT-запросы, выполненные вызовом call на соединении записи"""
+    statements = []
+
+    def trace(statement):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            statements.append(statement)
+
+    db.conn.set_trace_callback(trace)
+    try:
+        call(db)
+    finally:
+        db.conn.set_trace_callback(None)
+    return statements
+
+
+def check_plans(db):
+    """EXPLAIN QUERY PLAN для выборок кассы: ошибка, если вернулось полное сканирование"""
+    failed = 0
+    for name, call in PLAN_CHECKS:
+        for statement in capture_statements(db, call):
+            plan = [row[3] for row in db.conn.execute('EXPLAIN QUERY PLAN ' + statement)]
+            scans = [detail for detail in plan if FULL_SCAN.match(detail)]
+            if scans:
+                failed += 1
+                print(f"❌ {name}: {'; '.join(scans)}")
+                print(f"   {' '.join(statement.split())}")
+            else:
+                print(f"✅ {name}: {'; '.join(plan)}")
+
+    if failed:
+        print(f"❌ Полное сканирование в {failed} запросах")
+        return False
+    return True
+
+
+def rebuild_cash(db):
+    """Пересборка дневных итогов и баланса кассы"""
+    days = db.rebuild_cash_rollups()
+    print(f"✅ Итоги кассы пересчитаны: {days} строк по дням")
+    return True
+
+
+def verify_cash(db):
+    """Сверка итогов кассы с операциями"""
+    mismatches = db.verify_cash_rollups()
+    if not mismatches:
+        print("✅ Итоги кассы совпадают с операциями")
+        return True
+
+    print(f"❌ Расхождения в итогах кассы: {len(mismatches)}")
+    for item in mismatches:
+        print(f"  {' / '.join(item['key'])}: "
+              f"сумма {item['amount'][0]:.2f} / {item['amount'][1]:.2f}, "
+              f"операций {item['row_count'][0]} / {item['row_count'][1]} "
+              f"(ожидается / в таблице)")
+    print("   Исправить: python maintenance.py rebuild-cash")
+    return False
+
+
+def verify_postings(db):
+    """Поиск повторных проводок и начислений зарплаты по заказам"""
+    duplicates = db.find_duplicate_postings()
+    if not duplicates:
+        print("✅ Повторных проводок по заказам нет")
+        return True
+
+    print(f"❌ Повторные проводки по заказам: {len(duplicates)}")
+    for item in duplicates:
+        print(f"  заказ {item['order_id']}, {item['source']} / {item['category']}: "
+              f"записи {item['ids']}, суммы {item['amounts']}")
+    print("   Удалить повторы (остается последняя запись): python maintenance.py dedupe-postings")
+    return False
+
+
+def dedupe_postings(db):
+    """Удаление повторных проводок и начислений по заказам (остается последняя запись)"""
+    verify_postings(db)
+    removed = db.remove_duplicate_postings()
+    print(f"✅ Удалено повторных записей: {removed}, уникальные индексы проводок созданы")
+    return True
+
+
+# Сколько дней хранить журнал изменений
+CHANGE_LOG_KEEP_DAYS = 30
+
+
+def prune_changes(db):
+    """Удаление записей журнала изменений старше CHANGE_LOG_KEEP_DAYS дней"""
+    count = db.prune_change_log(CHANGE_LOG_KEEP_DAYS)
+    print(f"✅ Из журнала изменений удалено {count} записей старше {CHANGE_LOG_KEEP_DAYS} дней")
+    return True
+
+
+COMMANDS = {
+    'rebuild-balances': rebuild_balances,
+    'verify-balances': verify_balances,
+    'rebuild-search': rebuild_search,
+    'rebuild-cash': rebuild_cash,
+    'verify-cash': verify_cash,
+    'check-plans': check_plans,
+    'verify-postings': verify_postings,
+    'dedupe-postings': dedupe_postings,
+    'prune-changes': prune_changes,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Обслуживание базы данных CRM автосервиса')
+    parser.add_argument('command', choices=sorted(COMMANDS), help='команда')
+    parser.add_argument('--db', default='autoservice.db', help='файл базы данных (по умолчанию autoservice.db)')
+    args = parser.parse_args()
+
+    # Пул чтения не нужен: все запросы идут через соединение записи,
+    # на котором check-plans перехватывает SQL
+    db = Database(args.db, read_pool_size=0)
+    try:
+        ok = COMMANDS[args.command](db)
+    finally:
+        db.close()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+# metrics.py
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+# Границы бакетов гистограмм
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Описания метрик: имя -> (тип, справка, границы бакетов для гистограмм)
+METRICS = {
+    'autoservice_http_requests_total': (
+        'counter', 'Обработанные HTTP-запросы', None),
+    'autoservice_http_request_duration_seconds': (
+        'histogram', 'Время обработки HTTP-запроса', LATENCY_BUCKETS),
+    'autoservice_http_response_size_bytes': (
+        'histogram', 'Размер тела ответа', SIZE_BUCKETS),
+    'autoservice_db_queries_per_request': (
+        'histogram', 'Число SQL-запросов на HTTP-запрос', QUERY_COUNT_BUCKETS),
+    'autoservice_db_queries_total': (
+        'counter', 'SQL-запросы, выполненные при обработке HTTP-запросов', None),
+    'autoservice_db_seconds_total': (
+        'counter', 'Время SQL-запросов при обработке HTTP-запросов', None),
+    'autoservice_stats_cache_hits_total': (
+        'counter', 'Попадания в кэш статистики главной страницы', None),
+    'autoservice_stats_cache_misses_total': (
+        'counter', 'Промахи кэша статистики главной страницы', None),
+}
+
+
+def clear_directory(directory):
+    """Удаление файлов метрик прошлых запусков; вызывается при старте сервера до запуска воркеров"""
+    if not directory:
+        return
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json*')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class _Shard:
+    """Часть счетчиков со своей блокировкой
+
+    Потоки распределяются по шардам по идентификатору, поэтому запросы
+    в разных потоках почти никогда не ждут друг друга.
+    """
+    __slots__ = ('lock', 'counters', 'histograms')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+
+class Metrics:
+    """Счетчики и гистограммы процесса в формате Prometheus
+
+    Ключ значения - (имя метрики, кортеж пар (метка, значение)). Запись идет
+    в шард текущего потока, при выгрузке шарды суммируются.
+
+    Если задан directory, процесс раз в flush_interval секунд сохраняет свои
+    значения в directory/metrics-<pid>-<время старта>.json, а render()
+    суммирует файлы всех процессов: так /metrics в любом воркере отдает
+    общие значения. Время старта в имени не дает перезапущенному воркеру с
+    тем же pid перезаписать файл предшественника. Файлы завершившихся
+    воркеров не удаляются, чтобы счетчики не уменьшались; каталог очищает
+    clear_directory() при запуске сервера (gunicorn.conf.py, python app.py).
+    """
+
+    def __init__(self, directory=None, flush_interval=5.0, shards=16):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._shards = [_Shard() for _ in range(shards)]
+        # Функции, возвращающие текущие значения счетчиков, которые ведутся
+        # вне Metrics (например, кэш статистики Database): {имя: значение}
+        self._collectors = []
+        self._pid = None
+        self._file_name = None
+        self._start_lock = threading.Lock()
+
+    def _shard(self):
+        if self._pid != os.getpid():
+            self._after_fork()
+        return self._shards[(threading.get_ident() >> 12) % len(self._shards)]
+
+    def _after_fork(self):
+        """Первое обращение в новом процессе: свои счетчики и поток выгрузки
+
+        Значения, унаследованные от родителя при fork, уже учтены в его файле.
+        """
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self._shards = [_Shard() for _ in self._shards]
+            self._pid = os.getpid()
+            self._file_name = f'metrics-{self._pid}-{time.time_ns()}.json'
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                thread = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                thread.start()
+                atexit.register(self.flush)
+
+    def add_collector(self, collector):
+        """Функция без аргументов, возвращающая {имя счетчика: значение}"""
+        self._collectors.append(collector)
+
+    def inc(self, name, labels=(), value=1):
+        """Увеличение счетчика"""
+        shard = self._shard()
+        key = (name, labels)
+        with shard.lock:
+            shard.counters[key] = shard.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        """Наблюдение для гистограммы: [счетчики бакетов..., +Inf], сумма"""
+        buckets = METRICS[name][2]
+        index = len(buckets)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                index = i
+                break
+        shard = self._shard()
+        key = (name, labels)
+        with shard.lock:
+            histogram = shard.histograms.get(key)
+            if histogram is None:
+                histogram = shard.histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += value
+
+    def observe_request(self, endpoint, method, status, duration, size=None, queries=None, db_time=None):
+        """Учет обработанного HTTP-запроса"""
+        endpoint = endpoint or 'unknown'
+        labels = (('endpoint', endpoint),)
+        self.inc('autoservice_http_requests_total',
+                 (('endpoint', endpoint), ('method', method), ('status', str(status))))
+        self.observe('autoservice_http_request_duration_seconds', duration, labels)
+        if size is not None:
+            self.observe('autoservice_http_response_size_bytes', size, labels)
+        if queries is not None:
+            self.observe('autoservice_db_queries_per_request', queries, labels)
+            self.inc('autoservice_db_queries_total', labels, queries)
+            self.inc('autoservice_db_seconds_total', labels, db_time or 0.0)
+
+    # ========== ВЫГРУЗКА ==========
+
+    def snapshot(self):
+        """Значения процесса: {'counters': {ключ: значение}, 'histograms': {ключ: [бакеты, сумма]}}"""
+        counters, histograms = {}, {}
+        for shard in self._shards:
+            with shard.lock:
+                merge_values(counters, histograms, shard.counters, shard.histograms)
+        for collector in self._collectors:
+            try:
+                for name, value in collector().items():
+                    counters[(name, ())] = counters.get((name, ()), 0) + value
+            except Exception as e:
+                print(f"Ошибка сбора метрик: {e}")
+        return {'counters': counters, 'histograms': histograms}
+
+    def flush(self):
+        """Сохранение значений процесса в свой файл directory/metrics-<pid>-<время старта>.json"""
+        if not self.directory or self._file_name is None:
+            return
+        snapshot = self.snapshot()
+        data = {
+            'counters': [[name, list(labels), value] for (name, labels), value in snapshot['counters'].items()],
+            'histograms': [[name, list(labels), buckets, total]
+                           for (name, labels), (buckets, total) in snapshot['histograms'].items()]
+        }
+        path = os.path.join(self.directory, self._file_name)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Ошибка сохранения метрик: {e}")
+
+    def _load_other_processes(self):
+        """Значения остальных процессов из файлов directory"""
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if os.path.basename(path) == self._file_name:
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots.append({
+                'counters': {(name, tuple(map(tuple, labels))): value for name, labels, value in data['counters']},
+                'histograms': {(name, tuple(map(tuple, labels))): [buckets, total]
+                               for name, labels, buckets, total in data['histograms']}
+            })
+        return snapshots
+
+    def collect(self):
+        """Значения всех процессов (своего - текущие, остальных - из файлов)"""
+        snapshots = [self.snapshot()]
+        if self.directory:
+            snapshots.extend(self._load_other_processes())
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            merge_values(counters, histograms, snapshot['counters'], snapshot['histograms'])
+        return counters, histograms
+
+    def render(self):
+        """Текст в формате Prometheus exposition (text/plain; version=0.0.4)"""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, bounds) in METRICS.items():
+            if kind == 'counter':
+                series = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+            else:
+                series = sorted((labels, value) for (metric, labels), value in histograms.items()
+                                if metric == name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in series:
+                if kind == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                    continue
+                buckets, total = value
+                cumulative = 0
+                for bound, count in zip(bounds + (float('inf'),), buckets):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else format_value(bound)
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+        # Доля попаданий в кэш статистики по всем процессам
+        hits = counters.get(('autoservice_stats_cache_hits_total', ()), 0)
+        misses = counters.get(('autoservice_stats_cache_misses_total', ()), 0)
+        lines.append('# HELP autoservice_stats_cache_hit_ratio Доля попаданий в кэш статистики')
+        lines.append('# TYPE autoservice_stats_cache_hit_ratio gauge')
+        lines.append(f'autoservice_stats_cache_hit_ratio {format_value(hits / (hits + misses) if hits + misses else 0)}')
+        return '\n'.join(lines) + '\n'
+
+
+def merge_values(counters, histograms, more_counters, more_histograms):
+    """Прибавление счетчиков и гистограмм more_* к counters/histograms"""
+    for key, value in more_counters.items():
+        counters[key] = counters.get(key, 0) + value
+    for key, (buckets, total) in more_histograms.items():
+        merged = histograms.get(key)
+        if merged is None:
+            histograms[key] = [list(buckets), total]
+        else:
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+
+
+def escape_label_value(value):
+    """Экранирование значения метки: обратная косая черта, кавычка, перевод строки"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    """Метки Prometheus: {name="value",...}"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    """Число в формате Prometheus (целые - без дробной части)"""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
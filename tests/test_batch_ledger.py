@@ -0,0 +1,44 @@
+"""Проводки в кассу и начисления зарплаты при пакетном завершении заказов"""
+import pytest
+
+
+@pytest.fixture
+def orders(db):
+    client_id = db.add_client('Иванов Иван', '+79990001122', 'Lada Vesta')
+    employee_id = db.add_employee('Петров Петр', 'mechanic', commission_rate=20)
+    order_ids = []
+    for _ in range(2):
+        order_id = db.add_work_order(client_id, 'ТО', employee_id=employee_id)
+        db.add_order_work(order_id, 'Замена масла', 2, 1000)
+        db.add_order_expense(order_id, 'Фильтр', 'material', 1, 500, 10)
+        order_ids.append(order_id)
+    return order_ids
+
+
+def ledger(db, order_id):
+    postings = db.conn.execute('SELECT category, amount FROM cash_flow WHERE order_id = ? ORDER BY category',
+                               (order_id,)).fetchall()
+    salary = db.conn.execute('SELECT amount FROM employee_salary WHERE order_id = ?', (order_id,)).fetchall()
+    return [tuple(row) for row in postings], [row[0] for row in salary]
+
+
+@pytest.mark.parametrize('operation', [{'op': 'complete'}, {'op': 'status', 'status': 'completed'}])
+def test_batch_completion_posts_to_ledger(db, orders, operation):
+    results = db.batch_work_orders([dict(operation, id=order_id) for order_id in orders])
+    assert all(item['success'] for item in results)
+
+    for order_id in orders:
+        assert db.get_work_order(order_id)['status'] == 'completed'
+        assert ledger(db, order_id) == ([('order_markup', 50.0), ('order_work', 2000.0)], [400.0])
+
+    assert db.verify_cash_rollups() == []
+    assert db.verify_employee_balances() == []
+
+
+def test_repeated_batch_completion_does_not_duplicate_postings(db, orders):
+    db.batch_work_orders([{'id': orders[0], 'op': 'complete'}])
+    results = db.batch_work_orders([{'id': orders[0], 'op': 'status', 'status': 'completed'},
+                                    {'id': orders[0], 'op': 'complete'}])
+
+    assert [item['result']['already_completed'] for item in results] == [True, True]
+    assert ledger(db, orders[0]) == ([('order_markup', 50.0), ('order_work', 2000.0)], [400.0])
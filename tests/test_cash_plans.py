@@ -0,0 +1,39 @@
+"""Планы запросов кассы: выборки за период не должны сканировать таблицы целиком"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from database import Database
+from maintenance import check_plans
+
+
+@pytest.fixture
+def plan_db(tmp_path):
+    """База с операциями кассы за два года и статистикой ANALYZE
+
+    Пул чтения отключен: check_plans перехватывает SQL на соединении записи.
+    """
+    database = Database(str(tmp_path / 'plans.db'), read_pool_size=0)
+    rng = random.Random(42)
+    start = date(2023, 1, 1)
+    rows = []
+    for i in range(5000):
+        transaction_type = rng.choice(['income', 'expense'])
+        category = rng.choice(['order_work', 'order_markup', 'cash_in'] if transaction_type == 'income'
+                              else ['rent', 'salary', 'parts', 'utilities'])
+        day = start + timedelta(days=rng.randrange(730))
+        rows.append((transaction_type, category, round(rng.uniform(100, 10000), 2), f'Операция {i}',
+                     f'{day.isoformat()} 12:00:00'))
+    database.conn.executemany('''
+                              INSERT INTO cash_flow (transaction_type, category, amount, description, date)
+                              VALUES (?, ?, ?, ?, ?)
+                              ''', rows)
+    database.conn.execute('ANALYZE')
+    database.conn.commit()
+    yield database
+    database.close()
+
+
+def test_cash_queries_do_not_scan(plan_db):
+    assert check_plans(plan_db)
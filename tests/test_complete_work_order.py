@@ -0,0 +1,71 @@
+"""Проводки и начисление зарплаты при повторном завершении заказа"""
+import pytest
+
+
+@pytest.fixture
+def order(db):
+    client_id = db.add_client('Иванов Иван', '+79990001122', 'Lada Vesta')
+    employee_id = db.add_employee('Петров Петр', 'mechanic', commission_rate=10)
+    order_id = db.add_work_order(client_id, 'ТО', employee_id=employee_id)
+    db.add_order_work(order_id, 'Диагностика', 1, 1000)
+    return {'id': order_id, 'client_id': client_id, 'employee_id': employee_id}
+
+
+def ledger(db, order_id):
+    postings = db.conn.execute('SELECT category, amount FROM cash_flow WHERE order_id = ? ORDER BY category, id',
+                               (order_id,)).fetchall()
+    salary = db.conn.execute('SELECT amount FROM employee_salary WHERE order_id = ?', (order_id,)).fetchall()
+    return [tuple(row) for row in postings], [row[0] for row in salary]
+
+
+def test_recompleting_edited_order_updates_postings(db, order):
+    db.complete_work_order(order['id'])
+    db.update_work_order_status(order['id'], 'in_progress')
+    db.update_work_order_with_lines(order['id'], order['client_id'], 'ТО',
+                                    works=[{'name': 'Диагностика', 'quantity': 1, 'price': 5000}],
+                                    employee_id=order['employee_id'])
+
+    result = db.complete_work_order(order['id'])
+
+    assert result['works_total'] == 5000 and result['salary_amount'] == 500
+    assert not result['already_completed']
+    assert ledger(db, order['id']) == ([('order_work', 5000.0)], [500.0])
+    assert db.verify_cash_rollups() == []
+    assert db.verify_employee_balances() == []
+
+
+def test_recompleting_unchanged_order_writes_nothing(db, order):
+    db.complete_work_order(order['id'])
+    result = db.complete_work_order(order['id'])
+
+    assert result['already_completed']
+    assert ledger(db, order['id']) == ([('order_work', 1000.0)], [100.0])
+
+
+def test_duplicate_postings_are_kept_until_dedupe(db, order):
+    from database import Database
+
+    db.complete_work_order(order['id'])
+    db.conn.execute('DROP INDEX idx_cashflow_order_posting')
+    db.conn.execute('''
+                    INSERT INTO cash_flow (transaction_type, category, amount, description, order_id)
+                    SELECT transaction_type, category, amount * 2, description, order_id
+                    FROM cash_flow
+                    WHERE order_id = ?
+                    ''', (order['id'],))
+    db.conn.commit()
+    db.close()
+
+    reopened = Database(db.db_name)
+    try:
+        assert ledger(reopened, order['id']) == ([('order_work', 1000.0), ('order_work', 2000.0)], [100.0])
+        assert len(reopened.find_duplicate_postings()) == 1
+        with pytest.raises(ValueError):
+            reopened.complete_work_order(order['id'])
+
+        assert reopened.remove_duplicate_postings() == 1
+        assert ledger(reopened, order['id']) == ([('order_work', 2000.0)], [100.0])
+        assert reopened.verify_cash_rollups() == []
+        assert reopened.complete_work_order(order['id'])['works_total'] == 1000
+    finally:
+        reopened.close()
@@ -0,0 +1,302 @@
+# writer.py
+"""Процесс записи для запуска приложения в нескольких процессах
+
+SQLite допускает только одну пишущую транзакцию, поэтому несколько воркеров
+gunicorn, пишущих в один файл, мешают друг другу ("database is locked").
+В многопроцессном режиме запись идет через один процесс:
+
+    python writer.py --db autoservice.db --address /tmp/autoservice-writer.sock
+    AUTOSERVICE_WRITER_ADDRESS=/tmp/autoservice-writer.sock gunicorn -w 4 -k gthread --threads 8 app:app
+
+Поток /api/events (SSE) занимает поток обработки запросов на все время
+подключения страницы, поэтому воркеры gunicorn должны быть многопоточными
+(-k gthread) или асинхронными (-k gevent). С синхронными воркерами
+(-k sync, по умолчанию) /api/events отвечает 503, и страницы работают без
+живых обновлений. Число потоков событий на воркер и время жизни потока
+ограничены (AUTOSERVICE_SSE_MAX_STREAMS, AUTOSERVICE_SSE_MAX_AGE), так что
+часть потоков воркера всегда остается для обычных запросов. gunicorn.conf.py
+задает gthread, 8 потоков и по умолчанию половину из них для потоков событий.
+
+Вызовы и результаты передаются через pickle, поэтому для TCP-адреса
+(host:port) обязателен общий ключ AUTOSERVICE_WRITER_AUTHKEY у процесса
+записи и воркеров: без него принять вызов по TCP отказываются. Unix-сокет
+защищен правами на файл, ключ для него необязателен.
+
+Каждый воркер читает из БД сам (WorkerDatabase), а вызовы методов записи
+(database.WRITE_METHODS) передает процессу записи. Процесс записи выполняет
+их в потоке WriteBatcher: вызовы, пришедшие от разных воркеров, пока
+фиксировалась предыдущая пачка, фиксируются вместе одной транзакцией.
+События об изменениях для /api/events воркер берет из журнала change_log.
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from database import ChangeEvents, Database, WRITE_METHODS
+
+DEFAULT_ADDRESS = '/tmp/autoservice-writer.sock'
+
+# Записи change_log -> события ChangeEvents, на которые подписаны страницы
+CHANGE_LOG_ENTITIES = {'clients': 'client', 'work_orders': 'order', 'cash_flow': 'cash', 'tasks': 'task'}
+CHANGE_LOG_OPS = {'insert': 'created', 'update': 'updated', 'delete': 'deleted'}
+
+
+def parse_address(address):
+    """'host:port' - TCP, иначе путь к unix-сокету"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return host or '127.0.0.1', int(port)
+    return address
+
+
+def check_authkey(address, authkey):
+    """Без ключа соединение по TCP не открываем: сообщения распаковываются pickle"""
+    if isinstance(address, tuple) and not authkey:
+        raise ValueError(f"Для TCP-адреса {address[0]}:{address[1]} нужен ключ AUTOSERVICE_WRITER_AUTHKEY")
+
+
+def plain(value):
+    """Результат метода в виде, пригодном для передачи между процессами (sqlite3.Row -> dict)"""
+    if isinstance(value, sqlite3.Row):
+        return dict(value)
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    return value
+
+
+class WriterServer:
+    """Прием вызовов методов записи от воркеров и выполнение их в Database с групповой фиксацией"""
+
+    def __init__(self, db, address, authkey=None):
+        check_authkey(address, authkey)
+        self.db = db
+        self.address = address
+        self.authkey = authkey
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"✍️  Процесс записи слушает {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError) as e:
+                    print(f"Ошибка подключения воркера: {e}")
+                    continue
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def _serve_client(self, conn):
+        """Вызовы одного воркера: (метод, args, kwargs) -> ('ok', результат) или ('error', исключение)"""
+        with conn:
+            while True:
+                try:
+                    name, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+
+                if name not in WRITE_METHODS:
+                    conn.send(('error', ValueError(f"Неизвестный метод записи: {name}")))
+                    continue
+                try:
+                    response = ('ok', plain(getattr(self.db, name)(*args, **kwargs)))
+                except Exception as e:
+                    response = ('error', e)
+
+                try:
+                    conn.send(response)
+                except (TypeError, AttributeError, ValueError) as e:
+                    # Исключение или результат не сериализуется pickle
+                    conn.send(('error', RuntimeError(f"{type(response[1]).__name__}: {response[1]}")))
+                except OSError:
+                    return
+
+
+class WriterClient:
+    """Подключение воркера к процессу записи (по соединению на поток)"""
+
+    def __init__(self, address, authkey=None):
+        check_authkey(address, authkey)
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, authkey=self.authkey)
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def call(self, name, *args, **kwargs):
+        """Вызов метода записи в процессе записи
+
+        Если процесс записи перезапускался, запрос повторяется один раз на
+        новом соединении - но только когда его не удалось отправить. Если
+        соединение оборвалось после отправки, вызов мог выполниться, и
+        повторять его небезопасно: возвращается ConnectionError.
+        """
+        request = (name, args, kwargs)
+        try:
+            conn = self._connection()
+            conn.send(request)
+        except (OSError, EOFError):
+            self._reset()
+            conn = self._connection()
+            conn.send(request)
+
+        try:
+            status, value = conn.recv()
+        except (OSError, EOFError) as e:
+            self._reset()
+            raise ConnectionError(f"Нет ответа процесса записи на {name}: {e}")
+
+        if status == 'error':
+            raise value
+        return value
+
+
+class ChangeLogEvents(ChangeEvents):
+    """События воркера из журнала change_log
+
+    Изменения фиксирует процесс записи, и его ChangeEvents воркерам не
+    видны. Пока есть подписчики, поток раз в poll_interval секунд читает
+    новые записи журнала и рассылает их как события; без подписчиков
+    курсор просто переносится на конец журнала. Поток запускается при
+    первой подписке в каждом процессе (воркеры gunicorn создаются fork).
+    """
+
+    def __init__(self, db, poll_interval=1.0, max_queue=1000, max_subscribers=None):
+        super().__init__(max_queue, max_subscribers)
+        self.db = db
+        self.poll_interval = poll_interval
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def subscribe(self):
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._follow, name='change-log', daemon=True).start()
+        return super().subscribe()
+
+    def _follow(self):
+        position = self.db.get_change_log_head()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if not self.subscriber_count():
+                    position = self.db.get_change_log_head()
+                    continue
+                page = {'has_more': True}
+                while page['has_more']:
+                    page = self.db.get_changes(after=position, tables=tuple(CHANGE_LOG_ENTITIES))
+                    position = page['cursor']
+                    self.publish([dict(entity=CHANGE_LOG_ENTITIES[change['table']],
+                                       op=CHANGE_LOG_OPS[change['op']], id=change['pk'])
+                                  for change in page['changes']])
+            except Exception as e:
+                print(f"Ошибка чтения журнала изменений: {e}")
+
+
+def _remote_method(name):
+    """Метод WorkerDatabase, передающий вызов процессу записи"""
+    def method(self, *args, **kwargs):
+        try:
+            return self.writer.call(name, *args, **kwargs)
+        finally:
+            # Свои изменения должны быть видны в кэше статистики сразу
+            self._invalidate_caches()
+
+    method.__name__ = name
+    method.__doc__ = getattr(Database, name).__doc__
+    return method
+
+
+class WorkerDatabase(Database):
+    """Database воркера: чтение из своего пула, методы записи - через процесс записи"""
+
+    def __init__(self, db_name, writer_address, authkey=None, **kwargs):
+        self.writer = WriterClient(writer_address, authkey)
+        self._seen_data_version = None
+        super().__init__(db_name, **kwargs)
+        self.events = ChangeLogEvents(self)
+
+    def create_tables(self):
+        """Схему создает и обновляет только процесс записи; воркер лишь проверяет, что она есть
+
+        Иначе каждый воркер при старте выполнял бы DDL и миграции
+        параллельно с процессом записи и другими воркерами.
+        """
+        cursor = self.conn.cursor()
+        if not self._table_exists(cursor, 'change_log'):
+            raise RuntimeError(f"Схема БД {self.db_name} не создана: сначала запустите процесс записи (writer.py)")
+        self.fts_enabled = self._table_exists(cursor, 'clients_fts')
+
+    def get_stats(self):
+        """Статистика; кэш сбрасывается, если БД изменил другой процесс
+
+        PRAGMA data_version соединения меняется после каждой фиксации
+        транзакции другим соединением, в том числе процессом записи.
+        """
+        with self._write_lock:
+            version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+            changed = version != self._seen_data_version
+            self._seen_data_version = version
+        if changed:
+            self._invalidate_caches()
+        return super().get_stats()
+
+
+for _name in WRITE_METHODS:
+    setattr(WorkerDatabase, _name, _remote_method(_name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Процесс записи CRM автосервиса для многопроцессного режима')
+    parser.add_argument('--db', default=os.environ.get('AUTOSERVICE_DB', 'autoservice.db'),
+                        help='файл базы данных (по умолчанию autoservice.db)')
+    parser.add_argument('--address', default=os.environ.get('AUTOSERVICE_WRITER_ADDRESS', DEFAULT_ADDRESS),
+                        help=f'путь к unix-сокету или host:port (по умолчанию {DEFAULT_ADDRESS})')
+    parser.add_argument('--storage-profile', default=os.environ.get('AUTOSERVICE_STORAGE_PROFILE', 'balanced'),
+                        help='профиль хранения SQLite (по умолчанию balanced)')
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help='максимум вызовов в одной транзакции (по умолчанию 100)')
+    parser.add_argument('--batch-window-ms', type=float, default=0,
+                        help='сколько ждать новые вызовы после первого в пачке, мс '
+                             '(по умолчанию 0 - только уже накопившиеся)')
+    args = parser.parse_args()
+
+    authkey = os.environ.get('AUTOSERVICE_WRITER_AUTHKEY')
+    address = parse_address(args.address)
+    try:
+        check_authkey(address, authkey)
+    except ValueError as e:
+        parser.error(str(e))
+
+    db = Database(args.db, read_pool_size=2, storage_profile=args.storage_profile,
+                  batch_writes=True, write_batch_size=args.batch_size,
+                  write_batch_window_ms=args.batch_window_ms)
+    try:
+        WriterServer(db, address, authkey.encode() if authkey else None).serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Процесс записи остановлен")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()